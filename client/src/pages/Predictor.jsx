@@ -1,6 +1,6 @@
 import { useState, useEffect } from 'react'
 import { motion } from 'framer-motion'
-import { Search, TrendingUp, Brain, Star, Calendar } from 'lucide-react'
+import { Search, TrendingUp, Brain, Star, Calendar, Activity } from 'lucide-react'
 import StockChart from '../components/Charts/StockChart'
 import toast from 'react-hot-toast'
 import axios from 'axios'
@@ -15,6 +15,8 @@ const Predictor = () => {
   const [loadingHistory, setLoadingHistory] = useState(false)
   const [stocks, setStocks] = useState([])
   const [searchLoading, setSearchLoading] = useState(false)
+  const [liveEnabled, setLiveEnabled] = useState(false)
+  const [liveUpdate, setLiveUpdate] = useState(null)
 
   const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:5000'
 
@@ -29,6 +31,48 @@ const Predictor = () => {
     }
   }, [searchTerm])
 
+  // Live intraday updates over Server-Sent Events. EventSource cannot send the
+  // Authorization header, so each connection asks for a short-lived stream token first.
+  useEffect(() => {
+    setLiveUpdate(null)
+    if (!liveEnabled || !selectedStock) return
+
+    let source = null
+    let retry = null
+    let closed = false
+
+    const connect = async () => {
+      try {
+        const token = localStorage.getItem('token')
+        const { data } = await axios.post(`${API_URL}/api/stocks/predict/live/token`, {}, {
+          headers: { Authorization: `Bearer ${token}` }
+        })
+        if (closed) return
+        source = new EventSource(
+          `${API_URL}/api/stocks/predict/live?symbols=${selectedStock.symbol}&token=${data.token}`
+        )
+        source.addEventListener('update', (event) => setLiveUpdate(JSON.parse(event.data)))
+        source.onerror = () => {
+          // A refused connection (expired token, no free stream) is not retried by the
+          // browser, so reconnect with a fresh token
+          if (source.readyState === EventSource.CLOSED && !closed) {
+            retry = setTimeout(connect, 5000)
+          }
+        }
+      } catch (error) {
+        toast.error('Live updates are unavailable')
+        setLiveEnabled(false)
+      }
+    }
+
+    connect()
+    return () => {
+      closed = true
+      clearTimeout(retry)
+      if (source) source.close()
+    }
+  }, [liveEnabled, selectedStock])
+
   const searchStocks = async () => {
     try {
       setSearchLoading(true)
@@ -68,6 +112,20 @@ const Predictor = () => {
     fetchHistoricalData(stock.symbol)
   }
 
+  const waitForTrainingJob = async (jobId, token) => {
+    for (let attempt = 0; attempt < 200; attempt++) {
+      await new Promise(resolve => setTimeout(resolve, 3000))
+
+      const { data: job } = await axios.get(`${API_URL}/api/stocks/predict/jobs/${jobId}`, {
+        headers: { Authorization: `Bearer ${token}` }
+      })
+
+      if (job.status === 'completed') return
+      if (job.status === 'failed') throw new Error(job.error || 'Model training failed')
+    }
+    throw new Error('Model training is taking longer than expected')
+  }
+
   const handlePredict = async () => {
     if (!selectedStock) {
       toast.error('Please select a stock first')
@@ -78,7 +136,7 @@ const Predictor = () => {
 
     try {
       const token = localStorage.getItem('token')
-      const response = await axios.post(
+      const requestPrediction = () => axios.post(
         `${API_URL}/api/stocks/predict`,
         {
           symbol: selectedStock.symbol,
@@ -89,11 +147,20 @@ const Predictor = () => {
         }
       )
 
+      let response = await requestPrediction()
+
+      if (response.status === 202) {
+        // No model for this stock yet: wait for the training job, then ask again
+        toast('Training a model for this stock, this can take a minute...')
+        await waitForTrainingJob(response.data.jobId, token)
+        response = await requestPrediction()
+      }
+
       setPrediction(response.data)
       toast.success('Prediction generated successfully!')
     } catch (error) {
       console.error('Prediction error:', error)
-      toast.error(error.response?.data?.message || 'Failed to generate prediction')
+      toast.error(error.response?.data?.message || error.message || 'Failed to generate prediction')
     } finally {
       setLoading(false)
     }
@@ -269,6 +336,58 @@ const Predictor = () => {
                 </motion.div>
               )}
 
+              {selectedStock && (
+                <div className="card mb-6">
+                  <div className="flex items-center justify-between mb-4">
+                    <h3 className="text-lg font-semibold text-white flex items-center">
+                      <Activity className="h-5 w-5 mr-2 text-primary-400" />
+                      Live Intraday
+                    </h3>
+                    <button
+                      onClick={() => setLiveEnabled(!liveEnabled)}
+                      className={liveEnabled ? 'btn-secondary' : 'btn-primary'}
+                    >
+                      {liveEnabled ? 'Stop' : 'Go Live'}
+                    </button>
+                  </div>
+
+                  {liveEnabled && !liveUpdate && (
+                    <div className="text-sm text-gray-400">Waiting for the next bar...</div>
+                  )}
+
+                  {liveEnabled && liveUpdate && (
+                    <div className="grid grid-cols-1 md:grid-cols-3 gap-4">
+                      <div className="p-4 bg-gray-700 rounded-lg">
+                        <div className="text-sm text-gray-400 mb-1">
+                          Last Bar ({new Date(liveUpdate.time).toLocaleTimeString()})
+                        </div>
+                        <div className="text-2xl font-bold text-white">${liveUpdate.bar.close.toFixed(2)}</div>
+                      </div>
+                      <div className="p-4 bg-gray-700 rounded-lg">
+                        <div className="text-sm text-gray-400 mb-1">RSI</div>
+                        <div className="text-2xl font-bold text-white">
+                          {liveUpdate.indicators.RSI !== undefined ? liveUpdate.indicators.RSI.toFixed(1) : '-'}
+                        </div>
+                      </div>
+                      <div className="p-4 bg-gray-700 rounded-lg">
+                        <div className="text-sm text-gray-400 mb-1">
+                          Forecast{liveUpdate.forecast.barsAhead ? ` (${liveUpdate.forecast.barsAhead} bars)` : ''}
+                        </div>
+                        {liveUpdate.forecast.status === 'ok' ? (
+                          <div className={`text-2xl font-bold ${liveUpdate.forecast.priceChangePercent >= 0 ? 'text-green-400' : 'text-red-400'}`}>
+                            ${liveUpdate.forecast.predictedPrice.toFixed(2)} ({liveUpdate.forecast.priceChangePercent > 0 ? '+' : ''}{liveUpdate.forecast.priceChangePercent}%)
+                          </div>
+                        ) : (
+                          <div className="text-lg font-semibold text-gray-300 capitalize">
+                            {liveUpdate.forecast.status.replace('_', ' ')}
+                          </div>
+                        )}
+                      </div>
+                    </div>
+                  )}
+                </div>
+              )}
+
               {prediction && (
                 <motion.div
                   initial={{ opacity: 0, y: 20 }}
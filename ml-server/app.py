@@ -1,12 +1,20 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g, Response, stream_with_context
 from flask_cors import CORS
 import numpy as np
 import pandas as pd
-import yfinance as yf
 from datetime import datetime, timedelta
 import os
+import json
+import time
+import threading
 from dotenv import load_dotenv
 from models.hybrid_predictor import HybridStockPredictor
+from models.training_jobs import TRAINING_QUEUE_FULL
+from models.backtest import latest_report
+from market_data.client import get_client
+from market_data.intraday import StreamLimitError
+from monitoring.metrics import REGISTRY, REQUEST_SECONDS, begin_trace, end_trace, stage
+from monitoring.profiler import SamplingProfiler
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -17,14 +25,104 @@ CORS(app)
 
 predictor = HybridStockPredictor()
 
+# ?profile=1 (or an X-Profile: 1 header) samples the request's stack when this is enabled
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'false').lower() == 'true'
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles'))
+LOG_REQUEST_TIMINGS = os.environ.get('LOG_REQUEST_TIMINGS', 'false').lower() == 'true'
+SENTIMENT_TIMEOUT_SECONDS = float(os.environ.get('SENTIMENT_TIMEOUT_SECONDS', 3))
+# Comment lines sent on idle intraday streams, so proxies keep them open and closed clients are noticed
+STREAM_HEARTBEAT_SECONDS = float(os.environ.get('STREAM_HEARTBEAT_SECONDS', 15))
+# Most Monte Carlo dropout samples a request can ask for with intervalSamples
+PREDICTION_INTERVAL_MAX_SAMPLES = int(os.environ.get('PREDICTION_INTERVAL_MAX_SAMPLES', 500))
+
+def collect_service_metrics():
+    fundamentals = predictor.sentiment_analyzer.fundamentals_cache.stats()
+    predictions = predictor.prediction_cache.stats()
+    training = predictor.training_jobs.stats()
+    news = predictor.sentiment_analyzer.news_sentiment
+    headlines = news.scorer.stats() if news is not None else {'memo_hits': 0, 'scored': 0, 'memo_size': 0}
+    return [
+        ('intellistock_cache_lookups_total', 'counter', 'Cache lookups by cache and result', [
+            ({'cache': 'fundamentals', 'result': 'hit'}, fundamentals['hits']),
+            ({'cache': 'fundamentals', 'result': 'stale_hit'}, fundamentals['stale_hits']),
+            ({'cache': 'fundamentals', 'result': 'negative_hit'}, fundamentals['negative_hits']),
+            ({'cache': 'fundamentals', 'result': 'miss'}, fundamentals['misses']),
+            ({'cache': 'predictions', 'result': 'hit'}, predictions['hits']),
+            ({'cache': 'predictions', 'result': 'miss'}, predictions['misses']),
+            ({'cache': 'headlines', 'result': 'hit'}, headlines['memo_hits']),
+            ({'cache': 'headlines', 'result': 'miss'}, headlines['scored'])
+        ]),
+        ('intellistock_cache_entries', 'gauge', 'Entries held by each cache', [
+            ({'cache': 'fundamentals'}, fundamentals['size']),
+            ({'cache': 'predictions'}, predictions['size']),
+            ({'cache': 'headlines'}, headlines['memo_size'])
+        ]),
+        ('intellistock_fundamentals_fetch_errors_total', 'counter', 'Failed fundamentals fetches', [
+            ({}, fundamentals['errors'])
+        ]),
+        ('intellistock_training_jobs', 'gauge', 'Background training jobs by state', [
+            ({'state': 'queued'}, training['queued']),
+            ({'state': 'running'}, training['running'])
+        ])
+    ]
+
+REGISTRY.register_collector(collect_service_metrics)
+
+@app.before_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    g.trace_token = begin_trace()
+    if PROFILING_ENABLED and (request.args.get('profile') == '1' or request.headers.get('X-Profile') == '1'):
+        g.profiler = SamplingProfiler(threading.get_ident(),
+                                      interval=float(os.environ.get('PROFILE_INTERVAL_MS', 5)) / 1000).start()
+
+@app.after_request
+def record_request_metrics(response):
+    elapsed = time.perf_counter() - g.pop('request_started', time.perf_counter())
+    stages = end_trace(g.pop('trace_token')) if 'trace_token' in g else {}
+    endpoint = request.endpoint or 'unknown'
+    REQUEST_SECONDS.observe(elapsed, endpoint=endpoint, method=request.method, status=response.status_code)
+
+    timings = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in stages.items()]
+    response.headers['Server-Timing'] = ', '.join(timings + [f"total;dur={elapsed * 1000:.1f}"])
+
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.stop()
+        response.headers['X-Profile-File'] = profiler.save(PROFILE_DIR, endpoint)
+
+    if LOG_REQUEST_TIMINGS:
+        print(json.dumps({
+            'endpoint': endpoint,
+            'status': response.status_code,
+            'ms': round(elapsed * 1000, 1),
+            'stages': {name: round(seconds * 1000, 1) for name, seconds in stages.items()}
+        }))
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/health', methods=['GET'])
 def health_check():
+    ready = predictor.ready.is_set()
+    news = predictor.sentiment_analyzer.news_sentiment
     return jsonify({
-        'status': 'OK',
+        'status': 'OK' if ready else 'STARTING',
+        'ready': ready,
         'service': 'IntelliStock ML Server - Hybrid LSTM + Sentiment Model',
         'timestamp': datetime.now().isoformat(),
-        'model': 'LSTM + Sentiment Regression Hybrid'
-    })
+        'model': 'LSTM + Sentiment Regression Hybrid',
+        'caches': {
+            'fundamentals': predictor.sentiment_analyzer.fundamentals_cache.stats(),
+            'predictions': predictor.prediction_cache.stats(),
+            'headlines': news.scorer.stats() if news is not None else None
+        },
+        'marketData': get_client().stats(),
+        'training': predictor.training_jobs.stats(),
+        'intraday': predictor.live.stats()
+    }), 200 if ready else 503
 
 @app.route('/predict', methods=['POST'])
 def predict_stock():
@@ -32,6 +130,8 @@ def predict_stock():
         data = request.get_json()
         symbol = data.get('symbol', '').upper()
         days = int(data.get('days', 1))
+        # p10/p50/p90 bands are opt-in: intervalSamples overrides PREDICTION_INTERVAL_SAMPLES
+        interval_samples = data.get('intervalSamples')
 
         if not symbol:
             return jsonify({'error': 'Symbol is required'}), 400
@@ -39,13 +139,37 @@ def predict_stock():
         if days < 1 or days > 30:
             return jsonify({'error': 'Days must be between 1 and 30'}), 400
 
+        if interval_samples is not None:
+            interval_samples = int(interval_samples)
+            if interval_samples < 0 or interval_samples > PREDICTION_INTERVAL_MAX_SAMPLES:
+                return jsonify({'error': f'intervalSamples must be between 0 and {PREDICTION_INTERVAL_MAX_SAMPLES}'}), 400
+
         print(f"Received prediction request for {symbol}, {days} days")
-        prediction = predictor.generate_prediction(symbol, days)
+        prediction = predictor.generate_prediction(symbol, days, interval_samples)
+
+        if 'jobId' in prediction:
+            return jsonify(prediction), 202
+
+        if prediction.get('error') == TRAINING_QUEUE_FULL:
+            return jsonify(prediction), 503
 
         if 'error' in prediction:
             return jsonify(prediction), 400
 
-        return jsonify(prediction)
+        # The body only changes with a new bar, a retrained model or refreshed
+        # fundamentals, so callers can revalidate with If-None-Match.
+        with stage('serialization'):
+            response = jsonify(prediction)
+        response.add_etag()
+        response.headers['Cache-Control'] = 'no-cache'
+        etag, _ = response.get_etag()
+        if request.if_none_match.contains(etag):
+            # Werkzeug's make_conditional only answers GET/HEAD, so handle the POST here
+            not_modified = app.response_class(status=304)
+            not_modified.set_etag(etag)
+            not_modified.headers['Cache-Control'] = 'no-cache'
+            return not_modified
+        return response
 
     except Exception as e:
         print(f"Prediction error: {e}")
@@ -56,27 +180,152 @@ def predict_stock():
             'message': str(e)
         }), 500
 
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    try:
+        data = request.get_json() or {}
+        max_symbols = int(os.environ.get('BATCH_MAX_SYMBOLS', 50))
+
+        # Either {"requests": [{"symbol": ..., "days": ...}]} or {"symbols": [...], "days": n}
+        items = data.get('requests')
+        if items is None:
+            items = [{'symbol': symbol, 'days': data.get('days', 1)} for symbol in data.get('symbols', [])]
+
+        if not items:
+            return jsonify({'error': 'At least one symbol is required'}), 400
+
+        if len(items) > max_symbols:
+            return jsonify({'error': f'At most {max_symbols} predictions per batch'}), 400
+
+        interval_samples = data.get('intervalSamples')
+        if interval_samples is not None:
+            interval_samples = int(interval_samples)
+            if interval_samples < 0 or interval_samples > PREDICTION_INTERVAL_MAX_SAMPLES:
+                return jsonify({'error': f'intervalSamples must be between 0 and {PREDICTION_INTERVAL_MAX_SAMPLES}'}), 400
+
+        requests = []
+        for item in items:
+            symbol = str(item.get('symbol', '')).upper()
+            days = int(item.get('days', 1))
+
+            if not symbol:
+                return jsonify({'error': 'Symbol is required for every request'}), 400
+
+            if days < 1 or days > 30:
+                return jsonify({'error': 'Days must be between 1 and 30', 'symbol': symbol}), 400
+
+            requests.append((symbol, days))
+
+        print(f"Received batch prediction request for {len(requests)} predictions")
+        results = predictor.generate_batch_predictions(requests, interval_samples)
+        failed = sum(1 for result in results if 'error' in result)
+        pending = sum(1 for result in results if 'jobId' in result)
+
+        with stage('serialization'):
+            return jsonify({
+                'results': results,
+                'succeeded': len(results) - failed - pending,
+                'failed': failed,
+                'pending': pending,
+                'timestamp': datetime.now().isoformat()
+            })
+
+    except Exception as e:
+        print(f"Batch prediction error: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({
+            'error': 'Internal server error',
+            'message': str(e)
+        }), 500
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_training_job(job_id):
+    job = predictor.training_jobs.get(job_id)
+
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    return jsonify(job.to_dict())
+
+def sentiment_payload(symbol, sentiment_result):
+    payload = {
+        'symbol': symbol,
+        'sentiment': sentiment_result['sentiment'],
+        'score': round(sentiment_result['score'], 3),
+        'confidence': round(sentiment_result['confidence'], 0),
+        'factors': sentiment_result['factors'],
+        'timestamp': datetime.now().isoformat()
+    }
+    if sentiment_result.get('partial'):
+        payload['partial'] = True
+    return payload
+
+@app.route('/sentiment/headlines', methods=['POST'])
+def score_headlines():
+    # {"symbols": [...]} -> time-decayed headline sentiment per symbol, scored in one batch;
+    # {"headlines": [...]} -> a score in [-1, 1] per headline
+    try:
+        news = predictor.sentiment_analyzer.news_sentiment
+        if news is None:
+            return jsonify({'error': 'Text sentiment is disabled'}), 503
+
+        params = request.get_json(silent=True) or {}
+        headlines = params.get('headlines')
+        symbols = params.get('symbols')
+        if headlines:
+            texts = [str(text) for text in headlines]
+            return jsonify({
+                'scores': [round(float(score), 4) for score in news.scorer.score(texts)],
+                'timestamp': datetime.now().isoformat()
+            })
+        if symbols:
+            results = news.analyze_many(symbols)
+            return jsonify({
+                'results': {symbol: dict(result, score=round(result['score'], 4)) for symbol, result in results.items()},
+                'timestamp': datetime.now().isoformat()
+            })
+        return jsonify({'error': 'headlines or symbols is required'}), 400
+
+    except Exception as e:
+        print(f"Headline sentiment error: {e}")
+        return jsonify({
+            'error': 'Internal server error',
+            'message': str(e)
+        }), 500
+
 @app.route('/sentiment/<symbol>', methods=['GET'])
 def get_sentiment(symbol):
     try:
         symbol = symbol.upper()
 
-        stock = yf.Ticker(symbol)
-        data = stock.history(period='3mo')
+        predictor.prefetch_fundamentals(symbol)
+        predictor.prefetch_news([symbol])
+        data = predictor.get_stock_data(symbol, period='3mo')
 
         if data is None or len(data) == 0:
             return jsonify({'error': 'Unable to fetch stock data'}), 404
 
-        sentiment_result = predictor.sentiment_analyzer.analyze_market_sentiment(symbol, data)
+        # Fundamentals get SENTIMENT_TIMEOUT_SECONDS; past that the technical part is returned alone
+        events = predictor.sentiment_analyzer.stream_market_sentiment(
+            symbol, data, predictor.fetch_executor, SENTIMENT_TIMEOUT_SECONDS)
 
-        return jsonify({
-            'symbol': symbol,
-            'sentiment': sentiment_result['sentiment'],
-            'score': round(sentiment_result['score'], 3),
-            'confidence': round(sentiment_result['confidence'], 0),
-            'factors': sentiment_result['factors'],
-            'timestamp': datetime.now().isoformat()
-        })
+        if request.args.get('stream') == '1' or request.accept_mimetypes.best == 'text/event-stream':
+            # Server-Sent Events: technical, then fundamentals, then the blended sentiment
+            def stream():
+                for event, payload in events:
+                    if event == 'sentiment':
+                        payload = sentiment_payload(symbol, payload)
+                    elif 'score' in payload:
+                        payload = dict(payload, score=round(payload['score'], 3))
+                    yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+            return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+        for event, payload in events:
+            sentiment_result = payload
+        return jsonify(sentiment_payload(symbol, sentiment_result))
 
     except Exception as e:
         print(f"Sentiment analysis error: {e}")
@@ -94,7 +343,7 @@ def get_technical_analysis(symbol):
         if data is None or len(data) == 0:
             return jsonify({'error': 'Unable to fetch stock data'}), 404
 
-        indicators = predictor.calculate_technical_indicators(data)
+        indicators = predictor.calculate_technical_indicators(data, symbol)
         current_price = float(data['Close'].iloc[-1])
 
         return jsonify({
@@ -125,59 +374,169 @@ def get_technical_analysis(symbol):
             'message': str(e)
         }), 500
 
+@app.route('/screen', methods=['GET', 'POST'])
+def screen_universe():
+    # The /technical signals for a whole universe at once, e.g.
+    # /screen?filter=rsi<30,ma_signal=Bullish&sort=-score&limit=20
+    try:
+        if request.method == 'POST':
+            params = request.get_json(silent=True) or {}
+            symbols = params.get('symbols')
+        else:
+            params = request.args
+            symbols = params.get('symbols', '').replace(',', ' ').split()
+        limit = params.get('limit')
+
+        try:
+            result = predictor.screener.screen(
+                symbols=symbols or None,
+                filters=params.get('filter'),
+                sort=params.get('sort'),
+                limit=int(limit) if limit is not None else None
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        with stage('serialization'):
+            result['timestamp'] = datetime.now().isoformat()
+            return jsonify(result)
+
+    except Exception as e:
+        print(f"Screening error: {e}")
+        return jsonify({
+            'error': 'Internal server error',
+            'message': str(e)
+        }), 500
+
+@app.route('/intraday/stream', methods=['GET'])
+def stream_intraday():
+    # Server-Sent Events: an `update` (bar, indicators, forecast) per new bar of each symbol,
+    # e.g. /intraday/stream?symbols=AAPL,MSFT, instead of polling /predict
+    symbols = list(dict.fromkeys(request.args.get('symbols', '').upper().replace(',', ' ').split()))
+    if not symbols:
+        return jsonify({'error': 'symbols is required'}), 400
+
+    try:
+        subscription = predictor.live.subscribe(symbols)
+    except StreamLimitError as e:
+        return jsonify({'error': 'Too many open streams', 'message': str(e)}), 503
+    except Exception as e:
+        print(f"Intraday subscription error: {e}")
+        return jsonify({
+            'error': 'Internal server error',
+            'message': str(e)
+        }), 500
+
+    def stream():
+        try:
+            while True:
+                event = subscription.get(timeout=STREAM_HEARTBEAT_SECONDS)
+                if event is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                name, payload = event
+                yield f"event: {name}\ndata: {json.dumps(payload)}\n\n"
+        finally:
+            predictor.live.unsubscribe(subscription)
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/intraday/<symbol>', methods=['GET'])
+def get_intraday(symbol):
+    # Latest intraday update of a symbol. Bars keep coming only while a stream watches
+    # it; otherwise each call backfills the recent bars once.
+    try:
+        symbol = symbol.upper()
+        update = predictor.live.snapshot(symbol)
+        if update is None:
+            return jsonify({'symbol': symbol, 'status': 'waiting', 'message': 'No intraday bars yet'}), 202
+        return jsonify(update)
+
+    except Exception as e:
+        print(f"Intraday error: {e}")
+        return jsonify({
+            'error': 'Internal server error',
+            'message': str(e)
+        }), 500
+
+def backtest_summary():
+    # Accuracy figures come from the newest `backtest.py` report, if there is one
+    report = latest_report(os.path.join(predictor.model_registry.root, 'reports'))
+    if not report or not report.get('metrics'):
+        return None
+
+    days = min(report['metrics'], key=int)
+    accuracy = report['metrics'][days]['directional_accuracy']
+    return {
+        'generatedAt': report.get('finished_at'),
+        'symbols': len(report.get('symbols', [])),
+        'folds': report.get('folds'),
+        'basis': f"Directional accuracy, {days}-day horizon, walk-forward backtest",
+        'accuracy': {name: f"{value * 100:.1f}%" if value is not None else None for name, value in accuracy.items()},
+        'metrics': report['metrics'],
+        'latency': report.get('latency')
+    }
+
 @app.route('/models', methods=['GET'])
 def get_models():
+    backtest = backtest_summary()
+    accuracy = backtest['accuracy'] if backtest else {}
     return jsonify({
         'models': [
             {
                 'name': 'Hybrid LSTM + Sentiment Model',
                 'description': 'Primary prediction model combining LSTM neural network with sentiment analysis',
-                'accuracy': '84.7%',
+                'accuracy': accuracy.get('hybrid'),
                 'type': 'hybrid',
                 'weight': '65% LSTM, 35% Sentiment',
                 'active': True
             },
             {
                 'name': 'LSTM Neural Network',
-                'description': 'Deep learning model with 3 LSTM layers for time-series prediction',
-                'accuracy': '81.5%',
+                'description': f"Deep learning model with {len(predictor.lstm_model.units)} LSTM layers for time-series prediction",
+                'accuracy': accuracy.get('lstm'),
                 'type': 'lstm',
-                'layers': '128-64-32 units with dropout and batch normalization',
+                'layers': f"{'-'.join(map(str, predictor.lstm_model.units))} units with dropout and batch normalization",
                 'active': True
             },
             {
                 'name': 'Sentiment Analysis Engine',
                 'description': 'Analyzes fundamental metrics and technical indicators for market sentiment',
-                'accuracy': '78.3%',
+                'accuracy': accuracy.get('sentiment'),
                 'type': 'sentiment',
                 'components': 'Fundamental analysis, Technical sentiment, VADER analysis',
                 'active': True
             }
-        ]
+        ],
+        'accuracyBasis': backtest['basis'] if backtest else 'Not measured yet: run backtest.py'
     })
 
+def lstm_layer_info(units):
+    layers = []
+    for i, width in enumerate(units):
+        last = i == len(units) - 1
+        layers.append({'type': 'LSTM', 'units': width, 'return_sequences': not last})
+        layers.append({'type': 'Dropout', 'rate': 0.2})
+        if not last:
+            layers.append({'type': 'BatchNormalization'})
+    return layers
+
 @app.route('/model-info', methods=['GET'])
 def get_model_info():
     return jsonify({
         'architecture': {
             'type': 'Hybrid LSTM + Sentiment Regression',
             'lstm': {
-                'layers': [
-                    {'type': 'LSTM', 'units': 128, 'return_sequences': True},
-                    {'type': 'Dropout', 'rate': 0.2},
-                    {'type': 'BatchNormalization'},
-                    {'type': 'LSTM', 'units': 64, 'return_sequences': True},
-                    {'type': 'Dropout', 'rate': 0.2},
-                    {'type': 'BatchNormalization'},
-                    {'type': 'LSTM', 'units': 32, 'return_sequences': False},
-                    {'type': 'Dropout', 'rate': 0.2},
+                'layers': lstm_layer_info(predictor.lstm_model.units) + [
                     {'type': 'Dense', 'units': 32, 'activation': 'relu'},
                     {'type': 'Dense', 'units': 16, 'activation': 'relu'},
-                    {'type': 'Dense', 'units': 1}
+                    {'type': 'Dense', 'units': predictor.lstm_model.horizon}
                 ],
                 'optimizer': 'adam',
                 'loss': 'mean_squared_error',
-                'lookback': 60
+                'lookback': predictor.lstm_model.lookback,
+                'forecastMode': predictor.lstm_model.forecast_mode
             },
             'sentiment': {
                 'components': [
@@ -198,13 +557,27 @@ def get_model_info():
             'Sentiment Score', 'Fundamental Metrics'
         ],
         'training': {
-            'epochs': 50,
-            'batch_size': 32,
+            'epochs': predictor.lstm_model.epochs,
+            'batch_size': predictor.lstm_model.batch_size,
             'validation_split': 0.2,
             'early_stopping': True
-        }
+        },
+        'backtest': backtest_summary()
     })
 
+def create_app(warm_up=None):
+    # Entry point for servers: WARM_UP=sync loads models before returning (what the
+    # gunicorn config uses, so it happens before workers fork), background loads them
+    # in a thread, off skips it.
+    warm_up = warm_up or os.environ.get('WARM_UP', 'background').lower()
+    if warm_up == 'sync':
+        predictor.warm_up()
+    elif warm_up == 'background':
+        threading.Thread(target=predictor.warm_up, name='warm-up', daemon=True).start()
+    else:
+        predictor.ready.set()
+    return app
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 8000))
     debug = os.environ.get('FLASK_ENV') == 'development'
@@ -218,4 +591,5 @@ if __name__ == '__main__':
     print(f"LSTM Weight: 65% | Sentiment Weight: 35%")
     print("=" * 60)
 
-    app.run(host='0.0.0.0', port=port, debug=debug)
+    create_app()
+    app.run(host='0.0.0.0', port=port, debug=debug, threaded=True)
@@ -0,0 +1,192 @@
+import os
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from train import limit_worker_threads, read_symbols
+
+
+def snapshot_fixture(symbols, fixture_dir, period):
+    # Downloads price history (and fundamentals) once so later backtests run offline
+    from market_data.price_store import YahooHistorySource, normalize_bars
+    from market_data.fundamentals_cache import fetch_stock_info
+
+    source = YahooHistorySource()
+    os.makedirs(os.path.join(fixture_dir, 'fundamentals'), exist_ok=True)
+    for symbol in symbols:
+        bars = normalize_bars(source.fetch(symbol, period=period))
+        if bars is None:
+            print(f"{symbol:<8} no data")
+            continue
+        bars.to_csv(os.path.join(fixture_dir, f"{symbol}.csv"), index_label='Date')
+        try:
+            with open(os.path.join(fixture_dir, 'fundamentals', f"{symbol}.json"), 'w') as f:
+                json.dump(fetch_stock_info(symbol), f, default=str)
+        except Exception as e:
+            print(f"{symbol:<8} fundamentals not saved: {e}")
+        print(f"{symbol:<8} {len(bars)} bars")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Walk-forward backtest of the IntelliStock hybrid predictor',
+                                     epilog='Runs offline from the fixture. Sentiment uses the technical indicators only: '
+                                            'news headline sentiment is always off and fundamentals are off by default, '
+                                            'since neither is available as of past cutoffs.')
+    parser.add_argument('symbols', nargs='*', help='Ticker symbols to backtest')
+    parser.add_argument('--symbols-file', help='File with one or more symbols per line')
+    parser.add_argument('--fixture-dir', required=True,
+                        help='Directory with <SYMBOL>.csv price history and optional fundamentals/<SYMBOL>.json')
+    parser.add_argument('--snapshot', action='store_true', help='Download the fixture from Yahoo Finance and exit')
+    parser.add_argument('--period', default='5y', help='History period downloaded by --snapshot')
+    parser.add_argument('--fundamentals', choices=['off', 'snapshot'], default='off',
+                        help='"snapshot" scores every cutoff with the fixture fundamentals, which look ahead '
+                             'to the snapshot date')
+    parser.add_argument('--folds', type=int, default=5, help='Walk-forward cutoffs per symbol')
+    parser.add_argument('--min-train', type=int, default=250, help='Bars of history before the first cutoff')
+    parser.add_argument('--horizons', default='1,5', help='Comma separated forecast horizons in days')
+    parser.add_argument('--lookback', type=int, default=60)
+    parser.add_argument('--epochs', type=int, default=10)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--forecast-mode', choices=['recursive', 'direct'],
+                        default=os.environ.get('LSTM_FORECAST_MODE', 'recursive'))
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument('--threads-per-worker', type=int, default=1)
+    parser.add_argument('--model-dir', default=os.environ.get('MODEL_DIR'))
+    parser.add_argument('--report', help='Path of the JSON report')
+    parser.add_argument('--baseline', help='Earlier report to compare against; exits 1 on a regression')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed stage latency increase over the baseline')
+    parser.add_argument('--max-accuracy-drop', type=float, default=0.05,
+                        help='Allowed drop in hybrid directional accuracy from the baseline')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    symbols = read_symbols(args)
+    if not symbols:
+        print('No symbols given')
+        return 2
+
+    if args.snapshot:
+        snapshot_fixture(symbols, args.fixture_dir, args.period)
+        return 0
+
+    from market_data.price_store import CsvHistorySource, normalize_bars
+    from models.model_registry import DEFAULT_MODEL_DIR
+    from models.backtest import walk_forward_cutoffs, run_fold, summarize, latency_stats, compare_to_baseline, STAGES
+
+    horizons = sorted({int(h) for h in args.horizons.split(',') if h.strip()})
+    options = {
+        'fixture_dir': os.path.abspath(args.fixture_dir),
+        'horizons': horizons,
+        'lookback': args.lookback,
+        'epochs': args.epochs,
+        'batch_size': args.batch_size,
+        'forecast_mode': args.forecast_mode,
+        'fundamentals': args.fundamentals,
+        'news': 'off'
+    }
+
+    source = CsvHistorySource(args.fixture_dir)
+    tasks = []
+    skipped = []
+    for symbol in symbols:
+        history = normalize_bars(source.fetch(symbol))
+        cutoffs = walk_forward_cutoffs(len(history) if history is not None else 0, args.folds,
+                                       max(args.min_train, args.lookback + 1), horizons[-1])
+        if not cutoffs:
+            skipped.append(symbol)
+            print(f"{symbol:<8} skipped: not enough history in the fixture")
+            continue
+        tasks.extend((symbol, history, cutoff) for cutoff in cutoffs)
+
+    if not tasks:
+        return 2
+
+    workers = max(1, min(args.workers, len(tasks)))
+    print("=" * 60)
+    print(f"Backtesting {len(symbols) - len(skipped)} symbols, {len(tasks)} folds with {workers} workers "
+          f"x {args.threads_per_worker} threads")
+    print("=" * 60)
+
+    started_at = datetime.now()
+    started = time.time()
+    folds, errors = [], []
+
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=limit_worker_threads, initargs=(args.threads_per_worker,)) as pool:
+        futures = {pool.submit(run_fold, symbol, history, cutoff, options): (symbol, cutoff)
+                   for symbol, history, cutoff in tasks}
+        for future in as_completed(futures):
+            symbol, cutoff = futures[future]
+            try:
+                fold = future.result()
+            except Exception as e:
+                errors.append({'symbol': symbol, 'cutoff': int(cutoff), 'reason': str(e)})
+                print(f"{symbol:<8} fold at bar {cutoff} failed: {e}")
+                continue
+            folds.append(fold)
+            print(f"{symbol:<8} {fold['cutoff']}  train={fold['timings']['train']:.1f}s "
+                  f"inference={fold['timings']['inference'] * 1000:.1f}ms")
+
+    wall_seconds = time.time() - started
+    rows = [row for fold in folds for row in fold['rows']]
+    inference_seconds = sum(fold['timings']['inference'] for fold in folds)
+
+    report = {
+        'started_at': started_at.isoformat(),
+        'finished_at': datetime.now().isoformat(),
+        'wall_seconds': round(wall_seconds, 2),
+        'parameters': dict(options, folds=args.folds, min_train=args.min_train, workers=workers,
+                           threads_per_worker=args.threads_per_worker),
+        'symbols': sorted({fold['symbol'] for fold in folds}),
+        'skipped': skipped,
+        'errors': errors,
+        'folds': len(folds),
+        'metrics': summarize(rows),
+        'latency': {stage: latency_stats([fold['timings'][stage] for fold in folds]) for stage in STAGES},
+        'throughput': {
+            'folds_per_second': round(len(folds) / wall_seconds, 4) if wall_seconds else None,
+            'inference_forecasts_per_second': round(len(folds) / inference_seconds, 2) if inference_seconds else None
+        },
+        'forecasts': rows
+    }
+
+    model_dir = os.path.abspath(args.model_dir or DEFAULT_MODEL_DIR)
+    report_path = args.report or os.path.join(model_dir, 'reports', f"backtest-{started_at.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(report_path)), exist_ok=True)
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print("=" * 60)
+    for days, metrics in report['metrics'].items():
+        accuracy, error = metrics['directional_accuracy'], metrics['mape']
+        print(f"{days:>3}d  direction lstm={accuracy['lstm']} hybrid={accuracy['hybrid']} sentiment={accuracy['sentiment']}"
+              f" | MAPE lstm={error['lstm']}% hybrid={error['hybrid']}% naive={error['naive']}%")
+    for stage in STAGES:
+        stats = report['latency'][stage]
+        if stats:
+            print(f"{stage:<10} p50={stats['p50_ms']:.1f}ms p95={stats['p95_ms']:.1f}ms")
+    print(f"Folds: {len(folds)} | Failed: {len(errors)} | Wall time: {report['wall_seconds']}s")
+    print(f"Report: {report_path}")
+    print("=" * 60)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(report, baseline, args.tolerance, args.max_accuracy_drop)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            return 1
+
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,34 @@
+import gc
+import os
+
+# gunicorn -c gunicorn.conf.py wsgi:app
+cpu_count = os.cpu_count() or 1
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8000)}"
+# Training job records are kept in MODEL_DIR/__jobs__, so a job can be polled on any worker
+workers = int(os.environ.get('WEB_CONCURRENCY', max(cpu_count // 2, 1)))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+# Background training runs in the workers, so allow slow requests to finish
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = 30
+# Import the app and warm the model registry once in the master; workers inherit it copy-on-write
+preload_app = True
+
+# Split the cores between workers instead of every worker starting a pool per core.
+# Set here because the BLAS and TensorFlow pools read these when they are first created.
+worker_threads = str(max(cpu_count // workers, 1))
+for name in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'TF_NUM_INTRAOP_THREADS'):
+    os.environ.setdefault(name, worker_threads)
+os.environ.setdefault('TF_NUM_INTEROP_THREADS', '1')
+os.environ.setdefault('WARM_UP', 'sync')
+
+
+def pre_fork(server, worker):
+    # Keep the preloaded objects out of the collector's generations, so a collection in a
+    # worker does not write to (and copy) every page they live on
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    server.log.info(f"Worker {worker.pid} started with {worker_threads} compute threads")
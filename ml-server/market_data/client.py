@@ -0,0 +1,295 @@
+import os
+import json
+import time
+import random
+import threading
+from concurrent.futures import Future
+import pandas as pd
+from monitoring.metrics import stage, UPSTREAM_REQUESTS
+
+# Exception class names (yfinance, curl_cffi, requests) worth another attempt
+RETRYABLE_ERRORS = {'YFRateLimitError', 'Timeout', 'ReadTimeout', 'ConnectTimeout', 'ConnectionError',
+                    'HTTPError', 'RequestException', 'CurlError'}
+
+
+class TransientError(Exception):
+    # Raised by transports for failures that a later attempt may not hit
+    pass
+
+
+def is_retryable(error):
+    if isinstance(error, (TransientError, TimeoutError, ConnectionError)):
+        return True
+    return any(cls.__name__ in RETRYABLE_ERRORS for cls in type(error).__mro__)
+
+
+class RateLimiter:
+    # Token bucket shared by every upstream call in the process: `rate` calls per second
+    # on average, with bursts of up to `burst`. A rate of 0 disables it.
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(rate, 1)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        if not self.rate:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Reserve the tokens now, so waiting callers are served in arrival order
+            self._tokens -= tokens
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+class YahooTransport:
+    # yfinance calls over one shared session. curl_cffi keeps a handle per thread,
+    # so each fetch thread reuses its connections instead of reconnecting per Ticker.
+    def __init__(self, timeout=None):
+        self.timeout = timeout or float(os.environ.get('MARKET_DATA_TIMEOUT_SECONDS', 10))
+        self._session = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        with self._lock:
+            if self._session is None:
+                try:
+                    from curl_cffi import requests as curl_requests
+                    self._session = curl_requests.Session(impersonate='chrome')
+                except ImportError:
+                    # Older yfinance releases bring their own requests session
+                    return None
+            return self._session
+
+    def _ticker(self, symbol):
+        import yfinance as yf
+        return yf.Ticker(symbol, session=self.session)
+
+    def history(self, symbol, start=None, period=None, interval=None):
+        if start is not None:
+            return self._ticker(symbol).history(start=start.strftime('%Y-%m-%d'), interval=interval or '1d', timeout=self.timeout)
+        return self._ticker(symbol).history(period=period or '5y', interval=interval or '1d', timeout=self.timeout)
+
+    def info(self, symbol):
+        return self._ticker(symbol).info
+
+    def news(self, symbol):
+        return self._ticker(symbol).news
+
+    def download(self, symbols, start=None, period=None, threads=1):
+        # Yahoo's chart API is per symbol: yf.download fans the chunk out over `threads`
+        # connections of the shared session and returns one frame grouped by ticker
+        import yfinance as yf
+        window = {'start': start.strftime('%Y-%m-%d')} if start is not None else {'period': period or '5y'}
+        data = yf.download(symbols, group_by='ticker', auto_adjust=True, threads=threads, progress=False,
+                           timeout=self.timeout, session=self.session, **window)
+        frames = {}
+        if data is None or len(data) == 0:
+            return frames
+        tickers = set(data.columns.get_level_values(0))
+        for symbol in symbols:
+            if symbol in tickers:
+                frame = data[symbol].dropna(how='all')
+                if len(frame):
+                    frames[symbol] = frame
+        return frames
+
+
+class FakeTransport:
+    # Local stand-in for Yahoo in tests and offline runs: serves in-memory frames and info
+    # dicts, or <directory>/<SYMBOL>.csv, .json and .news.json fixtures. `latency` adds a delay per
+    # call and `failures` makes the first N calls for each symbol raise TransientError.
+    def __init__(self, directory=None, histories=None, infos=None, latency=0.0, failures=0):
+        self.directory = directory
+        self.histories = {symbol.upper(): frame for symbol, frame in (histories or {}).items()}
+        self.infos = {symbol.upper(): info for symbol, info in (infos or {}).items()}
+        self.latency = latency
+        self.failures = failures
+        self.calls = []
+        self._failed = {}
+        self._lock = threading.Lock()
+
+    def _call(self, kind, symbol):
+        with self._lock:
+            self.calls.append((kind, symbol))
+            failed = self._failed.get((kind, symbol), 0)
+            if failed < self.failures:
+                self._failed[(kind, symbol)] = failed + 1
+        if self.latency:
+            time.sleep(self.latency)
+        if failed < self.failures:
+            raise TransientError(f"Simulated upstream failure for {kind} {symbol}")
+
+    def history(self, symbol, start=None, period=None, interval=None):
+        from .price_store import CsvHistorySource, period_start
+        symbol = symbol.upper()
+        self._call('history', symbol)
+        if symbol not in self.histories:
+            return CsvHistorySource(self.directory).fetch(symbol, start, period) if self.directory else pd.DataFrame()
+
+        data = self.histories[symbol]
+        if start is None and period is not None:
+            start = period_start(period, pd.Timestamp(data.index[-1]).normalize())
+        return data[data.index >= start] if start is not None else data
+
+    def info(self, symbol):
+        from .fundamentals_cache import JsonInfoFetcher
+        symbol = symbol.upper()
+        self._call('info', symbol)
+        if symbol not in self.infos:
+            return JsonInfoFetcher(self.directory)(symbol) if self.directory else {}
+        return dict(self.infos[symbol])
+
+    def news(self, symbol):
+        symbol = symbol.upper()
+        self._call('news', symbol)
+        path = os.path.join(self.directory, f"{symbol}.news.json") if self.directory else None
+        if path is None or not os.path.exists(path):
+            return []
+        with open(path) as f:
+            return json.load(f)
+
+    def download(self, symbols, start=None, period=None, threads=1):
+        frames = {}
+        for symbol in symbols:
+            frame = self.history(symbol, start=start, period=period)
+            if frame is not None and len(frame):
+                frames[symbol.upper()] = frame
+        return frames
+
+
+class MarketDataClient:
+    # Every upstream market-data call goes through here: a process-wide rate limit, a cap
+    # on concurrent calls, retries with jittered backoff, and coalescing, so concurrent
+    # callers asking for the same thing share one upstream call.
+    def __init__(self, transport=None, max_concurrency=None, rate=None, burst=None, max_retries=None,
+                 backoff=None, max_backoff=None, download_chunk=None):
+        self.transport = transport or YahooTransport()
+        self.max_concurrency = max_concurrency or int(os.environ.get('MARKET_DATA_MAX_CONCURRENCY', 4))
+        rate = rate if rate is not None else float(os.environ.get('MARKET_DATA_RATE_PER_SECOND', 4))
+        burst = burst or int(os.environ.get('MARKET_DATA_BURST', 8))
+        self.rate_limiter = RateLimiter(rate, burst)
+        self.max_retries = max_retries if max_retries is not None else int(os.environ.get('MARKET_DATA_MAX_RETRIES', 3))
+        self.backoff = backoff if backoff is not None else float(os.environ.get('MARKET_DATA_BACKOFF_SECONDS', 0.5))
+        self.max_backoff = max_backoff if max_backoff is not None else float(os.environ.get('MARKET_DATA_MAX_BACKOFF_SECONDS', 8))
+        # Symbols per grouped download call
+        self.download_chunk = download_chunk or int(os.environ.get('MARKET_DATA_DOWNLOAD_CHUNK', 50))
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._counters = {
+            'calls': 0,
+            'coalesced': 0,
+            'retries': 0,
+            'errors': 0
+        }
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def _attempt(self, kind, symbol, call, cost=1):
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire(cost)
+            with self._slots:
+                try:
+                    return call()
+                except Exception as e:
+                    if attempt == self.max_retries or not is_retryable(e):
+                        raise
+                    error = e
+            # "Full jitter": a random delay up to the exponential bound, so callers that
+            # were rate limited together do not all come back at the same moment
+            delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+            self._count('retries')
+            UPSTREAM_REQUESTS.inc(kind=kind, outcome='retry')
+            print(f"Retrying {kind} for {symbol} in {delay:.2f}s after: {error}")
+            time.sleep(delay)
+
+    def _coalesced(self, kind, symbol, args, call, cost=1):
+        key = (kind, symbol, args)
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+                self._counters['calls'] += 1
+            else:
+                self._counters['coalesced'] += 1
+
+        if not leader:
+            UPSTREAM_REQUESTS.inc(kind=kind, outcome='coalesced')
+            return future.result()
+
+        try:
+            with stage(f"upstream_{kind}"):
+                result = self._attempt(kind, symbol, call, cost)
+        except BaseException as e:
+            self._count('errors')
+            UPSTREAM_REQUESTS.inc(kind=kind, outcome='error')
+            future.set_exception(e)
+            raise
+        else:
+            UPSTREAM_REQUESTS.inc(kind=kind, outcome='ok')
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def history(self, symbol, start=None, period=None, interval=None):
+        symbol = symbol.upper()
+        args = (start.strftime('%Y-%m-%d') if start is not None else None, period, interval)
+        return self._coalesced('history', symbol, args,
+                               lambda: self.transport.history(symbol, start=start, period=period, interval=interval))
+
+    def info(self, symbol):
+        symbol = symbol.upper()
+        return self._coalesced('info', symbol, (), lambda: self.transport.info(symbol))
+
+    def news(self, symbol):
+        symbol = symbol.upper()
+        return self._coalesced('news', symbol, (), lambda: self.transport.news(symbol))
+
+    def download(self, symbols, start=None, period=None):
+        # Histories of many symbols as {symbol: DataFrame}, one grouped call per chunk.
+        # A chunk costs one rate-limit token per symbol, since upstream still sees a request each.
+        symbols = list(dict.fromkeys(symbol.upper() for symbol in symbols))
+        window = (start.strftime('%Y-%m-%d') if start is not None else None, period)
+        threads = max(1, self.max_concurrency)
+        frames = {}
+        for offset in range(0, len(symbols), self.download_chunk):
+            chunk = symbols[offset:offset + self.download_chunk]
+            frames.update(self._coalesced(
+                'download', f"{len(chunk)} symbols", (tuple(chunk),) + window,
+                lambda chunk=chunk: self.transport.download(chunk, start=start, period=period, threads=threads),
+                cost=len(chunk)))
+        return frames
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['in_flight'] = len(self._inflight)
+        return stats
+
+
+_default_client = None
+_default_lock = threading.Lock()
+
+
+def get_client():
+    # One client per process, so the rate limit and the session cover every caller.
+    # MARKET_DATA_FIXTURE_DIR serves CSV/JSON fixtures through the fake transport instead.
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            fixture_dir = os.environ.get('MARKET_DATA_FIXTURE_DIR')
+            _default_client = MarketDataClient(FakeTransport(fixture_dir) if fixture_dir else None)
+        return _default_client
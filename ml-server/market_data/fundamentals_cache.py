@@ -0,0 +1,141 @@
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from monitoring.metrics import stage
+from .client import get_client
+
+
+def fetch_stock_info(symbol):
+    return get_client().info(symbol)
+
+
+class JsonInfoFetcher:
+    # Reads <directory>/<SYMBOL>.json instead of calling yfinance, e.g. for offline backtests
+    def __init__(self, directory):
+        self.directory = directory
+
+    def __call__(self, symbol):
+        path = os.path.join(self.directory, f"{symbol.upper()}.json")
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+
+def is_empty_info(info):
+    # yfinance returns an empty dict, or one with only None values, for unknown tickers
+    return not info or not any(value is not None for value in info.values())
+
+
+class _Entry:
+    def __init__(self, value, fetched_at, negative):
+        self.value = value
+        self.fetched_at = fetched_at
+        self.negative = negative
+
+
+class FundamentalsCache:
+    def __init__(self, fetcher=None, ttl=None, stale_ttl=None, negative_ttl=None, max_size=None):
+        self.fetcher = fetcher or fetch_stock_info
+        self.ttl = ttl if ttl is not None else int(os.environ.get('FUNDAMENTALS_TTL_SECONDS', 6 * 3600))
+        self.stale_ttl = stale_ttl if stale_ttl is not None else int(os.environ.get('FUNDAMENTALS_STALE_SECONDS', 24 * 3600))
+        self.negative_ttl = negative_ttl if negative_ttl is not None else int(os.environ.get('FUNDAMENTALS_NEGATIVE_TTL_SECONDS', 3600))
+        self.max_size = max_size if max_size is not None else int(os.environ.get('FUNDAMENTALS_CACHE_SIZE', 1000))
+        self._entries = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._counters = {
+            'hits': 0,
+            'stale_hits': 0,
+            'negative_hits': 0,
+            'misses': 0,
+            'refreshes': 0,
+            'errors': 0
+        }
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def _store(self, symbol, info):
+        entry = _Entry(info, time.time(), is_empty_info(info))
+        with self._lock:
+            self._entries[symbol] = entry
+            self._entries.move_to_end(symbol)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return entry
+
+    def _fetch(self, symbol):
+        try:
+            with stage('fundamentals_fetch'):
+                info = self.fetcher(symbol) or {}
+            return self._store(symbol, info)
+        except Exception as e:
+            # Not cached: an upstream failure says nothing about the ticker itself
+            print(f"Error fetching stock info for {symbol}: {e}")
+            self._count('errors')
+            return None
+
+    def _refresh_in_background(self, symbol):
+        with self._lock:
+            if symbol in self._refreshing:
+                return
+            self._refreshing.add(symbol)
+
+        def refresh():
+            try:
+                self._count('refreshes')
+                self._fetch(symbol)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(symbol)
+
+        threading.Thread(target=refresh, name=f"fundamentals-{symbol}", daemon=True).start()
+
+    def get(self, symbol):
+        symbol = symbol.upper()
+        with self._lock:
+            entry = self._entries.get(symbol)
+            if entry is not None:
+                self._entries.move_to_end(symbol)
+
+        if entry is not None:
+            age = time.time() - entry.fetched_at
+            if entry.negative and age < self.negative_ttl:
+                self._count('negative_hits')
+                return entry.value
+            if not entry.negative and age < self.ttl:
+                self._count('hits')
+                return entry.value
+            if not entry.negative and age < self.ttl + self.stale_ttl:
+                # Serve the last good value while a background refresh runs
+                self._count('stale_hits')
+                self._refresh_in_background(symbol)
+                return entry.value
+
+        self._count('misses')
+        fetched = self._fetch(symbol)
+        if fetched is not None:
+            return fetched.value
+        # Upstream failed: fall back to the last good value, however old
+        if entry is not None and not entry.negative:
+            return entry.value
+        return {}
+
+    def invalidate(self, symbol=None):
+        with self._lock:
+            if symbol is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(symbol.upper(), None)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['size'] = len(self._entries)
+        lookups = stats['hits'] + stats['stale_hits'] + stats['negative_hits'] + stats['misses']
+        stats['hit_rate'] = round((lookups - stats['misses']) / lookups, 4) if lookups else 0.0
+        return stats
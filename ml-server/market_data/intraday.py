@@ -0,0 +1,342 @@
+import os
+import time
+import queue
+import threading
+import numpy as np
+import pandas as pd
+from .price_store import COLUMNS
+from .client import get_client
+
+INTERVAL_SECONDS = {'1m': 60, '2m': 120, '5m': 300, '15m': 900, '30m': 1800, '60m': 3600, '90m': 5400}
+
+# Yahoo keeps 1m bars for about a week and the other intraday sizes for 60 days
+BACKFILL_PERIODS = {'1m': '5d'}
+
+
+def intraday_bars(data):
+    # Like normalize_bars, but keeps the time of day: exchange wall-clock times, oldest first
+    if data is None or len(data) == 0:
+        return None
+    bars = data[COLUMNS].astype('float64')
+    index = pd.DatetimeIndex(bars.index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    bars.index = index
+    bars = bars[~bars.index.duplicated(keep='last')].sort_index()
+    return bars.dropna(subset=['Close'])
+
+
+class BarRing:
+    # The latest `capacity` bars of one symbol in preallocated arrays; appending a bar
+    # overwrites the oldest one instead of growing a DataFrame
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.times = np.empty(capacity, dtype='datetime64[ns]')
+        self.values = np.empty((capacity, len(COLUMNS)))
+        self.count = 0
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    @property
+    def last_time(self):
+        if not self.count:
+            return None
+        return pd.Timestamp(self.times[(self.count - 1) % self.capacity])
+
+    def append(self, time, values):
+        i = self.count % self.capacity
+        self.times[i] = np.datetime64(pd.Timestamp(time).to_datetime64(), 'ns')
+        self.values[i] = values
+        self.count += 1
+
+    def frame(self):
+        # Oldest first, with the columns of the daily histories, so the indicator and LSTM code take it as is
+        size = len(self)
+        order = np.arange(self.count - size, self.count) % self.capacity
+        return pd.DataFrame(self.values[order], index=pd.DatetimeIndex(self.times[order]), columns=COLUMNS)
+
+
+class ReplaySource:
+    # Plays back a CSV of bars (Datetime, Symbol, Open, High, Low, Close, Volume) as if
+    # they were arriving live, e.g. to drive the feed in tests. `speed` is seconds of
+    # bar time per wall-clock second (60 plays one 1m bar a second); 0 plays everything at once.
+    def __init__(self, path, speed=0.0, poll_seconds=0.05):
+        data = pd.read_csv(path, parse_dates=['Datetime']).sort_values('Datetime', kind='stable')
+        times = pd.DatetimeIndex(data['Datetime'])
+        if times.tz is not None:
+            times = times.tz_localize(None)
+        self.times = pd.DatetimeIndex(times.values.astype('datetime64[ns]'))
+        self.symbols = data['Symbol'].str.upper().values
+        self.values = data[COLUMNS].values.astype('float64')
+        self.speed = speed
+        self.poll_seconds = poll_seconds
+        self.position = 0
+        self.started = None
+
+    def backfill(self, symbol):
+        # The symbol's bars played so far
+        played = np.flatnonzero(self.symbols[:self.position] == symbol.upper())
+        if not len(played):
+            return None
+        return pd.DataFrame(self.values[played], index=self.times[played], columns=COLUMNS)
+
+    def poll(self, symbols):
+        # Bars due by now, or None once the file is exhausted
+        if self.position >= len(self.times):
+            return None
+        if self.started is None:
+            self.started = time.monotonic()
+
+        stop = len(self.times)
+        if self.speed:
+            clock = self.times[0] + pd.Timedelta(seconds=(time.monotonic() - self.started) * self.speed)
+            stop = self.times.searchsorted(clock, side='right')
+
+        bars = [(self.symbols[i], self.times[i], self.values[i]) for i in range(self.position, stop)]
+        self.position = stop
+        return bars
+
+
+class YahooIntradaySource:
+    # Polls the shared market data client for each watched symbol's bars of the day
+    def __init__(self, interval='5m', client=None, poll_seconds=None, backfill_period=None):
+        self.interval = interval
+        self.client = client
+        self.poll_seconds = poll_seconds or float(os.environ.get('INTRADAY_POLL_SECONDS', 30))
+        self.backfill_period = backfill_period or BACKFILL_PERIODS.get(interval, '1mo')
+
+    def backfill(self, symbol):
+        bars = intraday_bars((self.client or get_client()).history(symbol, period=self.backfill_period, interval=self.interval))
+        # The newest bar is still forming until the next one starts
+        return bars.iloc[:-1] if bars is not None else None
+
+    def poll(self, symbols):
+        bars = []
+        for symbol in symbols:
+            try:
+                frame = intraday_bars((self.client or get_client()).history(symbol, period='1d', interval=self.interval))
+            except Exception as e:
+                print(f"Error polling intraday bars for {symbol}: {e}")
+                continue
+            if frame is None:
+                continue
+            frame = frame.iloc[:-1]
+            bars.extend((symbol, bar_time, values) for bar_time, values in zip(frame.index, frame.values))
+        return sorted(bars, key=lambda bar: bar[1])
+
+
+def make_source(interval, spec=None):
+    # INTRADAY_SOURCE: "yahoo" (default) or "replay:<path to csv>"
+    spec = spec or os.environ.get('INTRADAY_SOURCE', 'yahoo')
+    if spec.startswith('replay:'):
+        return ReplaySource(spec[len('replay:'):], speed=float(os.environ.get('INTRADAY_REPLAY_SPEED', 0)))
+    if spec != 'yahoo':
+        raise ValueError(f"Unknown intraday source: {spec}")
+    return YahooIntradaySource(interval)
+
+
+class StreamLimitError(Exception):
+    pass
+
+
+class IntradayFeed:
+    # Streaming ingestion: a background thread polls the source and appends every new
+    # bar of the watched symbols to their ring buffers, then hands the symbol's bars to
+    # the listeners. The thread starts with the first watched symbol, so it runs in each
+    # worker process rather than in a preloading master, and stops with the last one.
+    def __init__(self, source, interval='5m', capacity=2000):
+        self.source = source
+        self.interval = interval
+        self.capacity = capacity
+        self.rings = {}
+        self.watched = {}
+        self.listeners = []
+        self.bars_ingested = 0
+        self._lock = threading.Lock()
+        self._stop = None
+        self._thread = None
+
+    def add_listener(self, callback):
+        # callback(symbol, frame) after each new bar, on the ingestion thread
+        self.listeners.append(callback)
+
+    def symbols(self):
+        with self._lock:
+            return list(self.watched)
+
+    def watch(self, symbols):
+        symbols = [symbol.upper() for symbol in symbols]
+        added = []
+        with self._lock:
+            for symbol in symbols:
+                self.watched[symbol] = self.watched.get(symbol, 0) + 1
+                if symbol not in self.rings:
+                    self.rings[symbol] = BarRing(self.capacity)
+                    added.append(symbol)
+
+        for symbol in added:
+            try:
+                bars = self.source.backfill(symbol)
+            except Exception as e:
+                print(f"Error backfilling intraday bars for {symbol}: {e}")
+                bars = None
+            if bars is not None and len(bars):
+                with self._lock:
+                    ring = self.rings.get(symbol)
+                    if ring is None:
+                        # Unwatched again while backfilling
+                        continue
+                    for bar_time, values in zip(bars.index[-self.capacity:], bars.values[-self.capacity:]):
+                        ring.append(bar_time, values)
+                self._notify(symbol)
+        self.start()
+
+    def unwatch(self, symbols):
+        # Symbols nobody watches any more stop being polled and their bars are dropped.
+        # Returns those symbols.
+        evicted = []
+        with self._lock:
+            for symbol in (symbol.upper() for symbol in symbols):
+                if self.watched.get(symbol, 0) <= 1:
+                    self.watched.pop(symbol, None)
+                    self.rings.pop(symbol, None)
+                    evicted.append(symbol)
+                else:
+                    self.watched[symbol] -= 1
+            if not self.watched and self._stop is not None:
+                self._stop.set()
+        return evicted
+
+    def frame(self, symbol):
+        with self._lock:
+            ring = self.rings.get(symbol.upper())
+            return ring.frame() if ring is not None and len(ring) else None
+
+    def snapshot(self, symbol):
+        # Bars of a symbol without watching it: its buffer if watched, else a one-off backfill
+        frame = self.frame(symbol)
+        if frame is not None:
+            return frame
+        bars = self.source.backfill(symbol.upper())
+        return bars.iloc[-self.capacity:] if bars is not None and len(bars) else None
+
+    def ingest(self, symbol, bar_time, values):
+        # Returns False for a bar of an unwatched symbol, or one not newer than the last one kept
+        symbol = symbol.upper()
+        with self._lock:
+            ring = self.rings.get(symbol)
+            if ring is None:
+                return False
+            if ring.last_time is not None and pd.Timestamp(bar_time) <= ring.last_time:
+                return False
+            ring.append(bar_time, values)
+            self.bars_ingested += 1
+        self._notify(symbol)
+        return True
+
+    def _notify(self, symbol):
+        frame = self.frame(symbol)
+        for callback in self.listeners:
+            try:
+                callback(symbol, frame)
+            except Exception as e:
+                print(f"Intraday listener error for {symbol}: {e}")
+
+    def start(self):
+        with self._lock:
+            if self.running:
+                return
+            # Each thread gets its own stop event, so a stopping thread cannot outlive a restart
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, args=(self._stop,), name='intraday-feed', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            if self._stop is not None:
+                self._stop.set()
+
+    def _run(self, stop):
+        print(f"Intraday feed started ({self.interval} bars from {type(self.source).__name__})")
+        while not stop.is_set():
+            try:
+                bars = self.source.poll(self.symbols())
+            except Exception as e:
+                print(f"Intraday poll error: {e}")
+                bars = []
+            if bars is None:
+                print("Intraday source exhausted")
+                break
+            for symbol, bar_time, values in bars:
+                self.ingest(symbol, bar_time, values)
+            stop.wait(self.source.poll_seconds)
+        print("Intraday feed stopped")
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive() and not self._stop.is_set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'interval': self.interval,
+                'running': self.running,
+                'watched': len(self.watched),
+                'symbols': len(self.rings),
+                'barsIngested': self.bars_ingested
+            }
+
+
+class Subscription:
+    def __init__(self, symbols, max_queued=100):
+        self.symbols = set(symbols)
+        self.queue = queue.Queue(max_queued)
+
+    def put(self, event):
+        # A subscriber that falls behind loses its oldest events instead of blocking ingestion
+        while True:
+            try:
+                self.queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout=None):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class Broadcaster:
+    # Fans (event, payload) pairs for a symbol out to the subscriptions that asked for it.
+    # Each subscription holds a request thread for as long as its stream is open, so at
+    # most `max_subscriptions` are taken at a time.
+    def __init__(self, max_queued=100, max_subscriptions=None):
+        self.max_queued = max_queued
+        self.max_subscriptions = max_subscriptions
+        self.subscriptions = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, symbols):
+        subscription = Subscription(symbols, self.max_queued)
+        with self._lock:
+            if self.max_subscriptions is not None and len(self.subscriptions) >= self.max_subscriptions:
+                raise StreamLimitError(f"Too many open intraday streams ({self.max_subscriptions})")
+            self.subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self.subscriptions.discard(subscription)
+
+    def publish(self, symbol, event, payload):
+        with self._lock:
+            targets = [s for s in self.subscriptions if symbol in s.symbols]
+        for subscription in targets:
+            subscription.put((event, payload))
+        return len(targets)
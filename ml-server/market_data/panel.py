@@ -0,0 +1,103 @@
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from .price_store import COLUMNS, normalize_bars
+from .client import get_client
+
+
+class PricePanel:
+    # Daily bars of many symbols in one contiguous (symbols, dates, OHLCV) float32 array,
+    # aligned on the union of their trading days. Each symbol covers [start, stop) of the
+    # shared calendar; frame() and array() are views of that range, never copies.
+    def __init__(self, symbols, dates, values, bounds):
+        self.symbols = list(symbols)
+        self.dates = pd.DatetimeIndex(dates)
+        self.values = values
+        self.bounds = np.asarray(bounds, dtype='int64').reshape(len(self.symbols), 2)
+        self._rows = {symbol: i for i, symbol in enumerate(self.symbols)}
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __contains__(self, symbol):
+        return symbol.upper() in self._rows
+
+    @classmethod
+    def from_frames(cls, frames, dtype='float32'):
+        frames = {symbol.upper(): normalize_bars(frame) for symbol, frame in frames.items()}
+        frames = {symbol: frame for symbol, frame in frames.items() if frame is not None and len(frame)}
+        symbols = sorted(frames)
+        dates = pd.DatetimeIndex(sorted(set().union(*(frame.index for frame in frames.values()))))
+
+        values = np.full((len(symbols), len(dates), len(COLUMNS)), np.nan, dtype=dtype)
+        bounds = np.zeros((len(symbols), 2), dtype='int64')
+        for i, symbol in enumerate(symbols):
+            frame = frames[symbol]
+            start, stop = dates.searchsorted(frame.index[0]), dates.searchsorted(frame.index[-1]) + 1
+            aligned = frame.reindex(dates[start:stop])
+            # Days inside its own range on which this symbol did not trade: flat bar at the last close
+            close = aligned['Close'].ffill()
+            for column in ('Open', 'High', 'Low'):
+                aligned[column] = aligned[column].fillna(close)
+            aligned['Close'] = close
+            aligned['Volume'] = aligned['Volume'].fillna(0)
+            values[i, start:stop] = aligned[COLUMNS].values
+            bounds[i] = start, stop
+
+        return cls(symbols, dates, values, bounds)
+
+    def _range(self, symbol):
+        i = self._rows[symbol.upper()]
+        start, stop = self.bounds[i]
+        return i, start, stop
+
+    def array(self, symbol):
+        i, start, stop = self._range(symbol)
+        return self.values[i, start:stop]
+
+    def frame(self, symbol):
+        # Same shape as PriceStore.get_history, so it feeds the LSTM and indicator code directly
+        i, start, stop = self._range(symbol)
+        return pd.DataFrame(self.values[i, start:stop], index=self.dates[start:stop], columns=COLUMNS, copy=False)
+
+    def frames(self):
+        return {symbol: self.frame(symbol) for symbol in self.symbols}
+
+    def save(self, path):
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        os.makedirs(tmp_path, exist_ok=True)
+        np.save(os.path.join(tmp_path, 'values.npy'), np.ascontiguousarray(self.values))
+        np.save(os.path.join(tmp_path, 'dates.npy'), self.dates.values.astype('datetime64[ns]'))
+        with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+            json.dump({
+                'symbols': self.symbols,
+                'bounds': self.bounds.tolist(),
+                'columns': COLUMNS,
+                'dtype': str(self.values.dtype),
+                'saved_at': datetime.now().isoformat()
+            }, f)
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        # Memory-mapped by default: processes loading the same panel share its pages
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        values = np.load(os.path.join(path, 'values.npy'), mmap_mode='r' if mmap else None)
+        dates = np.load(os.path.join(path, 'dates.npy'))
+        return cls(meta['symbols'], dates, values, meta['bounds'])
+
+
+def download_panel(symbols, period='2y', client=None):
+    # One grouped download for the whole universe instead of a history call per symbol
+    frames = (client or get_client()).download(symbols, period=period)
+    missing = [symbol.upper() for symbol in symbols if symbol.upper() not in frames]
+    if missing:
+        print(f"No history downloaded for {', '.join(missing)}")
+    return PricePanel.from_frames(frames)
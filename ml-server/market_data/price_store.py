@@ -0,0 +1,278 @@
+import os
+import re
+import json
+import time
+import threading
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from .client import get_client
+
+COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+DEFAULT_STORE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'price_store')
+
+PERIOD_OFFSETS = {
+    '1d': pd.DateOffset(days=1),
+    '5d': pd.DateOffset(days=5),
+    '1mo': pd.DateOffset(months=1),
+    '3mo': pd.DateOffset(months=3),
+    '6mo': pd.DateOffset(months=6),
+    '1y': pd.DateOffset(years=1),
+    '2y': pd.DateOffset(years=2),
+    '5y': pd.DateOffset(years=5),
+    '10y': pd.DateOffset(years=10)
+}
+
+
+def period_start(period, today=None):
+    today = today if today is not None else pd.Timestamp.now().normalize()
+    if period == 'max':
+        return None
+    if period == 'ytd':
+        return pd.Timestamp(year=today.year, month=1, day=1)
+    if period not in PERIOD_OFFSETS:
+        raise ValueError(f"Unsupported period: {period}")
+    return today - PERIOD_OFFSETS[period]
+
+
+def normalize_bars(data):
+    if data is None or len(data) == 0:
+        return None
+    bars = data[COLUMNS].astype('float64')
+    index = pd.DatetimeIndex(bars.index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    bars.index = index.normalize()
+    bars = bars[~bars.index.duplicated(keep='last')].sort_index()
+    return bars.dropna(subset=['Close'])
+
+
+class YahooHistorySource:
+    def __init__(self, client=None):
+        self.client = client
+
+    def fetch(self, symbol, start=None, period=None):
+        # Through the shared market data client: rate limited, retried and coalesced
+        return (self.client or get_client()).history(symbol, start=start, period=period)
+
+    def download(self, symbols, start=None, period=None):
+        return (self.client or get_client()).download(symbols, start=start, period=period)
+
+
+class CsvHistorySource:
+    # Reads <directory>/<SYMBOL>.csv with a Date column plus OHLCV, e.g. for tests and backtests
+    def __init__(self, directory):
+        self.directory = directory
+
+    def fetch(self, symbol, start=None, period=None):
+        path = os.path.join(self.directory, f"{symbol.upper()}.csv")
+        if not os.path.exists(path):
+            return None
+        data = pd.read_csv(path, index_col=0, parse_dates=True)
+        if start is None and period is not None:
+            start = period_start(period, pd.Timestamp(data.index[-1]).normalize())
+        if start is not None:
+            data = data[data.index >= start]
+        return data
+
+    def download(self, symbols, start=None, period=None):
+        frames = {symbol.upper(): self.fetch(symbol, start, period) for symbol in symbols}
+        return {symbol: frame for symbol, frame in frames.items() if frame is not None}
+
+
+class _SymbolHistory:
+    def __init__(self, frame, coverage_start, checked_at):
+        self.frame = frame
+        self.coverage_start = coverage_start
+        self.checked_at = checked_at
+
+
+class PriceStore:
+    def __init__(self, root=None, source=None, backfill_period=None, refresh_seconds=None):
+        self.root = root or os.environ.get('PRICE_STORE_DIR', DEFAULT_STORE_DIR)
+        self.source = source or YahooHistorySource()
+        self.backfill_period = backfill_period or os.environ.get('PRICE_BACKFILL_PERIOD', '5y')
+        self.refresh_seconds = refresh_seconds if refresh_seconds is not None else int(os.environ.get('PRICE_REFRESH_SECONDS', 900))
+        self._histories = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def _symbol_lock(self, symbol):
+        with self._lock:
+            return self._locks.setdefault(symbol, threading.Lock())
+
+    def _paths(self, symbol):
+        base = os.path.join(self.root, re.sub(r'[^A-Za-z0-9._^-]', '_', symbol))
+        return f"{base}.dates.npy", f"{base}.ohlcv.npy", f"{base}.json"
+
+    def _read(self, symbol):
+        dates_path, values_path, meta_path = self._paths(symbol)
+        if not os.path.exists(meta_path):
+            return None
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            dates = np.load(dates_path)
+            values = np.load(values_path, mmap_mode='r')
+        except Exception as e:
+            print(f"Error reading stored prices for {symbol}: {e}")
+            return None
+        frame = pd.DataFrame(values, index=pd.DatetimeIndex(dates), columns=COLUMNS, copy=False)
+        coverage_start = pd.Timestamp(meta['coverage_start']) if meta.get('coverage_start') else None
+        return _SymbolHistory(frame, coverage_start, meta.get('checked_at', 0))
+
+    def _write(self, symbol, history, bars_changed=True):
+        dates_path, values_path, meta_path = self._paths(symbol)
+        meta = {
+            'symbol': symbol,
+            'coverage_start': history.coverage_start.strftime('%Y-%m-%d') if history.coverage_start is not None else None,
+            'last_bar': history.frame.index[-1].strftime('%Y-%m-%d'),
+            'bars': len(history.frame),
+            'checked_at': history.checked_at,
+            'updated_at': datetime.now().isoformat()
+        }
+        # Write to temp files and swap in, so readers holding an old memory map stay valid
+        if bars_changed:
+            for path, array in ((dates_path, history.frame.index.values.astype('datetime64[ns]')),
+                                (values_path, np.ascontiguousarray(history.frame.values, dtype='float64'))):
+                with open(f"{path}.tmp", 'wb') as f:
+                    np.save(f, array)
+                os.replace(f"{path}.tmp", path)
+        with open(f"{meta_path}.tmp", 'w') as f:
+            json.dump(meta, f)
+        os.replace(f"{meta_path}.tmp", meta_path)
+
+    def _backfill_period(self, start):
+        if start is None:
+            return 'max'
+        if self.backfill_period != 'max' and start < period_start(self.backfill_period):
+            # Requested more history than the default backfill, fetch everything available
+            return 'max'
+        return self.backfill_period
+
+    def _needs_backfill(self, history, start):
+        return history is None or (history.coverage_start is not None and (start is None or start < history.coverage_start))
+
+    def _backfill(self, symbol, start, fetched=None):
+        period = self._backfill_period(start)
+        bars = normalize_bars(fetched if fetched is not None else self.source.fetch(symbol, period=period))
+        if bars is None:
+            return None
+        return _SymbolHistory(bars, period_start(period), time.time())
+
+    def _append_new_bars(self, symbol, history, fetched=None):
+        last_date = history.frame.index[-1]
+        # Refetch the last stored bar too, since it may have been a partial session
+        bars = normalize_bars(fetched if fetched is not None else self.source.fetch(symbol, start=last_date))
+        history.checked_at = time.time()
+        if bars is None:
+            return history
+        bars = bars[bars.index >= last_date]
+        if len(bars) == 1 and bars.iloc[0].equals(history.frame.iloc[-1]):
+            return history
+        kept = history.frame[history.frame.index < bars.index[0]] if len(bars) else history.frame
+        frame = pd.concat([kept, bars])
+        return _SymbolHistory(frame, history.coverage_start, history.checked_at)
+
+    def refresh(self, symbol, period=None, force=False):
+        symbol = symbol.upper()
+        start = period_start(period or self.backfill_period)
+
+        with self._symbol_lock(symbol):
+            history = self._histories.get(symbol) or self._read(symbol)
+
+            try:
+                if self._needs_backfill(history, start):
+                    fetched = self._backfill(symbol, start)
+                    if fetched is not None:
+                        history = fetched
+                        self._write(symbol, history)
+                elif force or time.time() - history.checked_at > self.refresh_seconds:
+                    previous = history
+                    history = self._append_new_bars(symbol, history)
+                    if history.frame.index[-1] > previous.frame.index[-1]:
+                        print(f"Appended {symbol} bars after {previous.frame.index[-1].strftime('%Y-%m-%d')}")
+                    self._write(symbol, history, bars_changed=history is not previous)
+            except Exception as e:
+                # Serve whatever is stored if the upstream fetch fails
+                print(f"Error refreshing prices for {symbol}: {e}")
+
+            if history is not None:
+                self._histories[symbol] = history
+            return history
+
+    def refresh_many(self, symbols, period=None):
+        # Brings many symbols up to date with one grouped download for those that need a
+        # backfill and one for those that are stale (instead of a history call each).
+        # get_history() then serves them from the store without going upstream.
+        symbols = list(dict.fromkeys(symbol.upper() for symbol in symbols))
+        start = period_start(period or self.backfill_period)
+        download = getattr(self.source, 'download', None)
+        if download is None:
+            return {symbol: self.refresh(symbol, period) for symbol in symbols}
+
+        backfill, stale = [], []
+        for symbol in symbols:
+            history = self._histories.get(symbol) or self._read(symbol)
+            if history is not None:
+                self._histories[symbol] = history
+            if self._needs_backfill(history, start):
+                backfill.append(symbol)
+            elif time.time() - history.checked_at > self.refresh_seconds:
+                stale.append(symbol)
+
+        fetched = {}
+        try:
+            if backfill:
+                fetched.update(download(backfill, period=self._backfill_period(start)))
+            if stale:
+                since = min(self._histories[symbol].frame.index[-1] for symbol in stale)
+                fetched.update(download(stale, start=since))
+        except Exception as e:
+            # The per-symbol refresh below falls back to what is stored
+            print(f"Error downloading prices for {len(backfill) + len(stale)} symbols: {e}")
+
+        histories = {}
+        for symbol in symbols:
+            if symbol not in fetched:
+                histories[symbol] = self._histories.get(symbol)
+                continue
+            with self._symbol_lock(symbol):
+                history = self._histories.get(symbol)
+                if symbol in backfill:
+                    history = self._backfill(symbol, start, fetched[symbol])
+                    bars_changed = True
+                else:
+                    previous = history
+                    history = self._append_new_bars(symbol, history, fetched[symbol])
+                    bars_changed = history is not previous
+                if history is not None:
+                    self._write(symbol, history, bars_changed=bars_changed)
+                    self._histories[symbol] = history
+                histories[symbol] = history
+        return histories
+
+    def get_history(self, symbol, period='2y'):
+        history = self.refresh(symbol, period)
+        if history is None or len(history.frame) == 0:
+            return None
+
+        start = period_start(period, history.frame.index[-1])
+        if start is None:
+            return history.frame
+        # Positional slice keeps every period a view of the same stored frame
+        offset = history.frame.index.searchsorted(start)
+        return history.frame.iloc[offset:]
+
+    def symbols(self):
+        # Every symbol with stored bars, e.g. the default universe of the screener
+        stored = {name[:-len('.json')] for name in os.listdir(self.root) if name.endswith('.json')}
+        return sorted(stored | set(self._histories))
+
+    def last_bar_date(self, symbol):
+        history = self._histories.get(symbol.upper())
+        if history is None or len(history.frame) == 0:
+            return None
+        return history.frame.index[-1]
@@ -0,0 +1,202 @@
+import os
+import json
+import glob
+import time
+import tempfile
+import numpy as np
+
+STAGES = ('train', 'inference', 'sentiment', 'blend')
+
+_worker = {}
+
+
+def walk_forward_cutoffs(length, folds, min_train, horizon):
+    # Bar positions where each fold's history ends; every fold keeps `horizon`
+    # later bars to score its forecast against
+    last = length - horizon
+    if last < min_train or folds < 1:
+        return []
+    if folds == 1:
+        return [last]
+    step = (last - min_train) / (folds - 1)
+    return sorted(set(int(round(min_train + i * step)) for i in range(folds)))
+
+
+def _no_fundamentals(symbol):
+    return {}
+
+
+def _predictor(options):
+    # One hybrid predictor per worker process. News headlines are left out: the live feed
+    # would need the network and would score historical cutoffs with today's headlines.
+    # Fundamentals are left out too unless options['fundamentals'] is 'snapshot': the
+    # fixture only holds them as of the snapshot, so every cutoff would see later figures.
+    if 'predictor' not in _worker:
+        from market_data.fundamentals_cache import FundamentalsCache, JsonInfoFetcher
+        from .hybrid_predictor import HybridStockPredictor
+        from .lstm_model import LSTMStockPredictor
+
+        fetcher = _no_fundamentals
+        if options.get('fundamentals') == 'snapshot':
+            fetcher = JsonInfoFetcher(os.path.join(options['fixture_dir'], 'fundamentals'))
+        predictor = HybridStockPredictor(fundamentals_cache=FundamentalsCache(fetcher=fetcher))
+        predictor.sentiment_analyzer.news_sentiment = None
+        predictor.lstm_model = LSTMStockPredictor(
+            lookback=options['lookback'],
+            epochs=options['epochs'],
+            batch_size=options['batch_size'],
+            forecast_mode=options['forecast_mode']
+        )
+
+        # Time the sentiment stage separately from the rest of the blend
+        analyzer = predictor.sentiment_analyzer
+        analyze = analyzer.analyze_market_sentiment
+
+        def timed_analyze(symbol, data):
+            started = time.perf_counter()
+            try:
+                return analyze(symbol, data)
+            finally:
+                _worker['sentiment_seconds'] += time.perf_counter() - started
+
+        analyzer.analyze_market_sentiment = timed_analyze
+        _worker['predictor'] = predictor
+    return _worker['predictor']
+
+
+def run_fold(symbol, history, cutoff, options):
+    # Trains on history[:cutoff] only, forecasts max(horizons) days and scores every
+    # horizon against the bars that followed
+    predictor = _predictor(options)
+    lstm = predictor.lstm_model
+    data = history.iloc[:cutoff]
+    horizons = sorted(options['horizons'])
+    timings = {}
+
+    started = time.perf_counter()
+    model, scaler, fit_history = lstm.fit(data)
+    timings['train'] = time.perf_counter() - started
+
+    with tempfile.TemporaryDirectory() as path:
+        # Score the model as it is served: through the same save/load path as the registry
+        lstm.save_model(model, path)
+        lstm.save_scaler(scaler, path)
+        model = lstm.load_model(path)
+        scaler = lstm.load_scaler(path)
+
+    started = time.perf_counter()
+    lstm_predictions = lstm.predict_next_days(data, horizons[-1], model, scaler)
+    timings['inference'] = time.perf_counter() - started
+
+    rows = []
+    timings['sentiment'] = timings['blend'] = 0.0
+    for days in horizons:
+        _worker['sentiment_seconds'] = 0.0
+        started = time.perf_counter()
+        prediction = predictor.build_prediction(symbol, days, data, lstm_predictions[:days])
+        elapsed = time.perf_counter() - started
+        timings['sentiment'] += _worker['sentiment_seconds']
+        timings['blend'] += elapsed - _worker['sentiment_seconds']
+
+        rows.append({
+            'symbol': symbol,
+            'cutoff': data.index[-1].strftime('%Y-%m-%d'),
+            'days': days,
+            'current': float(data['Close'].iloc[-1]),
+            'actual': float(history['Close'].iloc[cutoff - 1 + days]),
+            'lstm': float(lstm_predictions[days - 1]),
+            'hybrid': float(prediction['predictedPrice']),
+            'sentimentScore': float(prediction['modelDetails']['sentimentScore'])
+        })
+
+    return {
+        'symbol': symbol,
+        'cutoff': data.index[-1].strftime('%Y-%m-%d'),
+        'epochs_run': len(fit_history.history.get('loss', [])),
+        'rows': rows,
+        'timings': timings
+    }
+
+
+def directional_accuracy(current, predicted, actual):
+    hits = np.sign(predicted - current) == np.sign(actual - current)
+    return round(float(hits.mean()), 4) if len(hits) else None
+
+
+def mape(predicted, actual):
+    return round(float(np.mean(np.abs(predicted - actual) / np.abs(actual)) * 100), 4) if len(actual) else None
+
+
+def summarize(rows):
+    # Accuracy per horizon for the LSTM alone, the hybrid blend, the sentiment sign and
+    # a no-change forecast as the baseline
+    metrics = {}
+    for days in sorted({row['days'] for row in rows}):
+        selected = [row for row in rows if row['days'] == days]
+        current = np.array([row['current'] for row in selected])
+        actual = np.array([row['actual'] for row in selected])
+        lstm = np.array([row['lstm'] for row in selected])
+        hybrid = np.array([row['hybrid'] for row in selected])
+        score = np.array([row['sentimentScore'] for row in selected])
+        signed = score != 0
+
+        metrics[str(days)] = {
+            'forecasts': len(selected),
+            'directional_accuracy': {
+                'lstm': directional_accuracy(current, lstm, actual),
+                'hybrid': directional_accuracy(current, hybrid, actual),
+                # Sentiment only has a direction when its score is non-zero
+                'sentiment': directional_accuracy(current[signed], current[signed] + score[signed], actual[signed])
+            },
+            'mape': {
+                'lstm': mape(lstm, actual),
+                'hybrid': mape(hybrid, actual),
+                'naive': mape(current, actual)
+            }
+        }
+    return metrics
+
+
+def latency_stats(seconds):
+    values = np.array(seconds) * 1000
+    if not len(values):
+        return None
+    return {
+        'count': len(values),
+        'mean_ms': round(float(values.mean()), 3),
+        'p50_ms': round(float(np.percentile(values, 50)), 3),
+        'p95_ms': round(float(np.percentile(values, 95)), 3),
+        'max_ms': round(float(values.max()), 3)
+    }
+
+
+def compare_to_baseline(report, baseline, tolerance, max_accuracy_drop):
+    # Regressions against an earlier report: slower stage medians or lower hybrid accuracy
+    regressions = []
+    for stage in STAGES:
+        current = (report['latency'].get(stage) or {}).get('p50_ms')
+        previous = (baseline.get('latency', {}).get(stage) or {}).get('p50_ms')
+        if current is not None and previous and current > previous * (1 + tolerance):
+            regressions.append(f"{stage} p50 {current:.1f}ms vs {previous:.1f}ms")
+
+    for days, metrics in report['metrics'].items():
+        previous = baseline.get('metrics', {}).get(days)
+        if not previous:
+            continue
+        current = metrics['directional_accuracy']['hybrid']
+        before = previous['directional_accuracy']['hybrid']
+        if current is not None and before is not None and before - current > max_accuracy_drop:
+            regressions.append(f"{days}-day hybrid directional accuracy {current:.3f} vs {before:.3f}")
+    return regressions
+
+
+def latest_report(reports_dir):
+    paths = sorted(glob.glob(os.path.join(reports_dir, 'backtest-*.json')))
+    if not paths:
+        return None
+    try:
+        with open(paths[-1]) as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"Error reading backtest report {paths[-1]}: {e}")
+        return None
@@ -0,0 +1,55 @@
+import os
+import numpy as np
+from datetime import datetime
+
+
+class FineTunePolicy:
+    # Decides whether a stale model can be warm-started on its new bars or needs a full retrain
+    def __init__(self, enabled=None, epochs=None, max_updates=None, max_gap_days=None, drift_ratio=None,
+                 range_tolerance=None):
+        self.enabled = enabled if enabled is not None else os.environ.get('FINE_TUNE', 'true').lower() == 'true'
+        self.epochs = epochs or int(os.environ.get('FINE_TUNE_EPOCHS', 5))
+        # Consecutive fine-tunes allowed before a full retrain
+        self.max_updates = max_updates if max_updates is not None else int(os.environ.get('FINE_TUNE_MAX_UPDATES', 10))
+        self.max_gap_days = max_gap_days if max_gap_days is not None else int(os.environ.get('FINE_TUNE_MAX_GAP_DAYS', 30))
+        # Full retrain once the base model's loss on the new windows exceeds this multiple
+        # of the validation loss of its last full training
+        self.drift_ratio = drift_ratio if drift_ratio is not None else float(os.environ.get('FINE_TUNE_DRIFT_RATIO', 2.0))
+        # How far outside the [0, 1] range of the old scaler new bars may fall
+        self.range_tolerance = range_tolerance if range_tolerance is not None else float(os.environ.get('FINE_TUNE_RANGE_TOLERANCE', 0.2))
+
+    def full_retrain_reason(self, base, data, predictor):
+        if not self.enabled:
+            return 'fine-tuning disabled'
+
+        updates = base.metadata.get('fine_tunes', 0)
+        if updates >= self.max_updates:
+            return f"{updates} fine-tunes since the last full training"
+
+        gap = (datetime.strptime(data.index[-1].strftime('%Y-%m-%d'), '%Y-%m-%d')
+               - datetime.strptime(base.key.cutoff, '%Y-%m-%d')).days
+        if gap > self.max_gap_days:
+            return f"base model is {gap} days old"
+
+        new_rows = data[self.new_bars(data, base.key.cutoff)][predictor.features].values
+        if len(new_rows) == 0:
+            return 'no new bars since the base model'
+        if len(new_rows) < predictor.horizon:
+            # A training window needs all of its horizon target bars after the cutoff
+            return f"{len(new_rows)} new bars, fewer than the {predictor.horizon}-bar forecast horizon"
+        scaled = base.scaler.transform(new_rows)
+        if scaled.min() < -self.range_tolerance or scaled.max() > 1 + self.range_tolerance:
+            # The old scaler no longer covers the price range the model would see
+            return 'new bars are outside the range of the base scaler'
+
+        return None
+
+    def drift_reason(self, base, new_window_loss):
+        reference = base.metadata.get('full_val_loss', base.metadata.get('val_loss'))
+        if reference and new_window_loss > self.drift_ratio * reference:
+            return f"loss on new windows {new_window_loss:.6f} is over {self.drift_ratio}x the validation loss {reference:.6f}"
+        return None
+
+    @staticmethod
+    def new_bars(data, cutoff):
+        return np.asarray(data.index.strftime('%Y-%m-%d')) > cutoff
@@ -0,0 +1,157 @@
+import os
+import json
+import numpy as np
+from .lstm_model import LSTMStockPredictor, MAX_HORIZON, DEFAULT_UNITS
+from .inference import ArrayMinMaxScaler
+from .windowing import GatheredWindows, window_starts
+
+GLOBAL_SYMBOL = '__GLOBAL__'
+VOCABULARY_FILE = 'symbols.json'
+MIN_SYMBOL_BARS = 100
+
+
+class SymbolInputModel:
+    # Presents a (window, symbol id) model through the single-input predict API
+    def __init__(self, model, symbol_id):
+        self.model = model
+        self.symbol_id = symbol_id
+
+    @property
+    def output_shape(self):
+        return self.model.output_shape
+
+    def predict(self, x, verbose=0, batch_size=None):
+        ids = np.full(len(x), self.symbol_id, dtype='int32')
+        return self.model.predict((np.asarray(x, dtype='float32'), ids), verbose=verbose)
+
+
+class GlobalLSTMPredictor(LSTMStockPredictor):
+    # One model trained on the pooled windows of a whole universe. Every symbol is
+    # min/max scaled on its own history, so the network learns price-path shapes rather
+    # than price levels and can forecast a symbol it has never seen.
+    def __init__(self, lookback=60, epochs=50, batch_size=256, forecast_mode='recursive', horizon=MAX_HORIZON,
+                 dtype='float32', embedding_dim=0, validation_split=0.2, symbol_dropout=0.1, units=DEFAULT_UNITS):
+        super().__init__(lookback, epochs, batch_size, forecast_mode=forecast_mode, horizon=horizon, dtype=dtype,
+                         units=units)
+        # embedding_dim > 0 adds a learned per-symbol vector; id 0 is the unknown symbol
+        self.embedding_dim = embedding_dim
+        self.validation_split = validation_split
+        # Share of training windows fed as the unknown symbol so that slot is learned too
+        self.symbol_dropout = symbol_dropout
+        self.vocabulary = {}
+
+    @property
+    def variant(self):
+        parts = [super().variant, f"e{self.embedding_dim}" if self.embedding_dim else '']
+        return '_'.join(part for part in parts if part)
+
+    def scaler_for(self, data):
+        return ArrayMinMaxScaler.fit(data[self.features].values)
+
+    def prepare_universe(self, histories, seed=0):
+        # histories: {symbol: DataFrame}. All scaled series go into one float32 buffer;
+        # windows are offsets into it, split chronologically within each symbol.
+        segments, train_starts, val_starts, train_ids, val_ids = [], [], [], [], []
+        offset = 0
+        self.vocabulary = {}
+
+        for symbol in sorted(histories):
+            data = histories[symbol]
+            if data is None or len(data) < max(MIN_SYMBOL_BARS, self.lookback + self.horizon):
+                print(f"Skipping {symbol} for the global model: not enough history")
+                continue
+
+            symbol_id = len(self.vocabulary) + 1
+            self.vocabulary[symbol.upper()] = symbol_id
+            scaled = self.scaler_for(data).transform(data[self.features].values).astype(self.dtype)
+
+            starts = window_starts(len(scaled), self.lookback, self.horizon)
+            split = int((1 - self.validation_split) * len(starts))
+            train_starts.append(offset + starts[:split])
+            val_starts.append(offset + starts[split:])
+            train_ids.append(np.full(split, symbol_id, dtype='int32'))
+            val_ids.append(np.full(len(starts) - split, symbol_id, dtype='int32'))
+
+            segments.append(scaled)
+            offset += len(scaled)
+
+        if not segments:
+            raise ValueError("No symbol has enough history to train the global model")
+
+        series = np.concatenate(segments)
+        train_starts, val_starts = np.concatenate(train_starts), np.concatenate(val_starts)
+        train_ids, val_ids = np.concatenate(train_ids), np.concatenate(val_ids)
+        if self.symbol_dropout:
+            train_ids[np.random.default_rng(seed).random(len(train_ids)) < self.symbol_dropout] = 0
+
+        def windows(starts, ids):
+            X = GatheredWindows(series, starts, self.lookback)
+            y = GatheredWindows(series[:, 3], starts + self.lookback, self.horizon, squeeze=self.horizon == 1)
+            return ((X, ids) if self.embedding_dim else X), y
+
+        X_train, y_train = windows(train_starts, train_ids)
+        X_test, y_test = windows(val_starts, val_ids)
+        return X_train, X_test, y_train, y_test
+
+    def build_model(self, input_shape, horizon=None):
+        if not self.embedding_dim:
+            return super().build_model(input_shape, horizon)
+
+        from keras import Input, Model
+        from keras.layers import Dense, Embedding, Concatenate, Flatten
+
+        horizon = horizon or self.horizon
+        window = Input(shape=input_shape)
+        symbol = Input(shape=(), dtype='int32')
+
+        x = window
+        for layer in self.lstm_layers(None):
+            x = layer(x)
+
+        embedded = Flatten()(Embedding(len(self.vocabulary) + 1, self.embedding_dim)(symbol))
+        x = Concatenate()([x, embedded])
+        x = Dense(32, activation='relu')(x)
+        x = Dense(16, activation='relu')(x)
+
+        model = Model(inputs=[window, symbol], outputs=Dense(horizon)(x))
+        model.compile(optimizer='adam', loss='mean_squared_error', metrics=['mae'])
+        return model
+
+    def fit(self, histories, callbacks=None):
+        # Returns the vocabulary in place of a scaler: scaling is per symbol and is
+        # derived from each request's own history when serving.
+        trainer = GlobalLSTMPredictor(self.lookback, self.epochs, self.batch_size, forecast_mode=self.forecast_mode,
+                                      horizon=self.horizon, dtype=self.dtype, embedding_dim=self.embedding_dim,
+                                      validation_split=self.validation_split, symbol_dropout=self.symbol_dropout,
+                                      units=self.units)
+        trainer.features = list(self.features)
+        X_train, X_test, y_train, y_test = trainer.prepare_universe(histories)
+        print(f"Training global model on {len(y_train)} windows from {len(trainer.vocabulary)} symbols...")
+        history = trainer.train(X_train, y_train, X_test, y_test, callbacks=callbacks)
+        return trainer.model, dict(trainer.vocabulary), history
+
+    def bind(self, trained, symbol, data):
+        scaler = self.scaler_for(data)
+        if not self.embedding_dim:
+            return trained.model, scaler
+        return SymbolInputModel(trained.model, trained.scaler.get(symbol.upper(), 0)), scaler
+
+    def save_model(self, model, path):
+        if not self.embedding_dim:
+            return super().save_model(model, path)
+        # The embedding model has two inputs, which the NumPy runtime does not cover
+        model.save(os.path.join(path, 'model.keras'))
+
+    def load_model(self, path, runtime=None):
+        if not self.embedding_dim:
+            return super().load_model(path, runtime)
+        from keras.models import load_model
+        return load_model(os.path.join(path, 'model.keras'))
+
+    def save_scaler(self, vocabulary, path):
+        with open(os.path.join(path, VOCABULARY_FILE), 'w') as f:
+            json.dump({'symbols': vocabulary}, f, indent=2)
+
+    def load_scaler(self, path, runtime=None):
+        with open(os.path.join(path, VOCABULARY_FILE)) as f:
+            return json.load(f)['symbols']
@@ -1,73 +1,195 @@
+import os
+import threading
+import contextvars
 import numpy as np
 import pandas as pd
-import yfinance as yf
 from datetime import datetime, timedelta
-from .lstm_model import LSTMStockPredictor
+from concurrent.futures import ThreadPoolExecutor
+from .lstm_model import LSTMStockPredictor, DEFAULT_UNITS
+from .global_model import GlobalLSTMPredictor, GLOBAL_SYMBOL
 from .sentiment_analyzer import SentimentAnalyzer
+from .model_registry import ModelRegistry, DEFAULT_MODEL_DIR
+from .tuning import load_tuned_config
+from .indicators import IndicatorEngine, compute_indicators
+from .training_jobs import TrainingJobQueue, QueueFullError, TRAINING_QUEUE_FULL
+from .prediction_cache import PredictionCache
+from .screener import Screener, SCREEN_BARS
+from .live_forecast import LiveForecaster
+from market_data.price_store import PriceStore
+from monitoring.metrics import stage
 import warnings
 warnings.filterwarnings('ignore')
 
 class HybridStockPredictor:
-    def __init__(self):
-        self.lstm_model = LSTMStockPredictor(lookback=60, epochs=50, batch_size=32)
-        self.sentiment_analyzer = SentimentAnalyzer()
+    def __init__(self, price_store=None, fundamentals_cache=None):
+        # Architecture picked by `tune.py`, if it has been run; TUNED_CONFIG=false keeps the defaults
+        tuned = {}
+        if os.environ.get('TUNED_CONFIG', 'true').lower() == 'true':
+            tuned = load_tuned_config(os.environ.get('MODEL_DIR', DEFAULT_MODEL_DIR)) or {}
+        self.lstm_model = LSTMStockPredictor(
+            lookback=tuned.get('lookback', 60), epochs=tuned.get('epochs', 50), batch_size=tuned.get('batch_size', 32),
+            forecast_mode=os.environ.get('LSTM_FORECAST_MODE', 'recursive'),
+            units=tuned.get('units', DEFAULT_UNITS)
+        )
+        # Pooled model trained by `train.py --global`: off, fallback (for symbols without
+        # their own model) or always
+        self.global_model = GlobalLSTMPredictor(
+            lookback=60, forecast_mode=self.lstm_model.forecast_mode,
+            embedding_dim=int(os.environ.get('GLOBAL_MODEL_EMBEDDING_DIM', 0))
+        )
+        self.global_model_mode = os.environ.get('GLOBAL_MODEL', 'fallback').lower()
+        self.model_registry = ModelRegistry(
+            max_models=int(os.environ.get('MODEL_CACHE_SIZE', 8)),
+            max_age_days=int(os.environ.get('MODEL_MAX_AGE_DAYS', 7))
+        )
+        self.prediction_cache = PredictionCache()
+        # A retrained model makes every cached response for that symbol obsolete
+        self.model_registry.add_listener(
+            lambda key: self.prediction_cache.invalidate(None if key.symbol == GLOBAL_SYMBOL else key.symbol))
+        self.training_jobs = TrainingJobQueue(self.model_registry)
+        self.async_training = os.environ.get('ASYNC_TRAINING', 'true').lower() == 'true'
+        self.indicator_engine = IndicatorEngine()
+        self.sentiment_analyzer = SentimentAnalyzer(fundamentals_cache=fundamentals_cache, indicator_engine=self.indicator_engine)
+        self.price_store = price_store or PriceStore()
+        self.screener = Screener(self.price_store, bars=int(os.environ.get('SCREEN_BARS', SCREEN_BARS)))
+        # Fundamentals are fetched alongside the price history rather than after it
+        self.fetch_executor = ThreadPoolExecutor(max_workers=int(os.environ.get('MARKET_DATA_MAX_CONCURRENCY', 4)),
+                                                 thread_name_prefix='prefetch')
         self.lstm_weight = 0.65
         self.sentiment_weight = 0.35
+        # Monte Carlo dropout samples behind the p10/p50/p90 bands when a request does not
+        # ask for a count itself; 0 (the default) leaves the bands out
+        self.interval_samples = int(os.environ.get('PREDICTION_INTERVAL_SAMPLES', 0))
+        # Intraday bars and pushed forecasts; the feed only starts once a symbol is watched
+        self.live = LiveForecaster(self)
+        # Set once warm_up() has run; /health reports ready only after that
+        self.ready = threading.Event()
 
+    def warm_up(self):
+        # Loads the most recent models into the registry and runs the indicator code once.
+        # Under gunicorn's preload_app this happens in the master, so forked workers share
+        # the loaded weights copy-on-write instead of each reading them from disk.
+        try:
+            loaded = []
+            # Keras models would import TensorFlow, whose thread pools do not survive a fork
+            if os.environ.get('MODEL_RUNTIME', 'numpy') == 'numpy':
+                loaded = self.model_registry.preload(self.lstm_model)
+                if self.global_model_mode != 'off' and not self.global_model.embedding_dim:
+                    loaded += self.model_registry.preload(self.global_model, [GLOBAL_SYMBOL])
+            close = np.linspace(100, 110, 250)
+            compute_indicators(close, np.full(len(close), 1e6))
+            print(f"Warm-up complete: {len(loaded)} models loaded")
+        except Exception as e:
+            print(f"Warm-up error: {e}")
+        finally:
+            self.ready.set()
+
+    @stage('data_fetch')
     def get_stock_data(self, symbol, period='2y'):
         try:
-            stock = yf.Ticker(symbol)
-            data = stock.history(period=period)
-            return data
+            return self.price_store.get_history(symbol, period)
         except Exception as e:
             print(f"Error fetching data for {symbol}: {e}")
             return None
 
-    def calculate_technical_indicators(self, data):
+    def prefetch_fundamentals(self, symbol):
+        # The sentiment step later finds them cached, or joins the same in-flight call
+        return self.fetch_executor.submit(contextvars.copy_context().run, self.sentiment_analyzer.get_stock_info, symbol)
+
+    def prefetch_news(self, symbols):
+        # Headlines of all `symbols` are fetched and scored together; the sentiment step
+        # joins the same in-flight fetches or finds the results cached
+        news = self.sentiment_analyzer.news_sentiment
+        if news is None:
+            return None
+        return self.fetch_executor.submit(contextvars.copy_context().run, news.analyze_many, list(symbols))
+
+    def calculate_technical_indicators(self, data, symbol=None):
         if data is None or len(data) < 20:
             return {}
 
-        data['SMA_20'] = data['Close'].rolling(window=20).mean()
-        data['SMA_50'] = data['Close'].rolling(window=50).mean()
-        data['SMA_200'] = data['Close'].rolling(window=200).mean()
+        # Latest values only; the caller's DataFrame is left untouched
+        return self.indicator_engine.latest(data, symbol)
+
+    def find_global_model(self, data):
+        if self.global_model_mode == 'off':
+            return None
+        return self.model_registry.find_latest(GLOBAL_SYMBOL, data, self.global_model)
 
-        delta = data['Close'].diff()
-        gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-        rs = gain / loss
-        data['RSI'] = 100 - (100 / (1 + rs))
+    def predictor_for(self, trained):
+        return self.global_model if trained.key.symbol == GLOBAL_SYMBOL else self.lstm_model
 
-        exp1 = data['Close'].ewm(span=12).mean()
-        exp2 = data['Close'].ewm(span=26).mean()
-        data['MACD'] = exp1 - exp2
-        data['MACD_signal'] = data['MACD'].ewm(span=9).mean()
+    def resolve_model(self, symbol, data):
+        # Returns (trained, pending). With async training a cold symbol does not block:
+        # it is served by the global model if there is one, or gets a job to poll,
+        # while its own model trains in the background.
+        if self.global_model_mode == 'always':
+            trained = self.find_global_model(data)
+            if trained is None:
+                return None, {'error': 'No global model available', 'message': 'Train one with train.py --global'}
+            return trained, None
 
-        data['BB_middle'] = data['Close'].rolling(window=20).mean()
-        bb_std = data['Close'].rolling(window=20).std()
-        data['BB_upper'] = data['BB_middle'] + (bb_std * 2)
-        data['BB_lower'] = data['BB_middle'] - (bb_std * 2)
+        if not self.async_training:
+            return self.model_registry.get_or_train(symbol, data, self.lstm_model), None
 
-        return data.iloc[-1].to_dict()
+        trained = self.model_registry.find_latest(symbol, data, self.lstm_model)
+        if trained is not None:
+            return trained, None
 
-    def generate_prediction(self, symbol, days=1):
+        try:
+            job = self.training_jobs.submit(symbol, data, self.lstm_model)
+        except QueueFullError as e:
+            job, queue_error = None, {'error': TRAINING_QUEUE_FULL, 'message': str(e)}
+
+        trained = self.find_global_model(data)
+        if trained is not None:
+            return trained, None
+        if job is None:
+            return None, queue_error
+
+        return None, {
+            'symbol': symbol,
+            'status': 'training',
+            'jobId': job.id,
+            'message': 'No trained model for this symbol yet. Training has been queued; poll the job and retry.'
+        }
+
+    def check_history(self, data):
+        if data is None or len(data) < 100:
+            return {
+                'error': 'Insufficient historical data for prediction',
+                'message': f'Need at least 100 days of data, got {len(data) if data is not None else 0}'
+            }
+        return None
+
+    def generate_prediction(self, symbol, days=1, interval_samples=None):
+        if interval_samples is None:
+            interval_samples = self.interval_samples
         try:
             print(f"Starting prediction for {symbol}...")
 
+            self.prefetch_fundamentals(symbol)
+            self.prefetch_news([symbol])
             data = self.get_stock_data(symbol)
 
-            if data is None or len(data) < 100:
-                return {
-                    'error': 'Insufficient historical data for prediction',
-                    'message': f'Need at least 100 days of data, got {len(data) if data is not None else 0}'
-                }
-
-            current_price = float(data['Close'].iloc[-1])
+            insufficient = self.check_history(data)
+            if insufficient:
+                return insufficient
 
             print("Running LSTM prediction...")
             try:
-                lstm_predictions = self.lstm_model.predict_next_days(data, days)
-                lstm_predicted_price = float(lstm_predictions[-1])
-                lstm_confidence = self.lstm_model.calculate_confidence(data, lstm_predictions)
+                trained, pending = self.resolve_model(symbol, data)
+                if pending:
+                    return dict(pending, days=days)
+
+                cache_key = PredictionCache.make_key(symbol, days, trained.version, data, interval_samples)
+                cached = self.prediction_cache.get(cache_key)
+                if cached is not None:
+                    return cached
+
+                predictor = self.predictor_for(trained)
+                model, scaler = predictor.bind(trained, symbol, data)
+                lstm_predictions = predictor.predict_next_days(data, days, model=model, scaler=scaler)
             except Exception as e:
                 print(f"LSTM prediction error: {e}")
                 return {
@@ -75,77 +197,12 @@ class HybridStockPredictor:
                     'message': str(e)
                 }
 
-            print("Running sentiment analysis...")
-            sentiment_result = self.sentiment_analyzer.analyze_market_sentiment(symbol, data)
-            sentiment_adjustment = self.sentiment_analyzer.get_sentiment_adjustment(sentiment_result['score'])
-
-            hybrid_predicted_price = lstm_predicted_price * (1 + sentiment_adjustment)
-
-            price_change = hybrid_predicted_price - current_price
-            price_change_percent = (price_change / current_price) * 100
-
-            hybrid_confidence = (
-                self.lstm_weight * lstm_confidence +
-                self.sentiment_weight * sentiment_result['confidence']
-            )
-
-            if price_change_percent > 3:
-                recommendation = 'Strong Buy'
-            elif price_change_percent > 1:
-                recommendation = 'Buy'
-            elif price_change_percent < -3:
-                recommendation = 'Strong Sell'
-            elif price_change_percent < -1:
-                recommendation = 'Sell'
-            else:
-                recommendation = 'Hold'
-
-            if sentiment_result['score'] > 0.15:
-                overall_sentiment = 'Very Positive'
-            elif sentiment_result['score'] > 0.05:
-                overall_sentiment = 'Positive'
-            elif sentiment_result['score'] < -0.15:
-                overall_sentiment = 'Very Negative'
-            elif sentiment_result['score'] < -0.05:
-                overall_sentiment = 'Negative'
-            else:
-                overall_sentiment = 'Neutral'
-
-            indicators = self.calculate_technical_indicators(data)
-
-            factors = [
-                f"LSTM model prediction: ${lstm_predicted_price:.2f}",
-                f"Sentiment adjustment: {sentiment_adjustment*100:+.2f}%",
-            ]
-            factors.extend(sentiment_result['factors'][:3])
-
-            return {
-                'symbol': symbol,
-                'currentPrice': round(current_price, 2),
-                'predictedPrice': round(hybrid_predicted_price, 2),
-                'confidence': round(hybrid_confidence, 0),
-                'recommendation': recommendation,
-                'sentiment': overall_sentiment,
-                'priceChange': round(price_change, 2),
-                'priceChangePercent': round(price_change_percent, 2),
-                'days': days,
-                'factors': factors,
-                'modelDetails': {
-                    'lstmPrediction': round(lstm_predicted_price, 2),
-                    'lstmConfidence': round(lstm_confidence, 2),
-                    'sentimentScore': round(sentiment_result['score'], 3),
-                    'sentimentConfidence': round(sentiment_result['confidence'], 2),
-                    'hybridWeight': f"{self.lstm_weight*100:.0f}% LSTM, {self.sentiment_weight*100:.0f}% Sentiment"
-                },
-                'technicalIndicators': {
-                    'RSI': round(indicators.get('RSI', 50), 2),
-                    'SMA_20': round(indicators.get('SMA_20', current_price), 2),
-                    'SMA_50': round(indicators.get('SMA_50', current_price), 2),
-                    'SMA_200': round(indicators.get('SMA_200', current_price), 2),
-                    'MACD': round(indicators.get('MACD', 0), 4),
-                    'MACD_Signal': round(indicators.get('MACD_signal', 0), 4)
-                }
-            }
+            window = predictor.scale_window(data, scaler)[np.newaxis]
+            intervals = self.prediction_intervals(model, window, [(data, scaler, days)], interval_samples)[0]
+            prediction = self.build_prediction(symbol, days, data, lstm_predictions, trained.version, intervals,
+                                               interval_samples)
+            self.prediction_cache.put(cache_key, prediction)
+            return prediction
 
         except Exception as e:
             print(f"Error generating prediction for {symbol}: {e}")
@@ -155,3 +212,194 @@ class HybridStockPredictor:
                 'error': 'Prediction generation failed',
                 'message': str(e)
             }
+
+    def prediction_intervals(self, model, windows, members, samples):
+        # One Monte Carlo dropout pass for all windows; members[i] is (data, scaler, days)
+        # of windows[i]. Returns per-window bands, or Nones when sampling is off or the
+        # model cannot run with dropout on (e.g. the two-input global model).
+        if not samples:
+            return [None] * len(members)
+        try:
+            max_days = max(days for _, _, days in members)
+            paths = self.lstm_model.sample_windows(model, windows, max_days, samples)
+            return [self.lstm_model.interval_bands(paths[row, :, :days], data, scaler)
+                    for row, (data, scaler, days) in enumerate(members)]
+        except Exception as e:
+            print(f"Prediction interval error: {e}")
+            return [None] * len(members)
+
+    def generate_batch_predictions(self, requests, interval_samples=None):
+        # requests: list of (symbol, days). Results come back in the same order and
+        # every failure is reported on its own entry instead of failing the batch.
+        if interval_samples is None:
+            interval_samples = self.interval_samples
+        results = [None] * len(requests)
+        horizons = {}
+        for i, (symbol, days) in enumerate(requests):
+            horizons.setdefault(symbol, []).append((i, days))
+
+        def fail(symbol, result):
+            for i, days in horizons[symbol]:
+                results[i] = dict(result, symbol=symbol, days=days)
+
+        print(f"Starting batch prediction for {len(horizons)} symbols...")
+        for symbol in horizons:
+            self.prefetch_fundamentals(symbol)
+        self.prefetch_news(horizons)
+        # One grouped download for every symbol that is missing or stale in the price store
+        try:
+            with stage('data_fetch'):
+                self.price_store.refresh_many(list(horizons), '2y')
+        except Exception as e:
+            print(f"Error refreshing batch prices: {e}")
+        with ThreadPoolExecutor(max_workers=min(8, len(horizons)) or 1) as pool:
+            histories = dict(zip(horizons, pool.map(self.get_stock_data, horizons)))
+
+        # Symbols resolved to the same model object share one forward pass per step
+        groups = {}
+        for symbol, data in histories.items():
+            insufficient = self.check_history(data)
+            if insufficient:
+                fail(symbol, insufficient)
+                continue
+            try:
+                trained, pending = self.resolve_model(symbol, data)
+            except Exception as e:
+                print(f"LSTM model error for {symbol}: {e}")
+                fail(symbol, {'error': 'LSTM model training failed', 'message': str(e)})
+                continue
+            if pending:
+                fail(symbol, pending)
+                continue
+
+            missing = []
+            for i, days in horizons[symbol]:
+                cached = self.prediction_cache.get(PredictionCache.make_key(symbol, days, trained.version, data, interval_samples))
+                if cached is not None:
+                    results[i] = cached
+                else:
+                    missing.append((i, days))
+            if missing:
+                # Symbols served by the global model all land in one group
+                model, scaler = self.predictor_for(trained).bind(trained, symbol, data)
+                groups.setdefault(id(model), (model, []))[1].append((symbol, data, trained, scaler, missing))
+
+        for model, members in groups.values():
+            try:
+                # One model, so one predictor (and lookback) for the whole group
+                predictor = self.predictor_for(members[0][2])
+                windows = np.stack([predictor.scale_window(data, scaler) for _, data, _, scaler, _ in members])
+                max_days = max(days for _, _, _, _, missing in members for _, days in missing)
+                scaled = predictor.predict_windows(model, windows, max_days)
+                intervals = self.prediction_intervals(model, windows, [(data, scaler, max_days) for _, data, _, scaler, _ in members],
+                                                      interval_samples)
+            except Exception as e:
+                print(f"LSTM batch prediction error: {e}")
+                for symbol, _, _, _, _ in members:
+                    fail(symbol, {'error': 'LSTM prediction failed', 'message': str(e)})
+                continue
+
+            for row, (symbol, data, trained, scaler, missing) in enumerate(members):
+                for i, days in missing:
+                    try:
+                        lstm_predictions = predictor.inverse_close(scaled[row, :days], data, scaler)
+                        bands = intervals[row] and {name: band[:days] for name, band in intervals[row].items()}
+                        results[i] = self.build_prediction(symbol, days, data, lstm_predictions, trained.version, bands,
+                                                           interval_samples)
+                        self.prediction_cache.put(PredictionCache.make_key(symbol, days, trained.version, data, interval_samples),
+                                                  results[i])
+                    except Exception as e:
+                        print(f"Error generating prediction for {symbol}: {e}")
+                        results[i] = {'symbol': symbol, 'days': days, 'error': 'Prediction generation failed', 'message': str(e)}
+
+        return results
+
+    def build_prediction(self, symbol, days, data, lstm_predictions, model_version=None, intervals=None, interval_samples=None):
+        current_price = float(data['Close'].iloc[-1])
+        lstm_predicted_price = float(lstm_predictions[-1])
+        lstm_confidence = self.lstm_model.calculate_confidence(data, lstm_predictions)
+
+        print("Running sentiment analysis...")
+        sentiment_result = self.sentiment_analyzer.analyze_market_sentiment(symbol, data)
+        sentiment_adjustment = self.sentiment_analyzer.get_sentiment_adjustment(sentiment_result['score'])
+
+        hybrid_predicted_price = lstm_predicted_price * (1 + sentiment_adjustment)
+
+        price_change = hybrid_predicted_price - current_price
+        price_change_percent = (price_change / current_price) * 100
+
+        hybrid_confidence = (
+            self.lstm_weight * lstm_confidence +
+            self.sentiment_weight * sentiment_result['confidence']
+        )
+
+        if price_change_percent > 3:
+            recommendation = 'Strong Buy'
+        elif price_change_percent > 1:
+            recommendation = 'Buy'
+        elif price_change_percent < -3:
+            recommendation = 'Strong Sell'
+        elif price_change_percent < -1:
+            recommendation = 'Sell'
+        else:
+            recommendation = 'Hold'
+
+        if sentiment_result['score'] > 0.15:
+            overall_sentiment = 'Very Positive'
+        elif sentiment_result['score'] > 0.05:
+            overall_sentiment = 'Positive'
+        elif sentiment_result['score'] < -0.15:
+            overall_sentiment = 'Very Negative'
+        elif sentiment_result['score'] < -0.05:
+            overall_sentiment = 'Negative'
+        else:
+            overall_sentiment = 'Neutral'
+
+        indicators = self.calculate_technical_indicators(data, symbol)
+
+        factors = [
+            f"LSTM model prediction: ${lstm_predicted_price:.2f}",
+            f"Sentiment adjustment: {sentiment_adjustment*100:+.2f}%",
+        ]
+        factors.extend(sentiment_result['factors'][:3])
+
+        prediction = {
+            'symbol': symbol,
+            'currentPrice': round(current_price, 2),
+            'predictedPrice': round(hybrid_predicted_price, 2),
+            'confidence': round(hybrid_confidence, 0),
+            'recommendation': recommendation,
+            'sentiment': overall_sentiment,
+            'priceChange': round(price_change, 2),
+            'priceChangePercent': round(price_change_percent, 2),
+            'days': days,
+            'dataAsOf': data.index[-1].strftime('%Y-%m-%d'),
+            'factors': factors,
+            'modelDetails': {
+                'lstmPrediction': round(lstm_predicted_price, 2),
+                'lstmConfidence': round(lstm_confidence, 2),
+                'sentimentScore': round(sentiment_result['score'], 3),
+                'sentimentConfidence': round(sentiment_result['confidence'], 2),
+                'hybridWeight': f"{self.lstm_weight*100:.0f}% LSTM, {self.sentiment_weight*100:.0f}% Sentiment",
+                'modelVersion': model_version
+            },
+            'technicalIndicators': {
+                'RSI': round(indicators.get('RSI', 50), 2),
+                'SMA_20': round(indicators.get('SMA_20', current_price), 2),
+                'SMA_50': round(indicators.get('SMA_50', current_price), 2),
+                'SMA_200': round(indicators.get('SMA_200', current_price), 2),
+                'MACD': round(indicators.get('MACD', 0), 4),
+                'MACD_Signal': round(indicators.get('MACD_signal', 0), 4)
+            }
+        }
+
+        if intervals:
+            # Quantiles of the Monte Carlo dropout paths, with the same sentiment adjustment
+            # as predictedPrice; the top-level values are for the last day
+            adjusted = {name: [round(float(price) * (1 + sentiment_adjustment), 2) for price in band]
+                        for name, band in intervals.items()}
+            prediction['predictionInterval'] = dict(
+                {name: band[-1] for name, band in adjusted.items()},
+                daily=adjusted, samples=interval_samples or self.interval_samples, method='mc_dropout')
+
+        return prediction
@@ -0,0 +1,222 @@
+import threading
+from collections import OrderedDict, deque
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from monitoring.metrics import stage
+
+SMA_WINDOWS = (20, 50, 200)
+RSI_WINDOW = 14
+MACD_FAST = 12
+MACD_SLOW = 26
+MACD_SIGNAL = 9
+BB_WINDOW = 20
+BB_STD = 2
+VOLUME_WINDOW = 20
+
+HISTORY_WINDOW = max(SMA_WINDOWS + (BB_WINDOW, VOLUME_WINDOW))
+
+
+def rolling_mean(values, window):
+    out = np.full(len(values), np.nan)
+    if len(values) >= window:
+        sums = np.cumsum(np.concatenate([[0.0], values]))
+        out[window - 1:] = (sums[window:] - sums[:-window]) / window
+    return out
+
+
+def rolling_std(values, window):
+    out = np.full(len(values), np.nan)
+    if len(values) >= window:
+        out[window - 1:] = sliding_window_view(values, window).std(axis=1, ddof=1)
+    return out
+
+
+def ewm_mean(values, span):
+    # Same as pandas .ewm(span=span).mean() (adjust=True); also returns the running
+    # numerator/denominator so the average can be continued one bar at a time.
+    decay = 1 - 2.0 / (span + 1)
+    out = np.empty(len(values))
+    numerator = denominator = 0.0
+    for i, value in enumerate(values):
+        numerator = value + decay * numerator
+        denominator = 1.0 + decay * denominator
+        out[i] = numerator / denominator
+    return out, (numerator, denominator)
+
+
+def rsi_from_means(mean_gain, mean_loss):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rs = np.divide(mean_gain, mean_loss)
+        return 100 - (100 / (1 + rs))
+
+
+def compute_indicators(close, volume=None):
+    # Full indicator series over 1-D arrays; the inputs are only read, never copied or modified
+    close = np.asarray(close, dtype='float64')
+    series = {}
+
+    for window in SMA_WINDOWS:
+        series[f"SMA_{window}"] = rolling_mean(close, window)
+
+    delta = np.diff(close, prepend=close[0])
+    series['RSI'] = rsi_from_means(
+        rolling_mean(np.where(delta > 0, delta, 0.0), RSI_WINDOW),
+        rolling_mean(np.where(delta < 0, -delta, 0.0), RSI_WINDOW)
+    )
+
+    fast, _ = ewm_mean(close, MACD_FAST)
+    slow, _ = ewm_mean(close, MACD_SLOW)
+    series['MACD'] = fast - slow
+    series['MACD_signal'], _ = ewm_mean(series['MACD'], MACD_SIGNAL)
+
+    series['BB_middle'] = series[f"SMA_{BB_WINDOW}"]
+    bb_std = rolling_std(close, BB_WINDOW)
+    series['BB_upper'] = series['BB_middle'] + bb_std * BB_STD
+    series['BB_lower'] = series['BB_middle'] - bb_std * BB_STD
+
+    if volume is not None:
+        series[f"Volume_SMA_{VOLUME_WINDOW}"] = rolling_mean(np.asarray(volume, dtype='float64'), VOLUME_WINDOW)
+
+    return series
+
+
+def latest_values(series):
+    # Last value of every series, leaving out indicators without enough history
+    latest = {}
+    for name, values in series.items():
+        value = float(values[-1]) if len(values) else np.nan
+        if not np.isnan(value):
+            latest[name] = value
+    return latest
+
+
+class IndicatorState:
+    # Keeps just enough of the tail of a series to add one bar in O(1)
+    def __init__(self, close, volume=None, first_date=None, last_date=None):
+        close = np.asarray(close, dtype='float64')
+        self.count = len(close)
+        self.first_date = first_date
+        self.last_date = last_date
+
+        self.closes = deque(close[-HISTORY_WINDOW:], maxlen=HISTORY_WINDOW)
+        self.volumes = deque(np.asarray(volume, dtype='float64')[-VOLUME_WINDOW:], maxlen=VOLUME_WINDOW) if volume is not None else None
+        self.sums = {window: float(close[-window:].sum()) if len(close) >= window else None for window in SMA_WINDOWS}
+
+        delta = np.diff(close, prepend=close[0])
+        self.gains = deque(np.where(delta > 0, delta, 0.0)[-RSI_WINDOW:], maxlen=RSI_WINDOW)
+        self.losses = deque(np.where(delta < 0, -delta, 0.0)[-RSI_WINDOW:], maxlen=RSI_WINDOW)
+
+        fast, self.fast_ewm = ewm_mean(close, MACD_FAST)
+        slow, self.slow_ewm = ewm_mean(close, MACD_SLOW)
+        _, self.signal_ewm = ewm_mean(fast - slow, MACD_SIGNAL)
+
+        self.latest = latest_values(compute_indicators(close[-HISTORY_WINDOW:], volume[-HISTORY_WINDOW:] if volume is not None else None))
+        self.latest['MACD'] = float(fast[-1] - slow[-1])
+        self.latest['MACD_signal'] = self.signal_ewm[0] / self.signal_ewm[1]
+
+    @staticmethod
+    def _continue_ewm(state, value, span):
+        decay = 1 - 2.0 / (span + 1)
+        numerator, denominator = state
+        return value + decay * numerator, 1.0 + decay * denominator
+
+    def append(self, close, volume=None, date=None):
+        close = float(close)
+        previous = self.closes[-1]
+        self.count += 1
+        self.last_date = date
+
+        for window in SMA_WINDOWS:
+            if self.sums[window] is not None:
+                # closes[-window] is the bar that drops out of this window
+                self.sums[window] += close - self.closes[-window]
+            elif self.count == window:
+                self.sums[window] = float(sum(list(self.closes)[-(window - 1):])) + close
+        self.closes.append(close)
+
+        delta = close - previous
+        self.gains.append(max(delta, 0.0))
+        self.losses.append(max(-delta, 0.0))
+
+        self.fast_ewm = self._continue_ewm(self.fast_ewm, close, MACD_FAST)
+        self.slow_ewm = self._continue_ewm(self.slow_ewm, close, MACD_SLOW)
+        macd = self.fast_ewm[0] / self.fast_ewm[1] - self.slow_ewm[0] / self.slow_ewm[1]
+        self.signal_ewm = self._continue_ewm(self.signal_ewm, macd, MACD_SIGNAL)
+
+        latest = {'MACD': macd, 'MACD_signal': self.signal_ewm[0] / self.signal_ewm[1]}
+        for window in SMA_WINDOWS:
+            if self.sums[window] is not None:
+                latest[f"SMA_{window}"] = self.sums[window] / window
+
+        if self.count >= RSI_WINDOW:
+            rsi = float(rsi_from_means(sum(self.gains) / RSI_WINDOW, sum(self.losses) / RSI_WINDOW))
+            if not np.isnan(rsi):
+                latest['RSI'] = rsi
+
+        if f"SMA_{BB_WINDOW}" in latest:
+            bb_std = float(np.std(list(self.closes)[-BB_WINDOW:], ddof=1))
+            latest['BB_middle'] = latest[f"SMA_{BB_WINDOW}"]
+            latest['BB_upper'] = latest['BB_middle'] + bb_std * BB_STD
+            latest['BB_lower'] = latest['BB_middle'] - bb_std * BB_STD
+
+        if self.volumes is not None and volume is not None:
+            self.volumes.append(float(volume))
+            if self.count >= VOLUME_WINDOW:
+                latest[f"Volume_SMA_{VOLUME_WINDOW}"] = sum(self.volumes) / VOLUME_WINDOW
+
+        self.latest = latest
+        return latest
+
+
+class IndicatorEngine:
+    # Per-symbol indicator cache shared by the predictor and the sentiment analyzer.
+    # Seeing the same last bar again is a dict lookup; one appended bar is an O(1) update.
+    def __init__(self, max_symbols=512):
+        self.max_symbols = max_symbols
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _covers(self, state, data, appended=0):
+        # The cached state must have been built from at least this much history
+        return (state.first_date is not None and state.first_date <= data.index[0]
+                and state.count + appended >= len(data))
+
+    @stage('indicators')
+    def latest(self, data, symbol=None):
+        if data is None or len(data) == 0:
+            return {}
+
+        close = data['Close'].values
+        volume = data['Volume'].values if 'Volume' in data else None
+        if symbol is None:
+            return latest_values(compute_indicators(close, volume))
+
+        last_date = data.index[-1]
+        with self._lock:
+            state, last_bar = self._states.get(symbol, (None, None))
+
+            if state is not None:
+                if (self._covers(state, data) and state.last_date == last_date
+                        and last_bar == (close[-1], volume[-1] if volume is not None else None)):
+                    self._states.move_to_end(symbol)
+                    return dict(state.latest)
+                if (len(data) > 1 and self._covers(state, data, appended=1) and state.last_date == data.index[-2]
+                        and last_bar == (close[-2], volume[-2] if volume is not None else None)):
+                    state.append(close[-1], volume[-1] if volume is not None else None, last_date)
+                    self._store(symbol, state, close, volume)
+                    return dict(state.latest)
+
+        # The O(n) rebuild runs outside the lock so other symbols are not held up; it is
+        # only swapped in if no state for a later bar was stored in the meantime
+        state = IndicatorState(close, volume, data.index[0], last_date)
+        with self._lock:
+            current, _ = self._states.get(symbol, (None, None))
+            if current is None or current.last_date is None or current.last_date <= last_date:
+                self._store(symbol, state, close, volume)
+        return dict(state.latest)
+
+    def _store(self, symbol, state, close, volume):
+        self._states[symbol] = (state, (close[-1], volume[-1] if volume is not None else None))
+        self._states.move_to_end(symbol)
+        while len(self._states) > self.max_symbols:
+            self._states.popitem(last=False)
@@ -0,0 +1,200 @@
+import os
+import json
+import numpy as np
+
+ARTIFACT_WEIGHTS = 'inference.npz'
+ARTIFACT_SPEC = 'inference.json'
+ARTIFACT_SCALER = 'scaler.npz'
+
+ACTIVATIONS = {
+    'linear': lambda x: x,
+    'relu': lambda x: np.maximum(x, 0),
+    'tanh': np.tanh,
+    'sigmoid': lambda x: 1.0 / (1.0 + np.exp(-x)),
+    # Keras 3: relu6(x + 3) / 6, not the 0.2 * x + 0.5 of Keras 2
+    'hard_sigmoid': lambda x: np.clip(x / 6 + 0.5, 0, 1)
+}
+
+
+def _weight_name(weight):
+    # tf.keras names look like 'batch_normalization/gamma:0', Keras 3 just 'gamma'
+    return weight.name.split('/')[-1].split(':')[0]
+
+
+def export_inference_artifact(model, path):
+    # Converts a trained Keras Sequential LSTM into plain arrays plus a JSON layer spec
+    layers = []
+    arrays = {}
+
+    for index, layer in enumerate(model.layers):
+        kind = type(layer).__name__
+        config = layer.get_config()
+        spec = {'type': kind}
+
+        if kind == 'LSTM':
+            spec.update({
+                'units': config['units'],
+                'return_sequences': config['return_sequences'],
+                'activation': config.get('activation', 'tanh'),
+                'recurrent_activation': config.get('recurrent_activation', 'sigmoid')
+            })
+            names = ['kernel', 'recurrent_kernel', 'bias']
+        elif kind == 'Dense':
+            spec.update({'units': config['units'], 'activation': config.get('activation', 'linear')})
+            names = ['kernel', 'bias']
+        elif kind == 'BatchNormalization':
+            spec.update({'epsilon': config.get('epsilon', 1e-3)})
+            names = None
+        elif kind == 'Dropout':
+            spec.update({'rate': config.get('rate', 0.0)})
+            names = []
+        elif kind == 'InputLayer':
+            continue
+        else:
+            raise ValueError(f"Layer type {kind} is not supported by the NumPy runtime")
+
+        for activation in (spec.get('activation'), spec.get('recurrent_activation')):
+            if activation is not None and activation not in ACTIVATIONS:
+                raise ValueError(f"Activation {activation} is not supported by the NumPy runtime")
+
+        if names is None:
+            weights = {_weight_name(w): np.asarray(w.numpy()) for w in layer.weights}
+        else:
+            weights = dict(zip(names, layer.get_weights()))
+
+        spec['weights'] = sorted(weights)
+        for name, value in weights.items():
+            arrays[f"{index}_{name}"] = value.astype('float32')
+        spec['index'] = index
+        layers.append(spec)
+
+    np.savez(os.path.join(path, ARTIFACT_WEIGHTS), **arrays)
+    with open(os.path.join(path, ARTIFACT_SPEC), 'w') as f:
+        json.dump({'format': 1, 'input_shape': list(model.input_shape[1:]), 'layers': layers}, f, indent=2)
+
+
+def has_inference_artifact(path):
+    return os.path.exists(os.path.join(path, ARTIFACT_WEIGHTS)) and os.path.exists(os.path.join(path, ARTIFACT_SPEC))
+
+
+def load_inference_artifact(path):
+    with open(os.path.join(path, ARTIFACT_SPEC)) as f:
+        spec = json.load(f)
+    with np.load(os.path.join(path, ARTIFACT_WEIGHTS)) as arrays:
+        weights = {name: arrays[name] for name in arrays.files}
+    return NumpyLSTMModel(spec, weights)
+
+
+def export_scaler(scaler, path):
+    np.savez(os.path.join(path, ARTIFACT_SCALER), min=scaler.min_, scale=scaler.scale_)
+
+
+def load_scaler(path):
+    if not os.path.exists(os.path.join(path, ARTIFACT_SCALER)):
+        return None
+    with np.load(os.path.join(path, ARTIFACT_SCALER)) as arrays:
+        return ArrayMinMaxScaler(arrays['min'], arrays['scale'])
+
+
+class ArrayMinMaxScaler:
+    # The transform half of a fitted sklearn MinMaxScaler, without importing sklearn
+    def __init__(self, min_, scale_):
+        self.min_ = np.array(min_, dtype='float64')
+        self.scale_ = np.array(scale_, dtype='float64')
+        self.min_.flags.writeable = False
+        self.scale_.flags.writeable = False
+
+    @classmethod
+    def fit(cls, X):
+        # Same result as MinMaxScaler(feature_range=(0, 1)).fit(X)
+        X = np.asarray(X, dtype='float64')
+        data_min = X.min(axis=0)
+        data_range = X.max(axis=0) - data_min
+        data_range[data_range == 0.0] = 1.0
+        scale = 1.0 / data_range
+        return cls(-data_min * scale, scale)
+
+    def transform(self, X):
+        return np.asarray(X, dtype='float64') * self.scale_ + self.min_
+
+    def inverse_transform(self, X):
+        return (np.asarray(X, dtype='float64') - self.min_) / self.scale_
+
+
+class NumpyLSTMModel:
+    # Inference-only forward pass of the Sequential LSTM stack; mirrors the
+    # parts of the Keras model API that the predictors use.
+    def __init__(self, spec, weights):
+        self.spec = spec
+        self.layers = []
+        for layer in spec['layers']:
+            params = {name: weights[f"{layer['index']}_{name}"] for name in layer['weights']}
+            for value in params.values():
+                value.flags.writeable = False
+            self.layers.append((layer, params))
+
+    @property
+    def input_shape(self):
+        return (None, *self.spec['input_shape'])
+
+    @property
+    def output_shape(self):
+        last_dense = [layer for layer, _ in self.layers if layer['type'] in ('Dense', 'LSTM')][-1]
+        return (None, last_dense['units'])
+
+    def _lstm(self, x, layer, params):
+        activation = ACTIVATIONS[layer['activation']]
+        recurrent_activation = ACTIVATIONS[layer['recurrent_activation']]
+        units = layer['units']
+        batch, steps, _ = x.shape
+
+        # Input projections for every timestep at once; only h @ U stays in the loop
+        projected = x @ params['kernel'] + params['bias']
+        recurrent_kernel = params['recurrent_kernel']
+        h = np.zeros((batch, units), dtype=x.dtype)
+        c = np.zeros((batch, units), dtype=x.dtype)
+        outputs = np.empty((batch, steps, units), dtype=x.dtype) if layer['return_sequences'] else None
+
+        for t in range(steps):
+            z = projected[:, t, :] + h @ recurrent_kernel
+            i = recurrent_activation(z[:, :units])
+            f = recurrent_activation(z[:, units:2 * units])
+            g = activation(z[:, 2 * units:3 * units])
+            o = recurrent_activation(z[:, 3 * units:])
+            c = f * c + i * g
+            h = o * activation(c)
+            if outputs is not None:
+                outputs[:, t, :] = h
+
+        return outputs if outputs is not None else h
+
+    def _batch_norm(self, x, layer, params):
+        scale = 1.0 / np.sqrt(params['moving_variance'] + layer['epsilon'])
+        if 'gamma' in params:
+            scale = scale * params['gamma']
+        x = (x - params['moving_mean']) * scale
+        if 'beta' in params:
+            x = x + params['beta']
+        return x
+
+    def __call__(self, x, training=False, rng=None):
+        # training=True only switches Dropout on (Monte Carlo dropout); BatchNormalization
+        # keeps using its moving statistics
+        x = np.asarray(x, dtype='float32')
+        if training and rng is None:
+            rng = np.random.default_rng()
+        for layer, params in self.layers:
+            kind = layer['type']
+            if kind == 'LSTM':
+                x = self._lstm(x, layer, params)
+            elif kind == 'Dense':
+                x = ACTIVATIONS[layer['activation']](x @ params['kernel'] + params['bias'])
+            elif kind == 'BatchNormalization':
+                x = self._batch_norm(x, layer, params)
+            elif kind == 'Dropout' and training and layer['rate']:
+                keep = 1.0 - layer['rate']
+                x = x * (rng.random(x.shape, dtype='float32') < keep) / np.float32(keep)
+        return x
+
+    def predict(self, x, verbose=0, batch_size=None):
+        return self(x)
@@ -0,0 +1,160 @@
+import os
+import threading
+from datetime import datetime
+import numpy as np
+from .lstm_model import LSTMStockPredictor
+from .indicators import IndicatorState
+from .training_jobs import QueueFullError
+from market_data.intraday import IntradayFeed, Broadcaster, make_source
+from monitoring.metrics import stage
+
+
+class LiveForecaster:
+    # Intraday mode: on every new bar from the feed, updates the symbol's indicators in
+    # O(1) and its LSTM forecast for the next bars, and pushes the result to subscribers.
+    # Intraday models are trained on the feed's own bars and kept apart from the daily ones.
+    def __init__(self, predictor, feed=None):
+        self.interval = feed.interval if feed is not None else os.environ.get('INTRADAY_INTERVAL', '5m')
+        daily = predictor.lstm_model
+        self.model = LSTMStockPredictor(
+            lookback=daily.lookback, epochs=daily.epochs, batch_size=daily.batch_size,
+            forecast_mode=daily.forecast_mode, units=daily.units, interval=self.interval
+        )
+        self.horizon = int(os.environ.get('INTRADAY_FORECAST_BARS', 12))
+        self.min_bars = self.model.lookback + 100
+        self.registry = predictor.model_registry
+        self.training_jobs = predictor.training_jobs
+        # Every open stream holds one of the worker's GUNICORN_THREADS; by default half are left for other requests
+        max_streams = int(os.environ.get('INTRADAY_MAX_STREAMS', max(1, int(os.environ.get('GUNICORN_THREADS', 4)) // 2)))
+        self.broadcaster = Broadcaster(max_queued=int(os.environ.get('INTRADAY_MAX_QUEUED_EVENTS', 100)),
+                                       max_subscriptions=max_streams)
+        self._feed = feed
+        if feed is not None:
+            feed.add_listener(self.on_bar)
+        self._states = {}
+        self._latest = {}
+        self._lock = threading.Lock()
+
+    @property
+    def feed(self):
+        # Built on first use: INTRADAY_SOURCE picks Yahoo polling or a replay file
+        with self._lock:
+            if self._feed is None:
+                self._feed = IntradayFeed(make_source(self.interval), self.interval,
+                                          capacity=int(os.environ.get('INTRADAY_BUFFER_BARS', 2000)))
+                self._feed.add_listener(self.on_bar)
+            return self._feed
+
+    def subscribe(self, symbols):
+        # The latest update of every symbol goes out first, then one per new bar
+        subscription = self.broadcaster.subscribe(symbols)
+        try:
+            self.feed.watch(symbols)
+        except Exception:
+            self.broadcaster.unsubscribe(subscription)
+            raise
+        for symbol in symbols:
+            update = self.latest(symbol)
+            if update is not None:
+                subscription.put(('update', update))
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self.broadcaster.unsubscribe(subscription)
+        evicted = self.feed.unwatch(subscription.symbols)
+        with self._lock:
+            for symbol in evicted:
+                self._states.pop(symbol, None)
+                self._latest.pop(symbol, None)
+
+    def latest(self, symbol):
+        with self._lock:
+            return self._latest.get(symbol)
+
+    def snapshot(self, symbol):
+        # Latest update of a watched symbol, or one built from a one-off backfill. The
+        # symbol is not watched, nothing is kept, and training is not queued for it.
+        update = self.latest(symbol)
+        if update is not None:
+            return update
+        frame = self.feed.snapshot(symbol)
+        if frame is None:
+            return None
+        state = IndicatorState(frame['Close'].values, frame['Volume'].values, frame.index[0], frame.index[-1])
+        return self.build_update(symbol, frame, dict(state.latest))
+
+    @stage('indicators')
+    def update_indicators(self, symbol, frame):
+        close = frame['Close'].values
+        volume = frame['Volume'].values
+        with self._lock:
+            state = self._states.get(symbol)
+        if state is not None and len(frame) > 1 and state.last_date == frame.index[-2]:
+            state.append(close[-1], volume[-1], frame.index[-1])
+        else:
+            # First bars of the symbol, or bars were skipped: rebuild from the buffer
+            state = IndicatorState(close, volume, frame.index[0], frame.index[-1])
+        with self._lock:
+            # Checked under the lock that unsubscribe evicts with, so no state outlives its symbol
+            if symbol in self._feed.watched:
+                self._states[symbol] = state
+        return dict(state.latest)
+
+    def forecast(self, symbol, frame):
+        if len(frame) < self.min_bars:
+            return {'status': 'collecting', 'bars': len(frame), 'barsNeeded': self.min_bars}
+
+        trained = self.registry.find_latest(symbol, frame, self.model)
+        if trained is None:
+            if symbol not in self.feed.watched:
+                # One-off snapshots of unwatched symbols do not queue training
+                return {'status': 'no_model'}
+            try:
+                job = self.training_jobs.submit(symbol, frame, self.model)
+            except QueueFullError as e:
+                return {'status': 'queue_full', 'message': str(e)}
+            return {'status': 'training', 'jobId': job.id}
+
+        predictions = self.model.predict_next_days(frame, self.horizon, model=trained.model, scaler=trained.scaler)
+        current_price = float(frame['Close'].iloc[-1])
+        return {
+            'status': 'ok',
+            'modelVersion': trained.version,
+            'barsAhead': self.horizon,
+            'predictedPrice': round(float(predictions[-1]), 2),
+            'priceChangePercent': round((float(predictions[-1]) - current_price) / current_price * 100, 2),
+            'path': [round(float(price), 2) for price in predictions]
+        }
+
+    def on_bar(self, symbol, frame):
+        update = self.build_update(symbol, frame, self.update_indicators(symbol, frame))
+        with self._lock:
+            if symbol in self._feed.watched:
+                self._latest[symbol] = update
+        self.broadcaster.publish(symbol, 'update', update)
+
+    def build_update(self, symbol, frame, indicators):
+        last = frame.iloc[-1]
+        try:
+            forecast = self.forecast(symbol, frame)
+        except Exception as e:
+            print(f"Intraday forecast error for {symbol}: {e}")
+            forecast = {'status': 'error', 'message': str(e)}
+
+        update = {
+            'symbol': symbol,
+            'interval': self.interval,
+            'time': frame.index[-1].isoformat(),
+            'bar': {column.lower(): float(last[column]) for column in frame.columns},
+            'indicators': {name: round(float(value), 4) for name, value in indicators.items() if not np.isnan(value)},
+            'forecast': forecast,
+            'timestamp': datetime.now().isoformat()
+        }
+        return update
+
+    def stats(self):
+        with self._lock:
+            feed = self._feed
+        stats = feed.stats() if feed is not None else {'interval': self.interval, 'running': False}
+        stats['subscribers'] = len(self.broadcaster.subscriptions)
+        return stats
@@ -1,36 +1,72 @@
 import numpy as np
 import pandas as pd
-from tensorflow import keras
-from keras.models import Sequential
-from keras.layers import LSTM, Dense, Dropout, BatchNormalization
-from keras.callbacks import EarlyStopping
-from sklearn.preprocessing import MinMaxScaler
+import joblib
+from .inference import (export_inference_artifact, has_inference_artifact, load_inference_artifact,
+                        export_scaler, load_scaler, NumpyLSTMModel)
+from .windowing import window_views, make_window_batches
+from monitoring.metrics import stage
+import os
 import warnings
 warnings.filterwarnings('ignore')
 
+FEATURES = ['Open', 'High', 'Low', 'Close', 'Volume']
+MAX_HORIZON = 30
+DEFAULT_UNITS = (128, 64, 32)
+
 class LSTMStockPredictor:
-    def __init__(self, lookback=60, epochs=50, batch_size=32):
+    def __init__(self, lookback=60, epochs=50, batch_size=32, forecast_mode='recursive', horizon=MAX_HORIZON, dtype='float32',
+                 units=DEFAULT_UNITS, interval='1d'):
+        if forecast_mode not in ('recursive', 'direct'):
+            raise ValueError(f"Unknown forecast mode: {forecast_mode}")
         self.lookback = lookback
         self.epochs = epochs
         self.batch_size = batch_size
+        self.forecast_mode = forecast_mode
+        # Direct mode predicts days 1..horizon in one forward pass; recursive predicts one day at a time
+        self.horizon = horizon if forecast_mode == 'direct' else 1
+        self.features = list(FEATURES)
+        # Widths of the stacked LSTM layers
+        self.units = tuple(units)
+        # Bar size the model is trained on; intraday models are stored apart from the daily ones
+        self.interval = interval
+        # Storage type of the scaled training series; Keras computes in float32 anyway
+        self.dtype = dtype
         self.model = None
-        self.scaler = MinMaxScaler(feature_range=(0, 1))
+        self.scaler = None
+
+    @property
+    def variant(self):
+        parts = [f"h{self.horizon}" if self.forecast_mode == 'direct' else '',
+                 'u' + '-'.join(map(str, self.units)) if self.units != DEFAULT_UNITS else '',
+                 self.interval if self.interval != '1d' else '']
+        return '_'.join(part for part in parts if part)
+
+    def lstm_layers(self, input_shape):
+        from keras.layers import LSTM, Dropout, BatchNormalization
+
+        layers = []
+        for i, units in enumerate(self.units):
+            last = i == len(self.units) - 1
+            kwargs = {'input_shape': input_shape} if i == 0 and input_shape is not None else {}
+            layers.append(LSTM(units, return_sequences=not last, **kwargs))
+            layers.append(Dropout(0.2))
+            if not last:
+                layers.append(BatchNormalization())
+        return layers
 
     def prepare_data(self, data, target_col='Close'):
-        if len(data) < self.lookback + 1:
-            raise ValueError(f"Insufficient data. Need at least {self.lookback + 1} data points.")
+        if len(data) < self.lookback + self.horizon:
+            raise ValueError(f"Insufficient data. Need at least {self.lookback + self.horizon} data points.")
 
-        features = ['Open', 'High', 'Low', 'Close', 'Volume']
-        data_features = data[features].values
+        from sklearn.preprocessing import MinMaxScaler
 
-        scaled_data = self.scaler.fit_transform(data_features)
+        data_features = data[self.features].values
 
-        X, y = [], []
-        for i in range(self.lookback, len(scaled_data)):
-            X.append(scaled_data[i-self.lookback:i])
-            y.append(scaled_data[i, 3])
+        self.scaler = MinMaxScaler(feature_range=(0, 1))
+        scaled_data = self.scaler.fit_transform(data_features).astype(self.dtype)
 
-        X, y = np.array(X), np.array(y)
+        # Strided views into scaled_data, not copies of every window
+        X, y = window_views(scaled_data, self.lookback, self.horizon, target_col=3)
 
         split = int(0.8 * len(X))
         X_train, X_test = X[:split], X[split:]
@@ -38,81 +74,182 @@ class LSTMStockPredictor:
 
         return X_train, X_test, y_train, y_test, scaled_data
 
-    def build_model(self, input_shape):
-        model = Sequential([
-            LSTM(128, return_sequences=True, input_shape=input_shape),
-            Dropout(0.2),
-            BatchNormalization(),
-
-            LSTM(64, return_sequences=True),
-            Dropout(0.2),
-            BatchNormalization(),
-
-            LSTM(32, return_sequences=False),
-            Dropout(0.2),
+    def build_model(self, input_shape, horizon=None):
+        # TensorFlow is only imported when a model has to be built or trained
+        from keras.models import Sequential
+        from keras.layers import Dense
 
+        horizon = horizon or self.horizon
+        model = Sequential(self.lstm_layers(input_shape) + [
             Dense(32, activation='relu'),
             Dense(16, activation='relu'),
-            Dense(1)
+            Dense(horizon)
         ])
 
         model.compile(optimizer='adam', loss='mean_squared_error', metrics=['mae'])
         return model
 
-    def train(self, X_train, y_train, X_test, y_test):
-        self.model = self.build_model((X_train.shape[1], X_train.shape[2]))
+    def train(self, X_train, y_train, X_test, y_test, callbacks=None):
+        from keras.callbacks import EarlyStopping
+
+        self.model = self.build_model((self.lookback, len(self.features)))
 
         early_stop = EarlyStopping(monitor='val_loss', patience=10, restore_best_weights=True)
 
+        # Batches are copied out of the window views one at a time
         history = self.model.fit(
-            X_train, y_train,
+            make_window_batches(X_train, y_train, self.batch_size, shuffle=True),
             epochs=self.epochs,
-            batch_size=self.batch_size,
-            validation_data=(X_test, y_test),
-            callbacks=[early_stop],
+            validation_data=make_window_batches(X_test, y_test, self.batch_size),
+            callbacks=[early_stop] + list(callbacks or []),
             verbose=0
         )
 
         return history
 
-    def predict_next_days(self, data, days=1):
-        if self.model is None:
-            X_train, X_test, y_train, y_test, scaled_data = self.prepare_data(data)
-            self.train(X_train, y_train, X_test, y_test)
-        else:
-            # If model exists, we still need to fit scaler on current data
-            features = ['Open', 'High', 'Low', 'Close', 'Volume']
-            data_features = data[features].values
-            self.scaler.fit(data_features)
-
-        features = ['Open', 'High', 'Low', 'Close', 'Volume']
-        data_features = data[features].values
-        scaled_data = self.scaler.transform(data_features)
-
-        last_sequence = scaled_data[-self.lookback:]
-        predictions = []
-        current_sequence = last_sequence.copy()
-
-        for _ in range(days):
-            current_batch = current_sequence.reshape((1, self.lookback, current_sequence.shape[1]))
-            predicted_price = self.model.predict(current_batch, verbose=0)[0, 0]
-            predictions.append(predicted_price)
+    def fit(self, data, callbacks=None):
+        # Trains on a private copy of the predictor, so the shared instance never
+        # holds a model or scaler and can serve concurrent requests.
+        trainer = LSTMStockPredictor(self.lookback, self.epochs, self.batch_size,
+                                     forecast_mode=self.forecast_mode, horizon=self.horizon, dtype=self.dtype,
+                                     units=self.units, interval=self.interval)
+        trainer.features = list(self.features)
+        X_train, X_test, y_train, y_test, _ = trainer.prepare_data(data)
+        history = trainer.train(X_train, y_train, X_test, y_test, callbacks=callbacks)
+        return trainer.model, trainer.scaler, history
+
+    def new_windows(self, data, scaler, since):
+        # Windows whose first target bar is after `since`, scaled with an existing scaler
+        scaled = scaler.transform(data[self.features].values).astype(self.dtype)
+        X, y = window_views(scaled, self.lookback, self.horizon, target_col=3)
+        target_dates = np.asarray(data.index[self.lookback:self.lookback + len(y)].strftime('%Y-%m-%d'))
+        first = int(np.searchsorted(target_dates, since, side='right'))
+        return X[first:], y[first:]
+
+    def evaluate_windows(self, model, X, y):
+        return float(np.atleast_1d(model.evaluate(make_window_batches(X, y, self.batch_size), verbose=0))[0])
+
+    def fine_tune(self, model, X, y, epochs, callbacks=None):
+        # Warm start: continues training a loaded Keras model (weights and optimizer
+        # state) on the given windows only
+        return model.fit(
+            make_window_batches(X, y, self.batch_size, shuffle=True),
+            epochs=epochs,
+            callbacks=list(callbacks or []),
+            verbose=0
+        )
 
-            new_row = current_sequence[-1].copy()
-            new_row[3] = predicted_price
-            current_sequence = np.vstack([current_sequence[1:], new_row])
+    def bind(self, trained, symbol, data):
+        # (model, scaler) to predict this symbol with; a per-symbol model needs no adapting
+        return trained.model, trained.scaler
+
+    def save_model(self, model, path):
+        model.save(os.path.join(path, 'model.keras'))
+        try:
+            export_inference_artifact(model, path)
+        except Exception as e:
+            print(f"Could not export NumPy inference artifact: {e}")
+
+    def save_scaler(self, scaler, path):
+        joblib.dump(scaler, os.path.join(path, 'scaler.pkl'))
+        export_scaler(scaler, path)
+
+    def load_scaler(self, path, runtime=None):
+        runtime = runtime or os.environ.get('MODEL_RUNTIME', 'numpy')
+        if runtime == 'numpy':
+            scaler = load_scaler(path)
+            if scaler is not None:
+                return scaler
+        scaler = joblib.load(os.path.join(path, 'scaler.pkl'))
+        if runtime == 'numpy':
+            export_scaler(scaler, path)
+        return scaler
+
+    def load_model(self, path, runtime=None):
+        runtime = runtime or os.environ.get('MODEL_RUNTIME', 'numpy')
+
+        if runtime == 'numpy':
+            if has_inference_artifact(path):
+                return load_inference_artifact(path)
+            print(f"No NumPy inference artifact in {path}, falling back to Keras")
+
+        from keras.models import load_model
+        model = load_model(os.path.join(path, 'model.keras'))
+        if runtime == 'numpy':
+            # Older stores: export once so the next load skips TensorFlow
+            try:
+                export_inference_artifact(model, path)
+            except Exception as e:
+                print(f"Could not export NumPy inference artifact: {e}")
+        return model
 
+    def predict_next_days(self, data, days, model, scaler):
+        # model and scaler come from the model registry and are only read here,
+        # so concurrent requests never share or refit per-symbol state.
+        window = self.scale_window(data, scaler)
+        predictions = self.predict_windows(model, window[np.newaxis], days)[0]
+
+        return self.inverse_close(predictions, data, scaler)
+
+    @stage('scaling')
+    def scale_window(self, data, scaler):
+        return scaler.transform(data[self.features].values[-self.lookback:])
+
+    @staticmethod
+    def forward(model, x, stochastic=False):
+        if not stochastic:
+            return model.predict(x, verbose=0)
+        if isinstance(model, NumpyLSTMModel):
+            return model(x, training=True)
+        # Keras Sequential: only the Dropout layers run in training mode
+        from keras.layers import Dropout
+        x = np.asarray(x, dtype='float32')
+        for layer in model.layers:
+            x = layer(x, training=isinstance(layer, Dropout))
+        return np.asarray(x)
+
+    @stage('inference')
+    def predict_windows(self, model, windows, days, stochastic=False):
+        # windows: (n, lookback, features) already scaled. stochastic keeps dropout on,
+        # so every row is an independent Monte Carlo sample.
+        if model.output_shape[-1] >= days:
+            # Direct multi-horizon head: all days from a single forward pass
+            return np.asarray(self.forward(model, np.asarray(windows), stochastic))[:, :days].astype('float64')
+
+        # Recursive head: every step runs one model.predict over the whole batch
+        # instead of one call per window.
+        current_sequence = np.array(windows, dtype='float64', copy=True)
+        predictions = np.empty((len(current_sequence), days))
+
+        for day in range(days):
+            predicted_price = np.asarray(self.forward(model, current_sequence, stochastic))[:, 0]
+            predictions[:, day] = predicted_price
+
+            new_rows = current_sequence[:, -1:, :].copy()
+            new_rows[:, 0, 3] = predicted_price
+            current_sequence = np.concatenate([current_sequence[:, 1:, :], new_rows], axis=1)
+
+        return predictions
+
+    @stage('scaling')
+    def inverse_close(self, predictions, data, scaler):
         # Create dummy array with realistic values from current data to help inverse transform
-        dummy_array = np.zeros((len(predictions), 5))
-        # Use last known values for other features
-        last_values = data_features[-1].copy()
-        for i in range(len(predictions)):
-            dummy_array[i] = last_values
-            dummy_array[i, 3] = predictions[i]
-
-        predicted_prices = self.scaler.inverse_transform(dummy_array)[:, 3]
-
-        return predicted_prices
+        dummy_array = np.tile(data[self.features].values[-1], (len(predictions), 1)).astype('float64')
+        dummy_array[:, 3] = predictions
+
+        return scaler.inverse_transform(dummy_array)[:, 3]
+
+    def sample_windows(self, model, windows, days, samples):
+        # Monte Carlo dropout: each window is tiled `samples` times into one batch, so all
+        # samples share each forward pass. Returns scaled paths of shape (n, samples, days).
+        tiled = np.repeat(np.asarray(windows), samples, axis=0)
+        return self.predict_windows(model, tiled, days, stochastic=True).reshape(len(windows), samples, days)
+
+    def interval_bands(self, paths, data, scaler, quantiles=(10, 50, 90)):
+        # paths: (samples, days) scaled closes of one window -> {'p10': [per-day prices], ...}
+        samples, days = paths.shape
+        prices = self.inverse_close(paths.ravel(), data, scaler).reshape(samples, days)
+        return {f"p{q}": band for q, band in zip(quantiles, np.percentile(prices, quantiles, axis=0))}
 
     def calculate_confidence(self, data, predictions):
         recent_volatility = data['Close'].pct_change().std()
@@ -0,0 +1,330 @@
+import os
+import re
+import json
+import shutil
+import hashlib
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future
+from datetime import datetime
+from types import MappingProxyType
+from .fine_tuning import FineTunePolicy
+from monitoring.metrics import stage, MODEL_LOADS, TRAINING_RUNS
+
+ModelKey = namedtuple('ModelKey', ['symbol', 'lookback', 'features', 'cutoff', 'variant'], defaults=[''])
+
+DEFAULT_MODEL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'model_store')
+
+
+class TrainedModel(namedtuple('TrainedModel', ['key', 'model', 'scaler', 'metadata'])):
+    # Immutable once built: requests share it but never modify it
+    __slots__ = ()
+
+    def __new__(cls, key, model, scaler, metadata=None):
+        return super().__new__(cls, key, model, scaler, MappingProxyType(dict(metadata or {})))
+
+    @property
+    def version(self):
+        variant = f":{self.key.variant}" if self.key.variant else ''
+        return f"{self.key.symbol}:{self.key.lookback}{variant}:{feature_set_id(self.key.features)}:{self.key.cutoff}"
+
+
+def feature_set_id(features):
+    return hashlib.sha1(','.join(features).encode('utf-8')).hexdigest()[:8]
+
+
+def key_prefix(lookback, features, variant=''):
+    variant = f"{variant}_" if variant else ''
+    return f"lb{lookback}_{variant}{feature_set_id(features)}_"
+
+
+def data_cutoff(data):
+    if isinstance(data, dict):
+        # Pooled histories of a global model: the newest bar of any symbol
+        return max(data_cutoff(frame) for frame in data.values())
+    return data.index[-1].strftime('%Y-%m-%d')
+
+
+class ModelRegistry:
+    def __init__(self, root=None, max_models=8, max_age_days=7, fine_tune_policy=None):
+        self.root = root or os.environ.get('MODEL_DIR', DEFAULT_MODEL_DIR)
+        self.max_models = max_models
+        self.max_age_days = max_age_days
+        self.fine_tune_policy = fine_tune_policy or FineTunePolicy()
+        self._models = OrderedDict()
+        self._training = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def add_listener(self, callback):
+        # callback(key) runs after a newly trained model is stored
+        self._listeners.append(callback)
+
+    def key_for(self, symbol, data, predictor):
+        return ModelKey(symbol.upper(), predictor.lookback, tuple(predictor.features), data_cutoff(data), predictor.variant)
+
+    def _symbol_dir(self, symbol):
+        return os.path.join(self.root, re.sub(r'[^A-Za-z0-9._^-]', '_', symbol.upper()))
+
+    def _path_for(self, key):
+        name = f"{key_prefix(key.lookback, key.features, key.variant)}{key.cutoff}"
+        return os.path.join(self._symbol_dir(key.symbol), name)
+
+    def _remember(self, trained):
+        with self._lock:
+            self._models[trained.key] = trained
+            self._models.move_to_end(trained.key)
+            while len(self._models) > self.max_models:
+                self._models.popitem(last=False)
+
+    def exists(self, key):
+        with self._lock:
+            if key in self._models:
+                return True
+        return os.path.exists(os.path.join(self._path_for(key), 'meta.json'))
+
+    def get(self, key, predictor):
+        with self._lock:
+            trained = self._models.get(key)
+            if trained is not None:
+                self._models.move_to_end(key)
+                return trained
+
+        path = self._path_for(key)
+        if not os.path.exists(os.path.join(path, 'meta.json')):
+            return None
+
+        try:
+            with open(os.path.join(path, 'meta.json')) as f:
+                metadata = json.load(f)
+            with stage('model_load'):
+                model = predictor.load_model(path)
+                scaler = predictor.load_scaler(path)
+        except Exception as e:
+            print(f"Error loading model {path}: {e}")
+            return None
+        MODEL_LOADS.inc(runtime=type(model).__name__)
+
+        print(f"Loaded model for {key.symbol} (cutoff {key.cutoff}) from disk")
+        trained = TrainedModel(key, model, scaler, metadata)
+        self._remember(trained)
+        return trained
+
+    def put(self, key, model, scaler, predictor, metadata=None):
+        metadata = dict(metadata or {})
+        metadata.update({
+            'symbol': key.symbol,
+            'lookback': key.lookback,
+            'features': list(key.features),
+            'variant': key.variant,
+            'cutoff': key.cutoff,
+            'saved_at': datetime.now().isoformat()
+        })
+
+        path = self._path_for(key)
+        tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        os.makedirs(tmp_path, exist_ok=True)
+        try:
+            predictor.save_model(model, tmp_path)
+            predictor.save_scaler(scaler, tmp_path)
+            with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+                json.dump(metadata, f, indent=2)
+            if os.path.exists(path):
+                shutil.rmtree(path)
+            os.replace(tmp_path, path)
+            # Serve what a fresh process would load (e.g. the thread-safe NumPy runtime)
+            model = predictor.load_model(path)
+            scaler = predictor.load_scaler(path)
+        except Exception as e:
+            print(f"Error saving model {path}: {e}")
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+        trained = TrainedModel(key, model, scaler, metadata)
+        self._remember(trained)
+        for callback in self._listeners:
+            callback(key)
+        return trained
+
+    def available_cutoffs(self, symbol, lookback, features, variant=''):
+        prefix = key_prefix(lookback, features, variant)
+        cutoffs = set()
+
+        with self._lock:
+            for key in self._models:
+                if (key.symbol == symbol.upper() and key.lookback == lookback
+                        and key.features == tuple(features) and key.variant == variant):
+                    cutoffs.add(key.cutoff)
+
+        symbol_dir = self._symbol_dir(symbol)
+        if os.path.isdir(symbol_dir):
+            for name in os.listdir(symbol_dir):
+                if name.startswith(prefix) and os.path.exists(os.path.join(symbol_dir, name, 'meta.json')):
+                    cutoffs.add(name[len(prefix):])
+
+        return sorted(cutoffs)
+
+    def preload(self, predictor, symbols=None):
+        # Loads the newest model of each symbol for this predictor's config, most recently
+        # saved first, up to max_models. Run in the master process before workers fork.
+        prefix = key_prefix(predictor.lookback, predictor.features, predictor.variant)
+        if symbols is None:
+            symbols = [name for name in os.listdir(self.root)
+                       if not name.startswith('__') and name != 'reports' and os.path.isdir(os.path.join(self.root, name))]
+
+        newest = []
+        for symbol in symbols:
+            symbol_dir = self._symbol_dir(symbol)
+            if not os.path.isdir(symbol_dir):
+                continue
+            names = sorted(name for name in os.listdir(symbol_dir)
+                           if name.startswith(prefix) and os.path.exists(os.path.join(symbol_dir, name, 'meta.json')))
+            if names:
+                meta_path = os.path.join(symbol_dir, names[-1], 'meta.json')
+                newest.append((os.path.getmtime(meta_path), symbol, names[-1][len(prefix):]))
+
+        # Oldest of the selection first, so the LRU ends up ordered by recency
+        loaded = []
+        for _, symbol, cutoff in sorted(newest)[-self.max_models:]:
+            key = ModelKey(symbol.upper(), predictor.lookback, tuple(predictor.features), cutoff, predictor.variant)
+            if self.get(key, predictor) is not None:
+                loaded.append(key)
+        return loaded
+
+    def find_latest(self, symbol, data, predictor):
+        # Newest model trained on data up to (and not after) the current last bar,
+        # as long as it is not older than max_age_days.
+        as_of = data_cutoff(data)
+        as_of_date = datetime.strptime(as_of, '%Y-%m-%d')
+
+        for cutoff in reversed(self.available_cutoffs(symbol, predictor.lookback, predictor.features, predictor.variant)):
+            if cutoff > as_of:
+                continue
+            if (as_of_date - datetime.strptime(cutoff, '%Y-%m-%d')).days > self.max_age_days:
+                break
+            key = ModelKey(symbol.upper(), predictor.lookback, tuple(predictor.features), cutoff, predictor.variant)
+            trained = self.get(key, predictor)
+            if trained is not None:
+                return trained
+
+        return None
+
+    def find_base(self, symbol, data, predictor):
+        # Newest model trained on data strictly before the current last bar, at any age
+        as_of = data_cutoff(data)
+        for cutoff in reversed(self.available_cutoffs(symbol, predictor.lookback, predictor.features, predictor.variant)):
+            if cutoff < as_of:
+                key = ModelKey(symbol.upper(), predictor.lookback, tuple(predictor.features), cutoff, predictor.variant)
+                return self.get(key, predictor)
+        return None
+
+    def fine_tune(self, symbol, data, predictor, callbacks=None):
+        # Warm start from the newest earlier model; returns None when the policy asks for a full retrain
+        base = self.find_base(symbol, data, predictor)
+        if base is None:
+            return None
+
+        policy = self.fine_tune_policy
+        reason = policy.full_retrain_reason(base, data, predictor)
+        if reason is None:
+            started = datetime.now()
+            # The registry serves the NumPy runtime; training needs the Keras model
+            from keras.models import load_model
+            model = load_model(os.path.join(self._path_for(base.key), 'model.keras'))
+            X, y = predictor.new_windows(data, base.scaler, base.key.cutoff)
+            if len(y) == 0:
+                reason = 'no complete windows since the base model'
+            else:
+                new_window_loss = predictor.evaluate_windows(model, X, y)
+                reason = policy.drift_reason(base, new_window_loss)
+
+        if reason is not None:
+            print(f"Full retrain for {symbol}: {reason}")
+            return None
+
+        print(f"Fine-tuning {symbol} on {len(y)} new windows since {base.key.cutoff}...")
+        try:
+            with stage('training'):
+                history = predictor.fine_tune(model, X, y, policy.epochs, callbacks=callbacks)
+        except Exception:
+            TRAINING_RUNS.inc(mode='fine_tune', status='error')
+            raise
+        TRAINING_RUNS.inc(mode='fine_tune', status='ok')
+        loss = history.history.get('loss', [])
+        metadata = {
+            'trained_at': datetime.now().isoformat(),
+            'train_seconds': round((datetime.now() - started).total_seconds(), 2),
+            'mode': 'fine_tune',
+            'base_cutoff': base.key.cutoff,
+            'fine_tunes': base.metadata.get('fine_tunes', 0) + 1,
+            'epochs_run': len(loss),
+            'loss': float(loss[-1]) if loss else None,
+            'new_window_loss': new_window_loss,
+            # Fine-tuning holds out no validation split; loss and new_window_loss describe this run
+            'val_loss': None,
+            'full_val_loss': base.metadata.get('full_val_loss', base.metadata.get('val_loss')),
+            'new_windows': len(y),
+            'samples': len(data)
+        }
+        return self.put(self.key_for(symbol, data, predictor), model, base.scaler, predictor, metadata)
+
+    def train(self, symbol, data, predictor, callbacks=None, full=False):
+        # Pooled (global) training data is always trained from scratch
+        if not full and not isinstance(data, dict):
+            trained = self.fine_tune(symbol, data, predictor, callbacks)
+            if trained is not None:
+                return trained
+
+        print(f"Training LSTM model for {symbol}...")
+        started = datetime.now()
+        try:
+            with stage('training'):
+                model, scaler, history = predictor.fit(data, callbacks=callbacks)
+        except Exception:
+            TRAINING_RUNS.inc(mode='full', status='error')
+            raise
+        TRAINING_RUNS.inc(mode='full', status='ok')
+
+        val_loss = history.history.get('val_loss', [])
+        val_loss = float(min(val_loss)) if val_loss else None
+        metadata = {
+            'trained_at': datetime.now().isoformat(),
+            'train_seconds': round((datetime.now() - started).total_seconds(), 2),
+            'mode': 'full',
+            'fine_tunes': 0,
+            'epochs_run': len(history.history.get('loss', [])),
+            'val_loss': val_loss,
+            'full_val_loss': val_loss,
+            'samples': sum(len(frame) for frame in data.values()) if isinstance(data, dict) else len(data)
+        }
+        return self.put(self.key_for(symbol, data, predictor), model, scaler, predictor, metadata)
+
+    def get_or_train(self, symbol, data, predictor, callbacks=None):
+        trained = self.find_latest(symbol, data, predictor)
+        if trained is not None:
+            return trained
+
+        # Concurrent requests for the same cold symbol wait on a single training run
+        job_key = (symbol.upper(), predictor.lookback, tuple(predictor.features), predictor.variant)
+        with self._lock:
+            future = self._training.get(job_key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._training[job_key] = future
+
+        if not owner:
+            print(f"Waiting for in-flight training of {symbol}...")
+            return future.result()
+
+        try:
+            # Another request may have finished training before this one took ownership
+            trained = self.find_latest(symbol, data, predictor) or self.train(symbol, data, predictor, callbacks)
+            future.set_result(trained)
+            return trained
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._training.pop(job_key, None)
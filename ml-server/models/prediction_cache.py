@@ -0,0 +1,58 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+
+class PredictionCache:
+    # Prediction responses keyed by (symbol, days, model version, last bar).
+    # A new bar or a retrained model changes the key, so stale entries are never served.
+    def __init__(self, max_entries=None, ttl_seconds=None):
+        self.max_entries = max_entries if max_entries is not None else int(os.environ.get('PREDICTION_CACHE_SIZE', 512))
+        # Bounds how long fundamentals folded into a response can be reused
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else int(os.environ.get('PREDICTION_CACHE_TTL_SECONDS', 900))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(symbol, days, model_version, data, interval_samples=0):
+        last_bar = data.index[-1]
+        return (symbol.upper(), int(days), model_version, last_bar.strftime('%Y-%m-%d'), round(float(data['Close'].iloc[-1]), 6),
+                int(interval_samples))
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry[0] > self.ttl_seconds:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry[1])
+
+    def put(self, key, prediction):
+        with self._lock:
+            self._entries[key] = (time.time(), dict(prediction))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, symbol=None):
+        with self._lock:
+            if symbol is None:
+                self._entries.clear()
+                return
+            for key in [k for k in self._entries if k[0] == symbol.upper()]:
+                del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries),
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
@@ -0,0 +1,253 @@
+import re
+import threading
+import numpy as np
+from .indicators import SMA_WINDOWS, RSI_WINDOW, MACD_FAST, MACD_SLOW, MACD_SIGNAL, BB_WINDOW, BB_STD, VOLUME_WINDOW, rsi_from_means
+from monitoring.metrics import stage
+
+# Bars per symbol in the screening array: enough for SMA_200, and the MACD averages have settled
+SCREEN_BARS = 252
+
+NUMERIC_FIELDS = ('price', 'change_1d', 'change_5d', 'rsi', 'sma_20', 'sma_50', 'sma_200', 'macd', 'macd_signal',
+                  'bb_upper', 'bb_lower', 'volume_ratio', 'score', 'bars')
+LABEL_FIELDS = ('rsi_signal', 'ma_signal', 'macd_trend', 'macd_cross')
+BOOLEAN_FIELDS = ('volume_spike',)
+
+OPERATORS = {
+    '<': np.less,
+    '<=': np.less_equal,
+    '>': np.greater,
+    '>=': np.greater_equal,
+    '=': np.equal,
+    '==': np.equal,
+    '!=': np.not_equal
+}
+
+CLAUSE_PATTERN = re.compile(r'^([a-z_0-9]+)\s*(<=|>=|==|!=|<|>|=)\s*(\S+)$', re.IGNORECASE)
+
+
+def parse_filters(expression):
+    # "rsi<30, ma_signal=Bullish and volume_spike=true" -> [('rsi', '<', 30.0), ...]
+    if not expression:
+        return []
+    clauses = expression if isinstance(expression, (list, tuple)) else re.split(r'\s*(?:,|&|\band\b)\s*', expression.strip(), flags=re.IGNORECASE)
+
+    filters = []
+    for clause in clauses:
+        if not clause.strip():
+            continue
+        match = CLAUSE_PATTERN.match(clause.strip())
+        if not match:
+            raise ValueError(f"Invalid filter: {clause}")
+        field, operator, value = match.group(1).lower(), match.group(2), match.group(3)
+
+        if field in NUMERIC_FIELDS:
+            try:
+                value = float(value)
+            except ValueError:
+                raise ValueError(f"{field} needs a number, got {value}")
+        elif field in LABEL_FIELDS + BOOLEAN_FIELDS:
+            if operator not in ('=', '==', '!='):
+                raise ValueError(f"{field} can only be compared with = or !=")
+            if field in BOOLEAN_FIELDS:
+                if value.lower() not in ('true', 'false'):
+                    raise ValueError(f"{field} needs true or false, got {value}")
+                value = value.lower() == 'true'
+            else:
+                value = value.capitalize()
+        else:
+            raise ValueError(f"Unknown filter field: {field}")
+        filters.append((field, operator, value))
+    return filters
+
+
+def parse_sort(sort):
+    # "-score" ranks descending, "rsi" ascending
+    if not sort:
+        return None, False
+    descending = sort.startswith('-')
+    field = sort.lstrip('+-').lower()
+    if field not in NUMERIC_FIELDS:
+        raise ValueError(f"Cannot sort by {field}")
+    return field, descending
+
+
+def stack_histories(histories, bars=SCREEN_BARS):
+    # Right-aligned (symbols, bars) close and volume arrays of each symbol's latest bars;
+    # symbols with less history are NaN-padded on the left.
+    close = np.full((len(histories), bars), np.nan)
+    volume = np.full((len(histories), bars), np.nan)
+    counts = np.zeros(len(histories), dtype='int64')
+    for i, frame in enumerate(histories):
+        values = frame.values[-bars:]
+        close[i, bars - len(values):] = values[:, 3]
+        volume[i, bars - len(values):] = values[:, 4]
+        counts[i] = len(values)
+    return close, volume, counts
+
+
+def ewm_columns(values, span):
+    # ewm_mean for every row at once, stepping along the dates; rows start at their first
+    # non-NaN bar, like pandas .ewm(span=span).mean() on that symbol alone
+    decay = 1 - 2.0 / (span + 1)
+    out = np.full(values.shape, np.nan)
+    numerator = np.zeros(len(values))
+    denominator = np.zeros(len(values))
+    for t in range(values.shape[1]):
+        column = values[:, t]
+        valid = ~np.isnan(column)
+        numerator = np.where(valid, np.where(valid, column, 0.0) + decay * numerator, numerator)
+        denominator = np.where(valid, 1.0 + decay * denominator, denominator)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            out[:, t] = np.where(valid, numerator / denominator, np.nan)
+    return out
+
+
+def screen_columns(close, volume, counts):
+    # The latest indicators and the signal rules of /technical and analyze_technical_sentiment,
+    # evaluated for every symbol in one pass over the (symbols, bars) arrays
+    with np.errstate(divide='ignore', invalid='ignore'):
+        price = close[:, -1]
+        columns = {
+            'price': price,
+            'change_1d': price / close[:, -2] - 1,
+            'change_5d': price / close[:, -5] - 1,
+            'bars': counts.astype('float64')
+        }
+        for window in SMA_WINDOWS:
+            columns[f"sma_{window}"] = close[:, -window:].mean(axis=1)
+
+        delta = np.diff(close[:, -(RSI_WINDOW + 1):], axis=1)
+        columns['rsi'] = rsi_from_means(np.where(delta > 0, delta, 0.0).mean(axis=1),
+                                        np.where(delta < 0, -delta, 0.0).mean(axis=1))
+        columns['rsi'][np.isnan(delta).any(axis=1)] = np.nan
+
+        macd = ewm_columns(close, MACD_FAST) - ewm_columns(close, MACD_SLOW)
+        signal = ewm_columns(macd, MACD_SIGNAL)
+        columns['macd'] = macd[:, -1]
+        columns['macd_signal'] = signal[:, -1]
+
+        bb_std = close[:, -BB_WINDOW:].std(axis=1, ddof=1)
+        columns['bb_upper'] = columns[f"sma_{BB_WINDOW}"] + bb_std * BB_STD
+        columns['bb_lower'] = columns[f"sma_{BB_WINDOW}"] - bb_std * BB_STD
+
+        volume_sma = volume[:, -VOLUME_WINDOW:].mean(axis=1)
+        columns['volume_ratio'] = volume[:, -5:].mean(axis=1) / volume_sma
+
+    rsi = columns['rsi']
+    sma_20, sma_50 = columns['sma_20'], columns['sma_50']
+    bullish_ma = (price > sma_20) & (sma_20 > sma_50)
+    bearish_ma = (price < sma_20) & (sma_20 < sma_50)
+    above = columns['macd'] > columns['macd_signal']
+    was_above = macd[:, -2] > signal[:, -2]
+
+    columns['rsi_signal'] = np.select([rsi < 30, rsi > 70], ['Oversold', 'Overbought'], 'Neutral')
+    columns['ma_signal'] = np.select([bullish_ma, bearish_ma], ['Bullish', 'Bearish'], 'Neutral')
+    columns['macd_trend'] = np.where(above, 'Bullish', 'Bearish')
+    columns['macd_cross'] = np.select([above & ~was_above, ~above & was_above], ['Bullish', 'Bearish'], 'None')
+    columns['volume_spike'] = columns['volume_ratio'] > 1.5
+
+    # Technical sentiment score with the weights of SentimentAnalyzer.analyze_technical_sentiment
+    score = 0.15 * bullish_ma - 0.15 * bearish_ma + 0.15 * (rsi < 30) - 0.15 * (rsi > 70)
+    score = score + np.where(columns['volume_spike'], np.where(columns['change_5d'] > 0, 0.10, -0.10), 0.0)
+    columns['score'] = np.where(counts >= 50, score, 0.0)
+    return columns
+
+
+class Screener:
+    # Screens a universe of symbols from the price store. The computed columns are kept
+    # until the store hands back a different history for any symbol, so repeated screens
+    # with other filters or rankings only evaluate masks over the cached arrays.
+    def __init__(self, price_store, bars=SCREEN_BARS, period='1y'):
+        self.price_store = price_store
+        self.bars = bars
+        self.period = period
+        self._cached = None
+        self._lock = threading.Lock()
+
+    def universe(self):
+        return self.price_store.symbols()
+
+    @stage('screening')
+    def table(self, symbols):
+        with stage('data_fetch'):
+            histories = self.price_store.refresh_many(symbols, self.period)
+        symbols = [symbol for symbol, history in histories.items() if history is not None and len(history.frame)]
+        histories = [histories[symbol] for symbol in symbols]
+        key = (tuple(symbols), tuple(map(id, histories)))
+
+        with self._lock:
+            if self._cached is not None and self._cached[0] == key:
+                return self._cached[1]
+
+        close, volume, counts = stack_histories([history.frame for history in histories], self.bars)
+        table = {
+            'symbols': np.array(symbols, dtype=object),
+            'last_bar': np.array([history.frame.index[-1].strftime('%Y-%m-%d') for history in histories], dtype=object),
+            'columns': screen_columns(close, volume, counts)
+        }
+        with self._lock:
+            self._cached = (key, table, histories)
+        return table
+
+    def screen(self, symbols=None, filters=None, sort=None, limit=None):
+        requested = [symbol.upper() for symbol in symbols] if symbols else self.universe()
+        filters = parse_filters(filters)
+        sort_field, descending = parse_sort(sort)
+
+        table = self.table(requested)
+        columns = table['columns']
+        mask = np.ones(len(table['symbols']), dtype=bool)
+        for field, operator, value in filters:
+            with np.errstate(invalid='ignore'):
+                mask &= OPERATORS[operator](columns[field], value)
+        matched = np.flatnonzero(mask)
+
+        if sort_field is not None:
+            keys = columns[sort_field][matched]
+            keys = np.where(np.isnan(keys), np.inf, -keys if descending else keys)
+            if limit is not None and limit < len(matched):
+                # Top-k without sorting every match
+                top = np.argpartition(keys, limit - 1)[:limit]
+                matched = matched[top[np.argsort(keys[top], kind='stable')]]
+            else:
+                matched = matched[np.argsort(keys, kind='stable')]
+        elif limit is not None:
+            matched = matched[:limit]
+
+        return {
+            'universe': len(requested),
+            'screened': len(table['symbols']),
+            'matched': int(mask.sum()),
+            'results': [self.row(table, i) for i in matched]
+        }
+
+    def row(self, table, i):
+        columns = table['columns']
+
+        def number(field, digits=2):
+            value = columns[field][i]
+            return None if np.isnan(value) else round(float(value), digits)
+
+        return {
+            'symbol': table['symbols'][i],
+            'lastBar': table['last_bar'][i],
+            'price': number('price'),
+            'change_1d': number('change_1d', 4),
+            'change_5d': number('change_5d', 4),
+            'rsi': number('rsi'),
+            'sma_20': number('sma_20'),
+            'sma_50': number('sma_50'),
+            'sma_200': number('sma_200'),
+            'macd': number('macd', 4),
+            'macd_signal': number('macd_signal', 4),
+            'bb_upper': number('bb_upper'),
+            'bb_lower': number('bb_lower'),
+            'volume_ratio': number('volume_ratio'),
+            'volume_spike': bool(columns['volume_spike'][i]),
+            'rsi_signal': str(columns['rsi_signal'][i]),
+            'ma_signal': str(columns['ma_signal'][i]),
+            'macd_trend': str(columns['macd_trend'][i]),
+            'macd_cross': str(columns['macd_cross'][i]),
+            'score': round(float(columns['score'][i]), 3),
+            'bars': int(columns['bars'][i])
+        }
@@ -1,21 +1,31 @@
+import os
+import time
 import numpy as np
+from concurrent.futures import TimeoutError as FutureTimeout
 import pandas as pd
 from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
-from textblob import TextBlob
-import yfinance as yf
 from datetime import datetime, timedelta
+from market_data.fundamentals_cache import FundamentalsCache
+from .indicators import IndicatorEngine
+from .text_sentiment import NewsSentiment, HeadlineScorer
+from monitoring.metrics import stage
 import warnings
 warnings.filterwarnings('ignore')
 
 class SentimentAnalyzer:
-    def __init__(self):
+    def __init__(self, fundamentals_cache=None, indicator_engine=None, news_sentiment=None):
         self.vader = SentimentIntensityAnalyzer()
+        self.fundamentals_cache = fundamentals_cache or FundamentalsCache()
+        self.indicator_engine = indicator_engine or IndicatorEngine()
+        # Headline sentiment blended in with NEWS_WEIGHT; TEXT_SENTIMENT=false leaves it out
+        self.news_sentiment = news_sentiment
+        if news_sentiment is None and os.environ.get('TEXT_SENTIMENT', 'true').lower() == 'true':
+            self.news_sentiment = NewsSentiment(scorer=HeadlineScorer(vader=self.vader))
+        self.news_weight = float(os.environ.get('NEWS_WEIGHT', 0.3))
 
     def get_stock_info(self, symbol):
         try:
-            stock = yf.Ticker(symbol)
-            info = stock.info
-            return info
+            return self.fundamentals_cache.get(symbol)
         except Exception as e:
             print(f"Error fetching stock info: {e}")
             return {}
@@ -81,7 +91,7 @@ class SentimentAnalyzer:
 
         return sentiment_score, factors
 
-    def analyze_technical_sentiment(self, data):
+    def analyze_technical_sentiment(self, data, symbol=None):
         sentiment_score = 0
         factors = []
 
@@ -90,9 +100,10 @@ class SentimentAnalyzer:
                 return 0, ['Insufficient data for technical analysis']
 
             current_price = data['Close'].iloc[-1]
+            indicators = self.indicator_engine.latest(data, symbol)
 
-            sma_20 = data['Close'].rolling(window=20).mean().iloc[-1]
-            sma_50 = data['Close'].rolling(window=50).mean().iloc[-1]
+            sma_20 = indicators.get('SMA_20', np.nan)
+            sma_50 = indicators.get('SMA_50', np.nan)
 
             if current_price > sma_20 > sma_50:
                 sentiment_score += 0.15
@@ -101,12 +112,7 @@ class SentimentAnalyzer:
                 sentiment_score -= 0.15
                 factors.append('Price below short and medium-term moving averages')
 
-            delta = data['Close'].diff()
-            gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-            loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-            rs = gain / loss
-            rsi = 100 - (100 / (1 + rs))
-            current_rsi = rsi.iloc[-1]
+            current_rsi = indicators.get('RSI', np.nan)
 
             if current_rsi < 30:
                 sentiment_score += 0.15
@@ -115,9 +121,9 @@ class SentimentAnalyzer:
                 sentiment_score -= 0.15
                 factors.append('RSI indicates overbought conditions (potential correction)')
 
-            volume_sma = data['Volume'].rolling(window=20).mean()
+            volume_sma = indicators.get('Volume_SMA_20', np.nan)
             recent_volume = data['Volume'].iloc[-5:].mean()
-            if recent_volume > volume_sma.iloc[-1] * 1.5:
+            if recent_volume > volume_sma * 1.5:
                 price_change = (data['Close'].iloc[-1] - data['Close'].iloc[-5]) / data['Close'].iloc[-5]
                 if price_change > 0:
                     sentiment_score += 0.10
@@ -132,18 +138,25 @@ class SentimentAnalyzer:
 
         return sentiment_score, factors
 
-    def analyze_market_sentiment(self, symbol, data):
-        sentiment_score = 0
-        all_factors = []
+    def analyze_news_sentiment(self, symbol):
+        if self.news_sentiment is None:
+            return 0, []
 
-        fundamental_score, fundamental_factors = self.analyze_company_metrics(symbol)
-        sentiment_score += fundamental_score
-        all_factors.extend(fundamental_factors)
+        result = self.news_sentiment.analyze(symbol)
+        if not result['articles']:
+            return 0, []
 
-        technical_score, technical_factors = self.analyze_technical_sentiment(data)
-        sentiment_score += technical_score
-        all_factors.extend(technical_factors)
+        score = result['score']
+        if score > 0.05:
+            tone = 'positive'
+        elif score < -0.05:
+            tone = 'negative'
+        else:
+            tone = 'neutral'
+        factors = [f"Recent news headlines are {tone} ({result['articles']} articles, score {score:+.2f})"]
+        return score * self.news_weight, factors
 
+    def summarize(self, sentiment_score, factors, partial=False):
         normalized_score = max(-1, min(1, sentiment_score))
 
         if normalized_score > 0.2:
@@ -159,12 +172,62 @@ class SentimentAnalyzer:
 
         confidence = min(95, max(60, 70 + abs(normalized_score) * 30))
 
-        return {
+        result = {
             'score': normalized_score,
             'sentiment': overall_sentiment,
             'confidence': confidence,
-            'factors': all_factors
+            'factors': factors
         }
+        if partial:
+            result['partial'] = True
+        return result
+
+    @stage('sentiment')
+    def analyze_market_sentiment(self, symbol, data):
+        fundamental_score, fundamental_factors = self.analyze_company_metrics(symbol)
+        technical_score, technical_factors = self.analyze_technical_sentiment(data, symbol)
+        try:
+            news_score, news_factors = self.analyze_news_sentiment(symbol)
+        except Exception as e:
+            print(f"Error in news sentiment: {e}")
+            news_score, news_factors = 0, []
+        return self.summarize(fundamental_score + technical_score + news_score,
+                              fundamental_factors + technical_factors + news_factors)
+
+    def stream_market_sentiment(self, symbol, data, executor, timeout):
+        # Yields (event, payload) as each part is ready: the local technical score first,
+        # then the fundamentals and the news headlines from `executor` if they arrive within
+        # `timeout` seconds, then the blended result, marked partial when a part did not make it.
+        # A late fetch keeps running and fills its cache for the next request.
+        deadline = time.monotonic() + timeout
+        remote = [('fundamentals', executor.submit(self.analyze_company_metrics, symbol))]
+        if self.news_sentiment is not None:
+            remote.append(('news', executor.submit(self.analyze_news_sentiment, symbol)))
+
+        with stage('sentiment'):
+            technical_score, technical_factors = self.analyze_technical_sentiment(data, symbol)
+        yield 'technical', {'score': technical_score, 'factors': technical_factors}
+
+        parts = {'technical': (technical_score, technical_factors)}
+        unavailable = []
+        for name, future in remote:
+            try:
+                parts[name] = future.result(timeout=max(deadline - time.monotonic(), 0))
+            except FutureTimeout:
+                status = 'timeout'
+            except Exception as e:
+                print(f"Error in {name} sentiment: {e}")
+                status = 'error'
+            else:
+                yield name, {'status': 'ok', 'score': parts[name][0], 'factors': parts[name][1]}
+                continue
+            yield name, {'status': status, 'timeoutSeconds': timeout}
+            unavailable.append(f"{name.capitalize()} unavailable ({status})")
+
+        ordered = [parts[name] for name in ('fundamentals', 'technical', 'news') if name in parts]
+        yield 'sentiment', self.summarize(sum(score for score, _ in ordered),
+                                          [factor for _, factors in ordered for factor in factors] + unavailable,
+                                          partial=bool(unavailable))
 
     def get_sentiment_adjustment(self, sentiment_score):
         return sentiment_score * 0.05
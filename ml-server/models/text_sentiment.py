@@ -0,0 +1,287 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import contextvars
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from market_data.client import get_client
+from monitoring.metrics import stage
+
+_vader = None
+
+
+def _worker_vader():
+    # One analyzer per pool process, built on first use
+    global _vader
+    if _vader is None:
+        from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+        _vader = SentimentIntensityAnalyzer()
+    return _vader
+
+
+def score_texts(texts, textblob=False, vader=None):
+    # VADER compound score in [-1, 1]; with textblob, averaged with TextBlob's polarity
+    vader = vader or _worker_vader()
+    if textblob:
+        # Only imported when enabled: TextBlob and its corpora are slow to load
+        from textblob import TextBlob
+    scores = []
+    for text in texts:
+        score = vader.polarity_scores(text)['compound']
+        if textblob:
+            score = (score + TextBlob(text).sentiment.polarity) / 2
+        scores.append(score)
+    return scores
+
+
+def headline_key(text):
+    # VADER reads case and punctuation, so only whitespace is normalized away
+    return hashlib.blake2b(' '.join(text.split()).encode('utf-8'), digest_size=16).digest()
+
+
+class HeadlineScorer:
+    # Scores headlines in batches. Identical headlines, e.g. one story tagged with several
+    # tickers, are scored once and memoized by content hash. Batches with many unseen
+    # headlines are split into chunks across a process pool; small ones are scored in-process.
+    def __init__(self, vader=None, workers=None, chunk_size=None, min_pool_batch=None, memo_size=None, textblob=None):
+        self.vader = vader
+        self.workers = workers if workers is not None else int(os.environ.get('TEXT_SENTIMENT_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
+        self.chunk_size = chunk_size or int(os.environ.get('TEXT_SENTIMENT_CHUNK', 1000))
+        self.min_pool_batch = min_pool_batch if min_pool_batch is not None else int(os.environ.get('TEXT_SENTIMENT_MIN_POOL_BATCH', 2000))
+        self.memo_size = memo_size or int(os.environ.get('TEXT_SENTIMENT_MEMO_SIZE', 100000))
+        self.textblob = textblob if textblob is not None else os.environ.get('TEXT_SENTIMENT_TEXTBLOB', 'false').lower() == 'true'
+        self._memo = OrderedDict()
+        self._counters = {'scored': 0, 'memo_hits': 0, 'pool_batches': 0}
+        self._pool = None
+        self._lock = threading.Lock()
+
+    @property
+    def pool(self):
+        # Created on first use, so gunicorn workers start their own after the fork. Spawned
+        # processes do not inherit the server's threads or loaded models.
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+            return self._pool
+
+    @stage('text_sentiment')
+    def score(self, texts):
+        keys = [headline_key(text) for text in texts]
+        scores = np.empty(len(texts))
+        missing = {}
+        with self._lock:
+            for i, key in enumerate(keys):
+                score = self._memo.get(key)
+                if score is None:
+                    missing.setdefault(key, []).append(i)
+                else:
+                    self._memo.move_to_end(key)
+                    scores[i] = score
+            self._counters['memo_hits'] += len(texts) - sum(len(rows) for rows in missing.values())
+
+        if missing:
+            new_keys = list(missing)
+            new_scores = self._score_unseen([texts[missing[key][0]] for key in new_keys])
+            with self._lock:
+                for key, score in zip(new_keys, new_scores):
+                    scores[missing[key]] = score
+                    self._memo[key] = score
+                while len(self._memo) > self.memo_size:
+                    self._memo.popitem(last=False)
+                self._counters['scored'] += len(new_keys)
+        return scores
+
+    def _score_unseen(self, texts):
+        if self.workers > 1 and len(texts) >= self.min_pool_batch:
+            chunks = [texts[i:i + self.chunk_size] for i in range(0, len(texts), self.chunk_size)]
+            try:
+                results = list(self.pool.map(score_texts, chunks, [self.textblob] * len(chunks)))
+                with self._lock:
+                    self._counters['pool_batches'] += 1
+                return [score for chunk in results for score in chunk]
+            except Exception as e:
+                print(f"Headline scoring pool error, scoring in-process: {e}")
+        return score_texts(texts, self.textblob, self.vader)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['memo_size'] = len(self._memo)
+        return stats
+
+
+def parse_published(value):
+    if value is None or value == '':
+        return None
+    try:
+        published = pd.Timestamp(value, unit='s') if isinstance(value, (int, float)) else pd.Timestamp(value)
+    except (ValueError, TypeError):
+        return None
+    return published.tz_convert('UTC').tz_localize(None) if published.tz is not None else published
+
+
+def normalize_news(items):
+    # Headlines as [{'title', 'published' (UTC), 'publisher', 'link'}]. yfinance has returned
+    # flat items and items wrapped in 'content'; files use the flat shape.
+    headlines = []
+    for item in items or []:
+        content = item.get('content') if isinstance(item.get('content'), dict) else item
+        title = (content.get('title') or '').strip()
+        if not title:
+            continue
+        provider = content.get('provider') if isinstance(content.get('provider'), dict) else {}
+        url = content.get('canonicalUrl') if isinstance(content.get('canonicalUrl'), dict) else {}
+        headlines.append({
+            'title': title,
+            'published': parse_published(content.get('pubDate') or content.get('providerPublishTime') or content.get('published')),
+            'publisher': content.get('publisher') or provider.get('displayName'),
+            'link': content.get('link') or url.get('url')
+        })
+    return headlines
+
+
+class YahooNewsSource:
+    def __init__(self, client=None):
+        self.client = client
+
+    def fetch(self, symbol):
+        # Through the shared market data client: rate limited, retried and coalesced
+        return normalize_news((self.client or get_client()).news(symbol))
+
+
+class FileNewsSource:
+    # Local headline feed: a directory of <SYMBOL>.json / <SYMBOL>.jsonl files, or one
+    # JSON-lines file whose items name their ticker(s) in 'symbol' or 'symbols'.
+    # Files are re-read when they change, so a process appending to them feeds the server.
+    def __init__(self, path):
+        self.path = path
+        self._loaded = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _read(path):
+        with open(path) as f:
+            if path.endswith('.jsonl'):
+                return [json.loads(line) for line in f if line.strip()]
+            return json.load(f)
+
+    def _items(self, path):
+        mtime = os.path.getmtime(path)
+        with self._lock:
+            loaded = self._loaded.get(path)
+            if loaded is not None and loaded[0] == mtime:
+                return loaded[1]
+        items = self._read(path)
+        if not os.path.isdir(self.path):
+            by_symbol = {}
+            for item in items:
+                symbols = item.get('symbols') or [item.get('symbol')]
+                for symbol in symbols:
+                    if symbol:
+                        by_symbol.setdefault(symbol.upper(), []).append(item)
+            items = by_symbol
+        with self._lock:
+            self._loaded[path] = (mtime, items)
+        return items
+
+    def fetch(self, symbol):
+        symbol = symbol.upper()
+        if not os.path.isdir(self.path):
+            return normalize_news(self._items(self.path).get(symbol, []))
+        for name in (f"{symbol}.jsonl", f"{symbol}.json"):
+            path = os.path.join(self.path, name)
+            if os.path.exists(path):
+                return normalize_news(self._items(path))
+        return []
+
+
+def make_news_source(spec=None):
+    # NEWS_SOURCE: "yahoo" (default), or the path of a headline file or directory
+    # An empty NEWS_SOURCE= counts as unset
+    spec = spec or os.environ.get('NEWS_SOURCE') or 'yahoo'
+    return YahooNewsSource() if spec == 'yahoo' else FileNewsSource(spec)
+
+
+class NewsSentiment:
+    # Per-symbol headline sentiment: recent headlines scored by the HeadlineScorer and
+    # averaged with weights that halve every `half_life_hours`, so today's news outweighs
+    # last week's. Headlines and results are kept for `ttl_seconds` per symbol.
+    def __init__(self, source=None, scorer=None, half_life_hours=None, max_age_days=None, ttl_seconds=None, max_symbols=1000):
+        self.source = source or make_news_source()
+        self.scorer = scorer or HeadlineScorer()
+        self.half_life_hours = half_life_hours or float(os.environ.get('NEWS_HALF_LIFE_HOURS', 24))
+        self.max_age_days = max_age_days or float(os.environ.get('NEWS_MAX_AGE_DAYS', 7))
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else int(os.environ.get('NEWS_TTL_SECONDS', 900))
+        self.max_symbols = max_symbols
+        # Headlines of several symbols are fetched in parallel, up to the client's concurrency
+        self.fetch_workers = int(os.environ.get('MARKET_DATA_MAX_CONCURRENCY', 4))
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def headlines(self, symbol):
+        with stage('news_fetch'):
+            items = self.source.fetch(symbol)
+        cutoff = pd.Timestamp.now(tz='UTC').tz_localize(None) - pd.Timedelta(days=self.max_age_days)
+        # Undated headlines count as current
+        return [item for item in items if item['published'] is None or item['published'] >= cutoff]
+
+    def aggregate(self, items, scores, now=None):
+        if not items:
+            return {'score': 0.0, 'articles': 0}
+        now = now if now is not None else pd.Timestamp.now(tz='UTC').tz_localize(None)
+        ages = np.array([max((now - item['published']).total_seconds() / 3600, 0.0) if item['published'] is not None else 0.0
+                         for item in items])
+        weights = 0.5 ** (ages / self.half_life_hours)
+        scores = np.asarray(scores, dtype='float64')
+        order = np.argsort(scores)
+        latest = max((item['published'] for item in items if item['published'] is not None), default=None)
+        return {
+            'score': float(np.sum(weights * scores) / np.sum(weights)),
+            'articles': len(items),
+            'latest': latest.isoformat() if latest is not None else None,
+            'most_negative': items[order[0]]['title'] if scores[order[0]] < 0 else None,
+            'most_positive': items[order[-1]]['title'] if scores[order[-1]] > 0 else None
+        }
+
+    def analyze_many(self, symbols):
+        # {symbol: aggregate}; the headlines of every symbol not cached go through one scoring batch
+        symbols = list(dict.fromkeys(symbol.upper() for symbol in symbols))
+        results, fetched = {}, {}
+        now = time.time()
+        with self._lock:
+            for symbol in symbols:
+                cached = self._results.get(symbol)
+                if cached is not None and now - cached[0] < self.ttl_seconds:
+                    results[symbol] = cached[1]
+
+        missing = [symbol for symbol in symbols if symbol not in results]
+        with ThreadPoolExecutor(max_workers=max(1, min(self.fetch_workers, len(missing)))) as pool:
+            futures = [(symbol, pool.submit(contextvars.copy_context().run, self.headlines, symbol)) for symbol in missing]
+            for symbol, future in futures:
+                try:
+                    fetched[symbol] = future.result()
+                except Exception as e:
+                    print(f"Error fetching news for {symbol}: {e}")
+                    results[symbol] = {'score': 0.0, 'articles': 0, 'error': str(e)}
+
+        texts = [item['title'] for items in fetched.values() for item in items]
+        scores = self.scorer.score(texts) if texts else []
+        offset = 0
+        for symbol, items in fetched.items():
+            result = self.aggregate(items, scores[offset:offset + len(items)])
+            offset += len(items)
+            with self._lock:
+                self._results[symbol] = (now, result)
+                self._results.move_to_end(symbol)
+                while len(self._results) > self.max_symbols:
+                    self._results.popitem(last=False)
+            results[symbol] = result
+        return results
+
+    def analyze(self, symbol):
+        return self.analyze_many([symbol])[symbol.upper()]
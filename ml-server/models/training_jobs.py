@@ -0,0 +1,293 @@
+import os
+import re
+import json
+import time
+import uuid
+import socket
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+
+TRAINING_QUEUE_FULL = 'Training queue is full'
+
+JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class TrainingJob:
+    def __init__(self, symbol, key, epochs):
+        self.id = uuid.uuid4().hex
+        self.symbol = symbol
+        self.key = key
+        self.status = 'queued'
+        self.created_at = datetime.now()
+        self.started_at = None
+        self.finished_at = None
+        self.epoch = 0
+        self.epochs = epochs
+        self.loss = None
+        self.val_loss = None
+        self.best_val_loss = None
+        self.model_version = None
+        self.error = None
+
+    @property
+    def active(self):
+        return self.status in ('queued', 'running')
+
+    def to_dict(self):
+        return {
+            'jobId': self.id,
+            'symbol': self.symbol,
+            'status': self.status,
+            'progress': {
+                'epoch': self.epoch,
+                'epochs': self.epochs,
+                'loss': self.loss,
+                'valLoss': self.val_loss,
+                'bestValLoss': self.best_val_loss
+            },
+            'modelVersion': self.model_version,
+            'error': self.error,
+            'createdAt': self.created_at.isoformat(),
+            'startedAt': self.started_at.isoformat() if self.started_at else None,
+            'finishedAt': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+    @classmethod
+    def from_dict(cls, record):
+        # A job as saved by another worker; only its status can be read from here
+        job = cls(record['symbol'], None, record['progress']['epochs'])
+        job.id = record['jobId']
+        job.status = record['status']
+        progress = record['progress']
+        job.epoch, job.loss, job.val_loss, job.best_val_loss = (
+            progress['epoch'], progress['loss'], progress['valLoss'], progress['bestValLoss'])
+        job.model_version = record['modelVersion']
+        job.error = record['error']
+        job.created_at = datetime.fromisoformat(record['createdAt'])
+        job.started_at = datetime.fromisoformat(record['startedAt']) if record['startedAt'] else None
+        job.finished_at = datetime.fromisoformat(record['finishedAt']) if record['finishedAt'] else None
+        return job
+
+
+class JobStore:
+    # Job records shared by the gunicorn workers: one JSON file per job under
+    # MODEL_DIR/__jobs__, so a job id from any worker can be polled on every other one.
+    # A claim file per symbol and model config keeps two workers from training the same model.
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.host = socket.gethostname()
+
+    def _job_path(self, job_id):
+        return os.path.join(self.root, f"{job_id}.json")
+
+    def _claim_path(self, key):
+        digest = hashlib.blake2b(repr(key).encode('utf-8'), digest_size=12).hexdigest()
+        return os.path.join(self.root, f"claim-{digest}")
+
+    @staticmethod
+    def _write(path, data):
+        # Written aside and renamed, so readers in other workers never see half a file
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def save(self, job):
+        self._write(self._job_path(job.id), job.to_dict())
+
+    def delete(self, job):
+        try:
+            os.remove(self._job_path(job.id))
+        except FileNotFoundError:
+            pass
+
+    def load(self, job_id):
+        if not JOB_ID_PATTERN.match(job_id):
+            return None
+        record = self._read(self._job_path(job_id))
+        return TrainingJob.from_dict(record) if record is not None else None
+
+    def claim(self, key, job):
+        # Returns None once `job` owns `key`, or the active job of the worker that does
+        path = self._claim_path(key)
+        owner = {'jobId': job.id, 'pid': os.getpid(), 'host': self.host}
+        for _ in range(2):
+            try:
+                with open(path, 'x') as f:
+                    json.dump(owner, f)
+                return None
+            except FileExistsError:
+                pass
+            current = self._read(path)
+            other = self.load(current['jobId']) if current else None
+            if other is not None and other.active and self._alive(current):
+                return other
+            # Left behind by a finished job or a worker that died: take it over
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        return None
+
+    def release(self, key, job):
+        path = self._claim_path(key)
+        current = self._read(path)
+        if current and current['jobId'] == job.id:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _alive(self, owner):
+        if owner['host'] != self.host:
+            return True
+        try:
+            os.kill(owner['pid'], 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def active(self):
+        # Queued and running jobs of every worker
+        jobs = []
+        for name in os.listdir(self.root):
+            if name.startswith('claim-') and not name.endswith('.tmp'):
+                owner = self._read(os.path.join(self.root, name))
+                job = self.load(owner['jobId']) if owner else None
+                if job is not None and job.active and self._alive(owner):
+                    jobs.append(job)
+        return jobs
+
+    def prune(self, retention_seconds):
+        cutoff = time.time() - retention_seconds
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.endswith('.json') and JOB_ID_PATTERN.match(name[:-len('.json')]):
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        job = self.load(name[:-len('.json')])
+                        if job is None or not job.active:
+                            os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+
+def make_progress_callback(job, on_update=None):
+    from keras.callbacks import Callback
+
+    class JobProgressCallback(Callback):
+        def on_epoch_end(self, epoch, logs=None):
+            logs = logs or {}
+            job.epoch = epoch + 1
+            job.loss = float(logs['loss']) if 'loss' in logs else None
+            if 'val_loss' in logs:
+                job.val_loss = float(logs['val_loss'])
+                if job.best_val_loss is None or job.val_loss < job.best_val_loss:
+                    job.best_val_loss = job.val_loss
+            if on_update is not None:
+                on_update(job)
+
+    return JobProgressCallback()
+
+
+class TrainingJobQueue:
+    # Training queue: a bounded pool runs registry.get_or_train in the background while
+    # /predict returns a job id the client can poll. Jobs run in the worker that queued
+    # them; their records live in the shared JobStore, so any worker can report them.
+    def __init__(self, registry, max_concurrent=None, max_queued=None, retention_seconds=None, store=None):
+        self.registry = registry
+        self.max_concurrent = max_concurrent or int(os.environ.get('TRAINING_MAX_CONCURRENT', 1))
+        self.max_queued = max_queued if max_queued is not None else int(os.environ.get('TRAINING_QUEUE_DEPTH', 16))
+        self.retention_seconds = retention_seconds if retention_seconds is not None else int(os.environ.get('JOB_RETENTION_SECONDS', 3600))
+        self.store = store or JobStore(os.path.join(registry.root, '__jobs__'))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrent, thread_name_prefix='training')
+        self._jobs = {}
+        self._active = {}
+        self._lock = threading.Lock()
+
+    def _prune(self):
+        cutoff = time.time() - self.retention_seconds
+        for job_id, job in list(self._jobs.items()):
+            if not job.active and job.finished_at and job.finished_at.timestamp() < cutoff:
+                del self._jobs[job_id]
+        self.store.prune(self.retention_seconds)
+
+    def submit(self, symbol, data, predictor):
+        key = (symbol.upper(), predictor.lookback, tuple(predictor.features), predictor.variant)
+
+        with self._lock:
+            self._prune()
+            job = self._active.get(key)
+            if job is not None:
+                # Same symbol and model config already queued or training
+                return job
+
+            queued = sum(1 for j in self.store.active() if j.status == 'queued')
+            if queued >= self.max_queued:
+                raise QueueFullError(f"{TRAINING_QUEUE_FULL} ({self.max_queued} jobs waiting)")
+
+            job = TrainingJob(symbol.upper(), key, predictor.epochs)
+            self.store.save(job)
+            other = self.store.claim(key, job)
+            if other is not None:
+                # Another worker is already training this model
+                self.store.delete(job)
+                return other
+            self._jobs[job.id] = job
+            self._active[key] = job
+
+        print(f"Queued training job {job.id} for {symbol}")
+        self._executor.submit(self._run, job, data, predictor)
+        return job
+
+    def _run(self, job, data, predictor):
+        job.status = 'running'
+        job.started_at = datetime.now()
+        self.store.save(job)
+        try:
+            callback = make_progress_callback(job, on_update=self.store.save)
+            trained = self.registry.get_or_train(job.symbol, data, predictor, callbacks=[callback])
+            job.model_version = trained.version
+            job.status = 'completed'
+        except Exception as e:
+            print(f"Training job {job.id} for {job.symbol} failed: {e}")
+            job.error = str(e)
+            job.status = 'failed'
+        finally:
+            job.finished_at = datetime.now()
+            self.store.save(job)
+            self.store.release(job.key, job)
+            with self._lock:
+                self._active.pop(job.key, None)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        return job if job is not None else self.store.load(job_id)
+
+    def stats(self):
+        active = self.store.active()
+        return {
+            'queued': sum(1 for j in active if j.status == 'queued'),
+            'running': sum(1 for j in active if j.status == 'running'),
+            'maxConcurrent': self.max_concurrent,
+            'maxQueued': self.max_queued
+        }
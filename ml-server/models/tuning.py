@@ -0,0 +1,236 @@
+import os
+import json
+import time
+import random
+import shutil
+import tempfile
+import numpy as np
+from datetime import datetime
+from .windowing import window_views
+
+TUNED_CONFIG_FILE = 'tuned_config.json'
+
+SEARCH_SPACE = {
+    'lookback': [30, 60, 90],
+    'units': [(32,), (64, 32), (128, 64, 32)],
+    'batch_size': [32, 64, 128],
+    'epochs': [10, 25, 50]
+}
+
+# Minimized together; a trial is on the Pareto front when no other trial beats it on all three
+OBJECTIVES = ('val_loss', 'train_seconds', 'latency_ms')
+
+
+def sample_configs(space, trials, seed=0):
+    # Random search over the grid without repeats; the whole grid if it is smaller than `trials`
+    grid = [{'lookback': lookback, 'units': tuple(units), 'batch_size': batch_size, 'epochs': epochs}
+            for lookback in space['lookback'] for units in space['units']
+            for batch_size in space['batch_size'] for epochs in space['epochs']]
+    random.Random(seed).shuffle(grid)
+    return grid[:trials]
+
+
+def validation_windows(length, max_lookback, horizon, share=0.2):
+    # Validation windows per symbol, sized from the longest lookback of the search. Every
+    # lookback has at least this many windows, and its last ones target the same final bars.
+    return int(share * (length - max_lookback - horizon + 1))
+
+
+def shared_validation_split(predictor, data, max_lookback):
+    # Like prepare_data, but the validation windows target the same bars whatever the lookback,
+    # so val_loss is comparable across trials and between them in the pruner
+    _, _, _, _, scaled = predictor.prepare_data(data)
+    X, y = window_views(scaled, predictor.lookback, predictor.horizon, target_col=3)
+    split = len(X) - validation_windows(len(data), max_lookback, predictor.horizon)
+    # Training windows stop before their targets reach the validation bars
+    train_end = split - (predictor.horizon - 1)
+    first_target = data.index[split + predictor.lookback].strftime('%Y-%m-%d')
+    return X[:train_end], X[split:], y[:train_end], y[split:], first_target
+
+
+class MedianPruner:
+    # Shared between trial processes through a multiprocessing Manager. A trial is stopped
+    # when its best val_loss so far on a symbol is worse than the median of the other trials
+    # at the same symbol and epoch, once at least `min_trials` others have got that far.
+    # Trials validate on the same target bars (see shared_validation_split), so the values compare.
+    def __init__(self, shared, lock, warmup_epochs=3, min_trials=3):
+        self.shared = shared
+        self.lock = lock
+        self.warmup_epochs = warmup_epochs
+        self.min_trials = min_trials
+
+    def report(self, trial_id, symbol, epoch, value):
+        key = f"{symbol}:{epoch}"
+        with self.lock:
+            values = dict(self.shared.get(key, {}))
+            values[trial_id] = value
+            self.shared[key] = values
+
+        others = [v for t, v in values.items() if t != trial_id]
+        if epoch + 1 < self.warmup_epochs or len(others) < self.min_trials:
+            return False
+        return value > float(np.median(others))
+
+
+def pruning_callback(pruner, trial_id, symbol):
+    # Keras is imported lazily like the rest of training
+    from keras.callbacks import Callback
+
+    class PruneOnMedian(Callback):
+        def __init__(self):
+            super().__init__()
+            self.best = float('inf')
+            self.pruned_at = None
+
+        def on_epoch_end(self, epoch, logs=None):
+            val_loss = (logs or {}).get('val_loss')
+            if val_loss is None:
+                return
+            self.best = min(self.best, float(val_loss))
+            if pruner.report(trial_id, symbol, epoch, self.best):
+                self.pruned_at = epoch + 1
+                self.model.stop_training = True
+
+    return PruneOnMedian()
+
+
+def directional_accuracy(model, X, y):
+    # Share of validation windows where the next close moves the way the model said
+    X = np.ascontiguousarray(X)
+    last = X[:, -1, 3]
+    target = np.asarray(y).reshape(len(X), -1)[:, 0]
+    predicted = model.predict(X, verbose=0)[:, 0]
+    moved = target != last
+    if not moved.any():
+        return None
+    return float(np.mean(np.sign(predicted - last)[moved] == np.sign(target - last)[moved]))
+
+
+def inference_latency(model, repeats=20):
+    # Median milliseconds for one window through the NumPy runtime that serves predictions
+    from .inference import export_inference_artifact, load_inference_artifact
+
+    path = tempfile.mkdtemp(prefix='intellistock-tune-')
+    try:
+        export_inference_artifact(model, path)
+        runtime = load_inference_artifact(path)
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+    window = np.zeros((1, *runtime.input_shape[1:]), dtype='float32')
+    runtime.predict(window)
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        runtime.predict(window)
+        timings.append((time.perf_counter() - started) * 1000)
+    return float(np.median(timings))
+
+
+def run_trial(trial_id, config, options, pruner):
+    # Trains the config on every tuning symbol of the price panel in turn. The score is the
+    # mean of the per-symbol best val_loss, so trials are compared on the same symbols and splits:
+    # symbols are kept or skipped by the longest lookback of the search, not the trial's own.
+    from .lstm_model import LSTMStockPredictor
+    from market_data.panel import PricePanel
+
+    result = dict(config, trial=trial_id, units=list(config['units']), status='ok')
+    started = time.time()
+    losses, accuracies, epochs_run = [], [], 0
+    max_lookback = options.get('max_lookback', config['lookback'])
+    result['validation_from'] = {}
+
+    try:
+        panel = PricePanel.load(options['panel'])
+        for symbol in options['symbols']:
+            if symbol not in panel:
+                continue
+            data = panel.frame(symbol)
+            predictor = LSTMStockPredictor(config['lookback'], config['epochs'], config['batch_size'],
+                                           forecast_mode=options['forecast_mode'], units=config['units'])
+            if len(data) < max_lookback + predictor.horizon + 50:
+                continue
+            X_train, X_test, y_train, y_test, first_target = shared_validation_split(predictor, data, max_lookback)
+            result['validation_from'][symbol] = first_target
+            callback = pruning_callback(pruner, trial_id, symbol)
+            history = predictor.train(X_train, y_train, X_test, y_test, callbacks=[callback])
+            epochs_run += len(history.history.get('loss', []))
+
+            if callback.pruned_at is not None:
+                result.update({'status': 'pruned', 'pruned_on': symbol, 'pruned_at_epoch': callback.pruned_at})
+                break
+
+            losses.append(min(history.history['val_loss']))
+            accuracies.append(directional_accuracy(predictor.model, X_test, y_test))
+
+        if result['status'] == 'ok':
+            if not losses:
+                raise ValueError('No tuning symbol has enough history for the longest lookback')
+            scored = [a for a in accuracies if a is not None]
+            result.update({
+                'val_loss': float(np.mean(losses)),
+                'directional_accuracy': float(np.mean(scored)) if scored else None,
+                'latency_ms': round(inference_latency(predictor.model), 3),
+                'params': int(predictor.model.count_params())
+            })
+    except Exception as e:
+        result.update({'status': 'error', 'reason': str(e)})
+    finally:
+        result['train_seconds'] = round(time.time() - started, 2)
+        result['epochs_run'] = epochs_run
+
+    return result
+
+
+def pareto_front(trials, objectives=OBJECTIVES):
+    completed = [t for t in trials if t['status'] == 'ok']
+
+    def dominates(a, b):
+        return (all(a[o] <= b[o] for o in objectives)
+                and any(a[o] < b[o] for o in objectives))
+
+    return [t for t in completed if not any(dominates(other, t) for other in completed if other is not t)]
+
+
+def choose_config(front, max_loss_increase=0.05):
+    # Cheapest to serve, then to train, among front configs whose val_loss is within
+    # `max_loss_increase` of the best one
+    if not front:
+        return None
+    best_loss = min(t['val_loss'] for t in front)
+    candidates = [t for t in front if t['val_loss'] <= best_loss * (1 + max_loss_increase)]
+    return min(candidates, key=lambda t: (t['latency_ms'], t['train_seconds']))
+
+
+def save_tuned_config(root, trial, **details):
+    config = {
+        'lookback': trial['lookback'],
+        'units': list(trial['units']),
+        'batch_size': trial['batch_size'],
+        'epochs': trial['epochs'],
+        'val_loss': trial['val_loss'],
+        'directional_accuracy': trial.get('directional_accuracy'),
+        'latency_ms': trial['latency_ms'],
+        'train_seconds': trial['train_seconds'],
+        'tuned_at': datetime.now().isoformat()
+    }
+    config.update(details)
+    path = os.path.join(root, TUNED_CONFIG_FILE)
+    with open(f"{path}.tmp", 'w') as f:
+        json.dump(config, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+    return path
+
+
+def load_tuned_config(root):
+    path = os.path.join(root, TUNED_CONFIG_FILE)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            config = json.load(f)
+        config['units'] = tuple(config['units'])
+        return config
+    except Exception as e:
+        print(f"Error reading tuned config {path}: {e}")
+        return None
@@ -0,0 +1,78 @@
+import math
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def window_views(series, lookback, horizon=1, target_col=3):
+    # Training windows as strided views over one (time, features) array: X[i] is
+    # series[i:i + lookback] and y[i] the next `horizon` target values. Nothing is
+    # copied, so memory stays at the size of the series instead of ~lookback times it.
+    series = np.asarray(series)
+    count = len(series) - lookback - horizon + 1
+    if count <= 0:
+        return series[:0, np.newaxis], series[:0, target_col]
+
+    # sliding_window_view puts the window axis last: (n, features, lookback) -> (n, lookback, features)
+    X = sliding_window_view(series, lookback, axis=0).transpose(0, 2, 1)[:count]
+    target = series[:, target_col]
+    if horizon == 1:
+        y = target[lookback:lookback + count]
+    else:
+        y = sliding_window_view(target, horizon)[lookback:lookback + count]
+    return X, y
+
+
+class GatheredWindows:
+    # Windows of `length` rows starting at arbitrary offsets of one buffer, copied out
+    # only when indexed. Lets the windows of many series share one concatenated array.
+    def __init__(self, series, starts, length, squeeze=False):
+        self.series = series
+        self.starts = np.asarray(starts, dtype='int64')
+        self.offsets = np.arange(length)
+        self.squeeze = squeeze
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, rows):
+        windows = self.series[self.starts[rows][:, np.newaxis] + self.offsets]
+        return windows[:, 0] if self.squeeze else windows
+
+
+def window_starts(length, lookback, horizon=1):
+    # Offsets of every complete (lookback + horizon) window in a series of this length
+    return np.arange(max(length - lookback - horizon + 1, 0))
+
+
+def make_window_batches(X, y, batch_size, shuffle=False, seed=None):
+    # Feeds Keras one batch at a time from window views; only the current batch
+    # is ever materialized. X may be a tuple for multi-input models.
+    # Keras is imported lazily like the rest of training.
+    from keras.utils import Sequence
+
+    class WindowBatches(Sequence):
+        def __init__(self):
+            super().__init__()
+            self.order = np.arange(len(y))
+            self.rng = np.random.default_rng(seed)
+            if shuffle:
+                self.rng.shuffle(self.order)
+
+        def __len__(self):
+            return math.ceil(len(y) / batch_size)
+
+        def __getitem__(self, index):
+            rows = self.order[index * batch_size:(index + 1) * batch_size]
+            if not shuffle:
+                rows = slice(rows[0], rows[-1] + 1)
+            if isinstance(X, tuple):
+                inputs = tuple(np.ascontiguousarray(x[rows]) for x in X)
+            else:
+                inputs = np.ascontiguousarray(X[rows])
+            return inputs, np.ascontiguousarray(y[rows])
+
+        def on_epoch_end(self):
+            if shuffle:
+                self.rng.shuffle(self.order)
+
+    return WindowBatches()
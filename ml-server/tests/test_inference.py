@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+keras = pytest.importorskip('keras')
+
+from models.inference import ACTIVATIONS, export_inference_artifact, load_inference_artifact
+from models.lstm_model import LSTMStockPredictor
+
+
+def randomize(model, seed=0):
+    # Fresh layers have zero biases and unit batch-norm statistics; random weights make
+    # every term of the forward pass count
+    rng = np.random.default_rng(seed)
+    for layer in model.layers:
+        weights = []
+        for weight in layer.weights:
+            value = rng.normal(0, 0.5, weight.shape).astype('float32')
+            if 'variance' in weight.name:
+                value = np.abs(value) + 0.5
+            weights.append(value)
+        layer.set_weights(weights)
+    return model
+
+
+def assert_parity(model, tmp_path):
+    export_inference_artifact(model, str(tmp_path))
+    runtime = load_inference_artifact(str(tmp_path))
+    windows = np.random.default_rng(1).normal(0, 2, (16, *model.input_shape[1:])).astype('float32')
+    np.testing.assert_allclose(runtime.predict(windows), model.predict(windows, verbose=0), rtol=1e-4, atol=1e-4)
+
+
+@pytest.mark.parametrize('name', sorted(ACTIVATIONS))
+def test_activations_match_keras(name):
+    x = np.linspace(-8, 8, 161).astype('float32')
+    expected = keras.ops.convert_to_numpy(keras.activations.get(name)(x))
+    np.testing.assert_allclose(ACTIVATIONS[name](x), expected, rtol=1e-5, atol=1e-6)
+
+
+def test_served_architecture_matches_keras(tmp_path):
+    predictor = LSTMStockPredictor(lookback=20, units=(16, 8), forecast_mode='direct')
+    model = randomize(predictor.build_model((20, len(predictor.features))))
+    assert_parity(model, tmp_path)
+
+
+def test_hard_sigmoid_layers_match_keras(tmp_path):
+    from keras.models import Sequential
+    from keras.layers import Input, LSTM, Dense
+
+    model = Sequential([
+        Input((12, 5)),
+        LSTM(8, recurrent_activation='hard_sigmoid', return_sequences=True),
+        LSTM(4, activation='relu', recurrent_activation='hard_sigmoid'),
+        Dense(3, activation='hard_sigmoid')
+    ])
+    assert_parity(randomize(model), tmp_path)
@@ -0,0 +1,125 @@
+import types
+import numpy as np
+import pandas as pd
+import pytest
+from market_data.intraday import BarRing, IntradayFeed, ReplaySource, StreamLimitError
+from models.indicators import compute_indicators, latest_values
+from models.live_forecast import LiveForecaster
+from models.lstm_model import LSTMStockPredictor
+
+BARS = 300
+CAPACITY = 250
+
+
+class NoModels:
+    def find_latest(self, symbol, data, predictor):
+        return None
+
+
+class RecordingJobs:
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, symbol, data, predictor):
+        self.submitted.append(symbol)
+        return types.SimpleNamespace(id=f"job-{len(self.submitted)}")
+
+
+@pytest.fixture
+def replay_file(tmp_path):
+    rng = np.random.default_rng(7)
+    times = pd.date_range('2024-03-04 09:30', periods=BARS, freq='5min')
+    frames = []
+    for symbol in ('AAA', 'BBB'):
+        close = 100 + np.cumsum(rng.normal(0, 0.3, BARS))
+        frames.append(pd.DataFrame({
+            'Datetime': times, 'Symbol': symbol, 'Open': close, 'High': close + 0.2,
+            'Low': close - 0.2, 'Close': close, 'Volume': rng.integers(1000, 5000, BARS).astype(float)
+        }))
+    path = tmp_path / 'bars.csv'
+    pd.concat(frames).to_csv(path, index=False)
+    return path
+
+
+@pytest.fixture
+def live(replay_file, monkeypatch):
+    # Every update is kept for the assertions, and no more than one stream may be open
+    monkeypatch.setenv('INTRADAY_MAX_QUEUED_EVENTS', str(2 * BARS))
+    monkeypatch.setenv('INTRADAY_MAX_STREAMS', '1')
+    predictor = types.SimpleNamespace(
+        lstm_model=LSTMStockPredictor(lookback=60, epochs=1),
+        model_registry=NoModels(),
+        training_jobs=RecordingJobs()
+    )
+    feed = IntradayFeed(ReplaySource(replay_file), '5m', capacity=CAPACITY)
+    forecaster = LiveForecaster(predictor, feed)
+    yield forecaster
+    feed.stop()
+
+
+def test_bar_ring_keeps_the_latest_bars_in_order():
+    ring = BarRing(3)
+    times = pd.date_range('2024-03-04 09:30', periods=5, freq='1min')
+    for i, bar_time in enumerate(times):
+        ring.append(bar_time, [i, i, i, i, i])
+
+    frame = ring.frame()
+    assert len(ring) == 3
+    assert list(frame.index) == list(times[2:])
+    assert frame['Close'].tolist() == [2, 3, 4]
+    assert ring.last_time == times[-1]
+
+
+def test_replay_drives_incremental_indicators_and_broadcasts(live, replay_file):
+    expected = pd.read_csv(replay_file, parse_dates=['Datetime'])
+    expected = expected[expected['Symbol'] == 'AAA']
+    close, volume = expected['Close'].values, expected['Volume'].values
+
+    subscription = live.subscribe(['AAA'])
+    updates = []
+    while len(updates) < BARS:
+        event = subscription.get(timeout=10)
+        assert event is not None, f"only {len(updates)} of {BARS} updates arrived"
+        name, update = event
+        assert name == 'update' and update['symbol'] == 'AAA'
+        updates.append(update)
+
+    for count, update in enumerate(updates, start=1):
+        # The O(1) updates match a full recompute over every bar replayed so far
+        full = latest_values(compute_indicators(close[:count], volume[:count]))
+        assert set(update['indicators']) == set(full)
+        for name, value in full.items():
+            assert update['indicators'][name] == pytest.approx(value, abs=1e-3)
+        assert update['bar']['close'] == close[count - 1]
+
+    # The ring buffer holds the latest CAPACITY bars, oldest first
+    frame = live.feed.frame('AAA')
+    assert len(frame) == CAPACITY
+    assert frame['Close'].tolist() == close[-CAPACITY:].tolist()
+
+    # Forecasts collect bars first, then queue training for the watched symbol only
+    assert updates[0]['forecast']['status'] == 'collecting'
+    assert updates[-1]['forecast']['status'] == 'training'
+    assert set(live.training_jobs.submitted) == {'AAA'}
+    assert live.feed.frame('BBB') is None
+
+    live.unsubscribe(subscription)
+    assert live.feed.frame('AAA') is None
+    assert live.latest('AAA') is None
+    assert not live.feed.running
+
+
+def test_stream_limit_and_snapshot_without_watching(live):
+    subscription = live.subscribe(['AAA'])
+    with pytest.raises(StreamLimitError):
+        live.subscribe(['BBB'])
+
+    # Wait for the replay to finish, then read BBB once without watching it
+    while live.feed.source.position < len(live.feed.source.times):
+        subscription.get(timeout=1)
+    update = live.snapshot('BBB')
+    assert update['symbol'] == 'BBB'
+    assert update['forecast']['status'] == 'no_model'
+    assert live.feed.symbols() == ['AAA']
+    assert live.latest('BBB') is None
+    live.unsubscribe(subscription)
@@ -0,0 +1,114 @@
+import threading
+import time
+import numpy as np
+import pandas as pd
+import pytest
+from market_data import client as client_module
+from market_data.client import FakeTransport, MarketDataClient, RateLimiter, TransientError
+
+
+def make_client(transport, **options):
+    options.setdefault('rate', 0)
+    options.setdefault('backoff', 0.01)
+    return MarketDataClient(transport, **options)
+
+
+@pytest.fixture
+def delays(monkeypatch):
+    # The upper bound of every jittered backoff, instead of sleeping a random delay
+    bounds = []
+
+    def uniform(low, high):
+        bounds.append(high)
+        return 0.0
+
+    monkeypatch.setattr(client_module.random, 'uniform', uniform)
+    return bounds
+
+
+def test_failing_call_is_retried_with_jittered_backoff(delays):
+    transport = FakeTransport(infos={'AAA': {'trailingPE': 12}}, failures=2)
+    client = make_client(transport, backoff=0.01, max_backoff=0.015)
+
+    assert client.info('aaa') == {'trailingPE': 12}
+    assert transport.calls == [('info', 'AAA')] * 3
+    # Exponential bounds, capped at max_backoff
+    assert delays == [0.01, 0.015]
+    assert client.stats()['retries'] == 2
+    assert client.stats()['errors'] == 0
+
+
+def test_retries_give_up_after_max_retries(delays):
+    transport = FakeTransport(infos={'AAA': {}}, failures=5)
+    client = make_client(transport, max_retries=2)
+
+    with pytest.raises(TransientError):
+        client.info('AAA')
+    assert len(transport.calls) == 3
+    assert client.stats()['errors'] == 1
+
+
+def test_errors_that_are_not_transient_are_not_retried(delays):
+    class BrokenTransport(FakeTransport):
+        def info(self, symbol):
+            self._call('info', symbol)
+            raise KeyError(symbol)
+
+    transport = BrokenTransport()
+    with pytest.raises(KeyError):
+        make_client(transport).info('AAA')
+    assert len(transport.calls) == 1
+    assert delays == []
+
+
+def test_concurrent_identical_calls_share_one_upstream_call():
+    dates = pd.bdate_range('2024-01-01', periods=50)
+    history = pd.DataFrame({column: np.arange(50.0) for column in ('Open', 'High', 'Low', 'Close', 'Volume')},
+                           index=dates)
+    transport = FakeTransport(histories={'AAA': history}, latency=0.2)
+    client = make_client(transport)
+
+    callers = 8
+    barrier = threading.Barrier(callers)
+    results = [None] * callers
+
+    def call(i):
+        barrier.wait()
+        results[i] = client.history('AAA', period='1mo')
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert transport.calls == [('history', 'AAA')]
+    assert all(result is results[0] for result in results)
+    assert client.stats()['coalesced'] == callers - 1
+
+    # Different arguments are separate calls
+    client.history('AAA', period='3mo')
+    assert len(transport.calls) == 2
+
+
+def test_rate_limiter_spaces_calls_after_the_burst():
+    limiter = RateLimiter(rate=20, burst=2)
+    started = time.monotonic()
+    waits = [limiter.acquire() for _ in range(4)]
+    elapsed = time.monotonic() - started
+
+    assert waits[:2] == [0.0, 0.0]
+    assert all(wait > 0 for wait in waits[2:])
+    # Two calls beyond the burst at 20 per second take about 0.1s
+    assert elapsed >= 0.09
+    assert RateLimiter(rate=0).acquire() == 0.0
+
+
+def test_rate_limit_covers_every_call_of_the_client():
+    transport = FakeTransport(infos={symbol: {} for symbol in ('A', 'B', 'C', 'D')})
+    client = make_client(transport, rate=20, burst=2)
+
+    started = time.monotonic()
+    for symbol in ('A', 'B', 'C', 'D'):
+        client.info(symbol)
+    assert time.monotonic() - started >= 0.09
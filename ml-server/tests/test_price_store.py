@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+import pytest
+from market_data.price_store import CsvHistorySource, PriceStore
+
+BARS = 300
+
+
+class CountingSource(CsvHistorySource):
+    # The CSV source, recording every upstream call
+    def __init__(self, directory):
+        super().__init__(directory)
+        self.calls = []
+
+    def fetch(self, symbol, start=None, period=None):
+        self.calls.append(('fetch', symbol, start, period))
+        return super().fetch(symbol, start, period)
+
+    def download(self, symbols, start=None, period=None):
+        self.calls.append(('download', tuple(symbols), start, period))
+        frames = {symbol.upper(): CsvHistorySource.fetch(self, symbol, start, period) for symbol in symbols}
+        return {symbol: frame for symbol, frame in frames.items() if frame is not None}
+
+
+def write_bars(directory, symbol, dates, seed=0):
+    close = 100 + np.cumsum(np.random.default_rng(seed).normal(0, 1, len(dates)))
+    frame = pd.DataFrame({'Open': close, 'High': close + 1, 'Low': close - 1, 'Close': close,
+                          'Volume': np.full(len(dates), 1e6)}, index=dates)
+    frame.to_csv(directory / f"{symbol}.csv", index_label='Date')
+    return frame
+
+
+@pytest.fixture
+def fixture_dir(tmp_path):
+    directory = tmp_path / 'fixture'
+    directory.mkdir()
+    return directory
+
+
+def stored_rows(root, symbol):
+    return len(np.load(root / f"{symbol}.ohlcv.npy", mmap_mode='r'))
+
+
+def test_backfill_is_stored_and_served_without_going_upstream(tmp_path, fixture_dir):
+    dates = pd.bdate_range(end=pd.Timestamp.now().normalize() - pd.offsets.BDay(3), periods=BARS)
+    expected = write_bars(fixture_dir, 'AAA', dates)
+    source = CountingSource(fixture_dir)
+    store = PriceStore(root=str(tmp_path / 'store'), source=source, backfill_period='2y', refresh_seconds=3600)
+
+    frame = store.get_history('AAA', period='1y')
+    assert len(source.calls) == 1
+    assert stored_rows(tmp_path / 'store', 'AAA') == BARS
+    assert np.allclose(frame['Close'].values, expected['Close'].values[-len(frame):])
+
+    store.get_history('AAA', period='1y')
+    assert len(source.calls) == 1
+
+    # Another process opens the stored bars from disk
+    reopened = PriceStore(root=str(tmp_path / 'store'), source=source, backfill_period='2y', refresh_seconds=3600)
+    assert len(reopened.get_history('AAA', period='1y')) == len(frame)
+    assert len(source.calls) == 1
+
+
+def test_refresh_appends_only_the_new_bar(tmp_path, fixture_dir):
+    dates = pd.bdate_range(end=pd.Timestamp.now().normalize() - pd.offsets.BDay(3), periods=BARS + 1)
+    full = write_bars(fixture_dir, 'AAA', dates)
+    full.iloc[:-1].to_csv(fixture_dir / 'AAA.csv', index_label='Date')
+    source = CountingSource(fixture_dir)
+    store = PriceStore(root=str(tmp_path / 'store'), source=source, backfill_period='2y', refresh_seconds=3600)
+    store.get_history('AAA')
+    assert stored_rows(tmp_path / 'store', 'AAA') == BARS
+
+    full.to_csv(fixture_dir / 'AAA.csv', index_label='Date')
+    history = store.refresh('AAA', force=True)
+    # Incremental: fetched from the last stored bar on, not the whole period again
+    assert source.calls[-1] == ('fetch', 'AAA', dates[-2], None)
+    assert stored_rows(tmp_path / 'store', 'AAA') == BARS + 1
+    assert history.frame.index[-1] == dates[-1]
+    assert history.frame['Close'].iloc[-1] == pytest.approx(full['Close'].iloc[-1])
+
+
+def test_refresh_many_downloads_in_groups(tmp_path, fixture_dir):
+    dates = pd.bdate_range(end=pd.Timestamp.now().normalize() - pd.offsets.BDay(3), periods=BARS)
+    for seed, symbol in enumerate(('AAA', 'BBB', 'CCC')):
+        write_bars(fixture_dir, symbol, dates, seed)
+    source = CountingSource(fixture_dir)
+    store = PriceStore(root=str(tmp_path / 'store'), source=source, backfill_period='2y', refresh_seconds=3600)
+
+    histories = store.refresh_many(['AAA', 'bbb', 'CCC', 'MISSING'])
+    assert [call[0] for call in source.calls] == ['download']
+    assert source.calls[0][1] == ('AAA', 'BBB', 'CCC', 'MISSING')
+    assert histories['MISSING'] is None
+    assert all(len(histories[symbol].frame) == BARS for symbol in ('AAA', 'BBB', 'CCC'))
+    assert store.symbols() == ['AAA', 'BBB', 'CCC']
+
+    # Served from the store: no per-symbol history calls
+    for symbol in ('AAA', 'BBB', 'CCC'):
+        store.get_history(symbol)
+    assert len(source.calls) == 1
+
+    # Stale symbols are brought up to date with one download from their last stored bar
+    store.refresh_seconds = 0
+    store.refresh_many(['AAA', 'BBB', 'CCC'])
+    assert source.calls[-1] == ('download', ('AAA', 'BBB', 'CCC'), dates[-1], None)
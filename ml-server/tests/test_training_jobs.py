@@ -0,0 +1,77 @@
+import json
+import os
+import threading
+import time
+import types
+from models.training_jobs import JobStore, TrainingJobQueue
+
+
+class BlockingRegistry:
+    # Trains nothing; get_or_train returns once the test releases it
+    def __init__(self):
+        self.release = threading.Event()
+        self.trained = []
+
+    def get_or_train(self, symbol, data, predictor, callbacks=None):
+        self.release.wait(10)
+        self.trained.append(symbol)
+        return types.SimpleNamespace(version='2024-03-04')
+
+
+def make_predictor():
+    return types.SimpleNamespace(lookback=60, features=['Close'], variant='', epochs=5)
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, 'timed out'
+        time.sleep(0.01)
+
+
+def test_jobs_are_visible_and_deduplicated_across_workers(tmp_path):
+    # Two queues over one store stand in for two gunicorn workers
+    registry = BlockingRegistry()
+    first = TrainingJobQueue(registry, store=JobStore(str(tmp_path)))
+    second = TrainingJobQueue(registry, store=JobStore(str(tmp_path)))
+
+    job = first.submit('AAPL', None, make_predictor())
+    assert second.get(job.id).status in ('queued', 'running')
+    assert second.submit('aapl', None, make_predictor()).id == job.id
+    assert second.stats()['queued'] + second.stats()['running'] == 1
+
+    registry.release.set()
+    wait_for(lambda: second.get(job.id).status == 'completed')
+    assert second.get(job.id).model_version == '2024-03-04'
+    assert registry.trained == ['AAPL']
+    assert second.stats()['running'] == 0
+
+
+def test_claim_of_a_dead_worker_is_taken_over(tmp_path):
+    store = JobStore(str(tmp_path))
+    registry = BlockingRegistry()
+    registry.release.set()
+    queue = TrainingJobQueue(registry, store=store)
+    predictor = make_predictor()
+    key = ('MSFT', predictor.lookback, tuple(predictor.features), predictor.variant)
+
+    # A queued job whose worker exited without finishing it
+    stale = queue.submit('MSFT', None, predictor)
+    wait_for(lambda: queue.get(stale.id).status == 'completed')
+    record = store.load(stale.id).to_dict()
+    record['status'] = 'running'
+    with open(os.path.join(str(tmp_path), f"{stale.id}.json"), 'w') as f:
+        json.dump(record, f)
+    with open(store._claim_path(key), 'w') as f:
+        json.dump({'jobId': stale.id, 'pid': 2 ** 22 + 1, 'host': store.host}, f)
+
+    job = queue.submit('MSFT', None, predictor)
+    assert job.id != stale.id
+    wait_for(lambda: queue.get(job.id).status == 'completed')
+    assert registry.trained == ['MSFT', 'MSFT']
+
+
+def test_unknown_or_malformed_job_ids_are_not_found(tmp_path):
+    queue = TrainingJobQueue(BlockingRegistry(), store=JobStore(str(tmp_path)))
+    assert queue.get('0' * 32) is None
+    assert queue.get('../../etc/passwd') is None
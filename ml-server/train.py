@@ -0,0 +1,293 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+MIN_TRAINING_BARS = 100
+
+
+def limit_worker_threads(threads):
+    # Must run before TensorFlow creates its thread pools in the worker
+    os.environ['OMP_NUM_THREADS'] = str(threads)
+    os.environ['TF_NUM_INTRAOP_THREADS'] = str(threads)
+    os.environ['TF_NUM_INTEROP_THREADS'] = '1'
+    os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+
+_panel = None
+
+
+def panel_history(symbol, options):
+    # Each worker maps the panel once; a symbol's history is then a view of it
+    global _panel
+    from market_data.panel import PricePanel
+    if _panel is None:
+        _panel = PricePanel.load(options['panel'])
+    return _panel.frame(symbol) if symbol in _panel else None
+
+
+def prepare_panel(symbols, period, path=None):
+    # One grouped download for the whole universe, saved for the workers to memory-map.
+    # An existing panel at `path` is reused as is.
+    from market_data.panel import download_panel
+    if path and os.path.exists(os.path.join(path, 'meta.json')):
+        print(f"Using price panel {path}")
+        return path
+    started = time.time()
+    panel = download_panel(symbols, period)
+    path = panel.save(path or os.path.join(tempfile.mkdtemp(prefix='intellistock-panel-'), 'panel'))
+    print(f"Downloaded {len(panel)} symbols x {len(panel.dates)} days in {time.time() - started:.1f}s")
+    return path
+
+
+def train_symbol(symbol, options):
+    from models.lstm_model import LSTMStockPredictor
+    from models.model_registry import ModelRegistry
+
+    started = time.time()
+    result = {'symbol': symbol, 'status': 'ok'}
+
+    try:
+        predictor = LSTMStockPredictor(
+            lookback=options['lookback'],
+            epochs=options['epochs'],
+            batch_size=options['batch_size'],
+            forecast_mode=options['forecast_mode'],
+            units=options['units']
+        )
+        registry = ModelRegistry(root=options['model_dir'])
+
+        data = panel_history(symbol, options)
+        if data is None or len(data) < MIN_TRAINING_BARS:
+            result.update({
+                'status': 'skipped',
+                'reason': f"Need at least {MIN_TRAINING_BARS} days of data, got {len(data) if data is not None else 0}"
+            })
+            return result
+
+        key = registry.key_for(symbol, data, predictor)
+        if not options['force'] and registry.exists(key):
+            result.update({'status': 'skipped', 'reason': 'Model already trained for this cutoff', 'cutoff': key.cutoff})
+            return result
+
+        trained = registry.train(symbol, data, predictor, full=options['full'])
+        result.update({
+            'cutoff': trained.key.cutoff,
+            'mode': trained.metadata.get('mode'),
+            'samples': trained.metadata.get('samples'),
+            'epochs_run': trained.metadata.get('epochs_run'),
+            'val_loss': trained.metadata.get('val_loss'),
+            'loss': trained.metadata.get('loss'),
+            'new_window_loss': trained.metadata.get('new_window_loss'),
+            'train_seconds': trained.metadata.get('train_seconds')
+        })
+    except Exception as e:
+        result.update({'status': 'error', 'reason': str(e)})
+    finally:
+        result['wall_seconds'] = round(time.time() - started, 2)
+
+    return result
+
+
+def format_loss(result):
+    # Full trainings report their validation loss; fine-tunes have no validation split
+    def value(name):
+        return f"{name}={result[name]:.6f}" if result.get(name) is not None else f"{name}=n/a"
+
+    if result.get('mode') == 'fine_tune':
+        return f"{value('loss')} {value('new_window_loss')}"
+    return value('val_loss')
+
+
+def train_global(symbols, options):
+    from models.global_model import GlobalLSTMPredictor, GLOBAL_SYMBOL
+    from models.model_registry import ModelRegistry
+
+    started = time.time()
+    result = {'symbol': GLOBAL_SYMBOL, 'status': 'ok'}
+
+    try:
+        predictor = GlobalLSTMPredictor(
+            lookback=options['lookback'],
+            epochs=options['epochs'],
+            batch_size=options['batch_size'],
+            forecast_mode=options['forecast_mode'],
+            embedding_dim=options['embedding_dim'],
+            units=options['units']
+        )
+        registry = ModelRegistry(root=options['model_dir'])
+
+        histories = {s: panel_history(s, options) for s in symbols}
+        histories = {s: data for s, data in histories.items() if data is not None and len(data) >= MIN_TRAINING_BARS}
+        result['skipped_symbols'] = [s for s in symbols if s not in histories]
+        if not histories:
+            result.update({'status': 'skipped', 'reason': 'No symbol has enough history'})
+            return result
+
+        key = registry.key_for(GLOBAL_SYMBOL, histories, predictor)
+        if not options['force'] and registry.exists(key):
+            result.update({'status': 'skipped', 'reason': 'Model already trained for this cutoff', 'cutoff': key.cutoff})
+            return result
+
+        trained = registry.train(GLOBAL_SYMBOL, histories, predictor)
+        result.update({
+            'cutoff': trained.key.cutoff,
+            'symbols': len(trained.scaler),
+            'samples': trained.metadata.get('samples'),
+            'epochs_run': trained.metadata.get('epochs_run'),
+            'val_loss': trained.metadata.get('val_loss'),
+            'train_seconds': trained.metadata.get('train_seconds')
+        })
+    except Exception as e:
+        result.update({'status': 'error', 'reason': str(e)})
+    finally:
+        result['wall_seconds'] = round(time.time() - started, 2)
+
+    return result
+
+
+def read_symbols(args):
+    symbols = [s.upper() for s in args.symbols]
+    if args.symbols_file:
+        with open(args.symbols_file) as f:
+            for line in f:
+                line = line.split('#')[0].strip()
+                if line:
+                    symbols.extend(s.upper() for s in line.replace(',', ' ').split())
+    # Keep order, drop duplicates
+    return list(dict.fromkeys(symbols))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Pre-train IntelliStock LSTM models for a symbol universe')
+    parser.add_argument('symbols', nargs='*', help='Ticker symbols to train')
+    parser.add_argument('--symbols-file', help='File with one or more symbols per line')
+    # Unset architecture options come from the config saved by tune.py, else the defaults
+    parser.add_argument('--lookback', type=int)
+    parser.add_argument('--epochs', type=int)
+    parser.add_argument('--batch-size', type=int)
+    parser.add_argument('--units', help='LSTM layer widths, e.g. 64-32')
+    parser.add_argument('--forecast-mode', choices=['recursive', 'direct'],
+                        default=os.environ.get('LSTM_FORECAST_MODE', 'recursive'),
+                        help='recursive: one-day head; direct: 30-day multi-horizon head')
+    parser.add_argument('--period', default='2y', help='History period passed to yfinance')
+    parser.add_argument('--panel', help='Directory of a price panel to reuse, or to save the downloaded one to')
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument('--threads-per-worker', type=int, default=1)
+    parser.add_argument('--model-dir', default=os.environ.get('MODEL_DIR'))
+    parser.add_argument('--report', help='Path of the JSON summary report')
+    parser.add_argument('--force', action='store_true', help='Retrain even if a model exists for the latest cutoff')
+    parser.add_argument('--full', action='store_true',
+                        help='Always train from scratch instead of fine-tuning the previous model on new bars')
+    parser.add_argument('--global', dest='global_model', action='store_true',
+                        help='Train one pooled model across all symbols instead of one model per symbol')
+    parser.add_argument('--embedding-dim', type=int, default=int(os.environ.get('GLOBAL_MODEL_EMBEDDING_DIM', 0)),
+                        help='Size of the learned symbol embedding of the global model (0 disables it)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    symbols = read_symbols(args)
+    if not symbols:
+        print('No symbols given')
+        return 2
+
+    from models.model_registry import DEFAULT_MODEL_DIR
+    from models.lstm_model import DEFAULT_UNITS
+    from models.tuning import load_tuned_config
+    model_dir = os.path.abspath(args.model_dir or DEFAULT_MODEL_DIR)
+    tuned = load_tuned_config(model_dir) or {}
+    # The global model keeps the default widths unless --units is given
+    default_units = DEFAULT_UNITS if args.global_model else tuned.get('units', DEFAULT_UNITS)
+    panel_path = prepare_panel(symbols, args.period, args.panel)
+    options = {
+        'lookback': args.lookback or (60 if args.global_model else tuned.get('lookback', 60)),
+        'epochs': args.epochs or tuned.get('epochs', 50),
+        'batch_size': args.batch_size or (32 if args.global_model else tuned.get('batch_size', 32)),
+        'units': tuple(int(u) for u in args.units.split('-')) if args.units else default_units,
+        'forecast_mode': args.forecast_mode,
+        'period': args.period,
+        'model_dir': model_dir,
+        'force': args.force,
+        'full': args.full,
+        'embedding_dim': args.embedding_dim,
+        'panel': panel_path
+    }
+    # A global model is a single training run, so it gets one worker
+    workers = 1 if args.global_model else max(1, min(args.workers, len(symbols)))
+
+    print("=" * 60)
+    if args.global_model:
+        print(f"Training one global model on {len(symbols)} symbols with {args.threads_per_worker} threads")
+    else:
+        print(f"Training {len(symbols)} symbols with {workers} workers x {args.threads_per_worker} threads")
+    print(f"Model store: {model_dir}")
+    print("=" * 60)
+
+    started_at = datetime.now()
+    started = time.time()
+    results = []
+
+    # spawn keeps TensorFlow state out of the parent and gives each worker its own thread pools
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=limit_worker_threads, initargs=(args.threads_per_worker,)) as pool:
+        if args.global_model:
+            futures = {pool.submit(train_global, symbols, options): '__GLOBAL__'}
+        else:
+            futures = {pool.submit(train_symbol, symbol, options): symbol for symbol in symbols}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {'symbol': futures[future], 'status': 'error', 'reason': str(e)}
+            results.append(result)
+
+            if result['status'] == 'ok':
+                print(f"{result['symbol']:<8} ok       {result.get('mode', 'full'):<9} epochs={result['epochs_run']:<3} "
+                      f"{format_loss(result)} wall={result['wall_seconds']}s")
+            else:
+                print(f"{result['symbol']:<8} {result['status']:<8} {result.get('reason', '')}")
+
+    results.sort(key=lambda r: symbols.index(r['symbol']) if r['symbol'] in symbols else -1)
+    if not args.panel:
+        shutil.rmtree(os.path.dirname(panel_path), ignore_errors=True)
+
+    report = {
+        'started_at': started_at.isoformat(),
+        'finished_at': datetime.now().isoformat(),
+        'wall_seconds': round(time.time() - started, 2),
+        'parameters': dict(options, workers=workers, threads_per_worker=args.threads_per_worker),
+        'trained': sum(1 for r in results if r['status'] == 'ok'),
+        'skipped': sum(1 for r in results if r['status'] == 'skipped'),
+        'failed': sum(1 for r in results if r['status'] == 'error'),
+        'results': results
+    }
+
+    report_path = args.report or os.path.join(model_dir, 'reports', f"train-{started_at.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(report_path)), exist_ok=True)
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print("=" * 60)
+    print(f"Trained: {report['trained']} | Skipped: {report['skipped']} | Failed: {report['failed']} "
+          f"| Wall time: {report['wall_seconds']}s")
+    print(f"Report: {report_path}")
+    print("=" * 60)
+
+    return 1 if report['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,159 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from train import limit_worker_threads, read_symbols, prepare_panel
+
+
+def parse_list(value, cast=int):
+    return [cast(item) for item in value.split(',') if item.strip()]
+
+
+def parse_units(value):
+    # "128-64-32,64-32,32" -> [(128, 64, 32), (64, 32), (32,)]
+    return [tuple(int(u) for u in item.split('-')) for item in value.split(',') if item.strip()]
+
+
+def parse_args(argv=None):
+    from models.tuning import SEARCH_SPACE
+
+    def joined(values):
+        return ','.join('-'.join(map(str, v)) if isinstance(v, tuple) else str(v) for v in values)
+
+    parser = argparse.ArgumentParser(description='Search LSTM hyperparameters for accuracy against training and serving cost')
+    parser.add_argument('symbols', nargs='*', help='Ticker symbols to tune on')
+    parser.add_argument('--symbols-file', help='File with one or more symbols per line')
+    parser.add_argument('--period', default='2y', help='History period passed to yfinance')
+    parser.add_argument('--panel', help='Directory of a price panel to reuse, or to save the downloaded one to')
+    parser.add_argument('--trials', type=int, default=20, help='Configs sampled from the search space')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--lookbacks', default=joined(SEARCH_SPACE['lookback']))
+    parser.add_argument('--units', default=joined(SEARCH_SPACE['units']), help='LSTM layer widths, e.g. 128-64-32,64-32')
+    parser.add_argument('--batch-sizes', default=joined(SEARCH_SPACE['batch_size']))
+    parser.add_argument('--epochs', default=joined(SEARCH_SPACE['epochs']))
+    parser.add_argument('--forecast-mode', choices=['recursive', 'direct'],
+                        default=os.environ.get('LSTM_FORECAST_MODE', 'recursive'))
+    parser.add_argument('--warmup-epochs', type=int, default=3, help='Epochs before a trial can be pruned')
+    parser.add_argument('--min-trials', type=int, default=3,
+                        help='Other trials that must have reached an epoch before pruning against their median')
+    parser.add_argument('--max-loss-increase', type=float, default=0.05,
+                        help='Pick the cheapest Pareto config whose val_loss is within this share of the best')
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument('--threads-per-worker', type=int, default=1)
+    parser.add_argument('--model-dir', default=os.environ.get('MODEL_DIR'))
+    parser.add_argument('--report', help='Path of the JSON report')
+    parser.add_argument('--dry-run', action='store_true', help='Report only; do not save the chosen config')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    symbols = read_symbols(args)
+    if not symbols:
+        print('No symbols given')
+        return 2
+
+    from models.model_registry import DEFAULT_MODEL_DIR
+    from models.tuning import sample_configs, run_trial, pareto_front, choose_config, save_tuned_config, MedianPruner
+
+    model_dir = os.path.abspath(args.model_dir or DEFAULT_MODEL_DIR)
+    space = {
+        'lookback': parse_list(args.lookbacks),
+        'units': parse_units(args.units),
+        'batch_size': parse_list(args.batch_sizes),
+        'epochs': parse_list(args.epochs)
+    }
+    configs = sample_configs(space, args.trials, args.seed)
+    panel_path = prepare_panel(symbols, args.period, args.panel)
+    # Every trial validates on the target bars the longest lookback leaves for validation
+    options = {'panel': panel_path, 'symbols': symbols, 'forecast_mode': args.forecast_mode,
+               'max_lookback': max(space['lookback'])}
+    workers = max(1, min(args.workers, len(configs)))
+
+    print("=" * 60)
+    print(f"Tuning {len(configs)} configs on {len(symbols)} symbols with {workers} workers "
+          f"x {args.threads_per_worker} threads")
+    print("=" * 60)
+
+    started_at = datetime.now()
+    started = time.time()
+    trials = []
+
+    context = multiprocessing.get_context('spawn')
+    with context.Manager() as manager:
+        # Intermediate val_loss of every trial, shared with the workers for pruning
+        pruner = MedianPruner(manager.dict(), manager.Lock(), args.warmup_epochs, args.min_trials)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=limit_worker_threads, initargs=(args.threads_per_worker,)) as pool:
+            futures = {pool.submit(run_trial, i, config, options, pruner): i for i, config in enumerate(configs)}
+            for future in as_completed(futures):
+                try:
+                    trial = future.result()
+                except Exception as e:
+                    trial = dict(configs[futures[future]], trial=futures[future], status='error', reason=str(e))
+                    trial['units'] = list(trial['units'])
+                trials.append(trial)
+
+                name = f"lb={trial['lookback']} units={'-'.join(map(str, trial['units']))} " \
+                       f"batch={trial['batch_size']} epochs={trial['epochs']}"
+                if trial['status'] == 'ok':
+                    print(f"#{trial['trial']:<3} {name:<44} val_loss={trial['val_loss']:.6f} "
+                          f"train={trial['train_seconds']}s latency={trial['latency_ms']:.2f}ms")
+                elif trial['status'] == 'pruned':
+                    print(f"#{trial['trial']:<3} {name:<44} pruned at epoch {trial['pruned_at_epoch']} on {trial['pruned_on']}")
+                else:
+                    print(f"#{trial['trial']:<3} {name:<44} error: {trial.get('reason', '')}")
+
+    if not args.panel:
+        shutil.rmtree(os.path.dirname(panel_path), ignore_errors=True)
+
+    trials.sort(key=lambda t: t['trial'])
+    front = sorted(pareto_front(trials), key=lambda t: t['val_loss'])
+    chosen = choose_config(front, args.max_loss_increase)
+
+    report_path = args.report or os.path.join(model_dir, 'reports', f"tune-{started_at.strftime('%Y%m%d-%H%M%S')}.json")
+    report = {
+        'started_at': started_at.isoformat(),
+        'finished_at': datetime.now().isoformat(),
+        'wall_seconds': round(time.time() - started, 2),
+        'symbols': symbols,
+        'search_space': {name: [list(v) if isinstance(v, tuple) else v for v in values] for name, values in space.items()},
+        'completed': sum(1 for t in trials if t['status'] == 'ok'),
+        'pruned': sum(1 for t in trials if t['status'] == 'pruned'),
+        'failed': sum(1 for t in trials if t['status'] == 'error'),
+        'pareto_front': [t['trial'] for t in front],
+        'chosen': chosen['trial'] if chosen else None,
+        'trials': trials
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(report_path)), exist_ok=True)
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print("=" * 60)
+    print(f"Completed: {report['completed']} | Pruned: {report['pruned']} | Failed: {report['failed']} "
+          f"| Wall time: {report['wall_seconds']}s")
+    print("Pareto front (val_loss, train seconds, latency):")
+    for t in front:
+        marker = '*' if t is chosen else ' '
+        print(f" {marker} #{t['trial']:<3} lb={t['lookback']} units={'-'.join(map(str, t['units']))} batch={t['batch_size']} "
+              f"epochs={t['epochs']}: {t['val_loss']:.6f}, {t['train_seconds']}s, {t['latency_ms']:.2f}ms")
+    print(f"Report: {report_path}")
+
+    if chosen is None:
+        print('No trial completed; nothing to save')
+        return 1
+    if not args.dry_run:
+        path = save_tuned_config(model_dir, chosen, symbols=symbols, report=report_path)
+        print(f"Saved config #{chosen['trial']} to {path}; the ML server and train.py use it from their next start")
+    print("=" * 60)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
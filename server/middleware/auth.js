@@ -42,4 +42,40 @@ const adminAuth = async (req, res, next) => {
   }
 }
 
-module.exports = { auth, adminAuth }
\ No newline at end of file
+// EventSource cannot send an Authorization header, so streams take a short-lived token
+// (see signStreamToken) in the query string instead of the login token
+const STREAM_TOKEN_SCOPE = 'stream'
+
+const signStreamToken = (userId) => jwt.sign({ userId, scope: STREAM_TOKEN_SCOPE }, process.env.JWT_SECRET, { expiresIn: '60s' })
+
+const streamAuth = async (req, res, next) => {
+  try {
+    const token = req.query.token
+
+    if (!token) {
+      return res.status(401).json({ message: 'No token, authorization denied' })
+    }
+
+    const decoded = jwt.verify(token, process.env.JWT_SECRET)
+    if (decoded.scope !== STREAM_TOKEN_SCOPE) {
+      return res.status(401).json({ message: 'Token is not valid' })
+    }
+    const user = await User.findById(decoded.userId).select('-password')
+
+    if (!user) {
+      return res.status(401).json({ message: 'Token is not valid' })
+    }
+
+    if (user.status === 'banned') {
+      return res.status(403).json({ message: 'Account has been banned' })
+    }
+
+    req.user = user
+    next()
+  } catch (error) {
+    console.error('Stream auth error:', error)
+    res.status(401).json({ message: 'Token is not valid' })
+  }
+}
+
+module.exports = { auth, adminAuth, streamAuth, signStreamToken }
\ No newline at end of file
@@ -3,7 +3,7 @@ const axios = require('axios')
 const createYahooFinanceClient = require('../utils/yahooFinanceClient')
 const Stock = require('../models/Stock')
 const User = require('../models/User')
-const { auth } = require('../middleware/auth')
+const { auth, streamAuth, signStreamToken } = require('../middleware/auth')
 
 const yahooFinance = createYahooFinanceClient({
   timeout: 5000,
@@ -13,6 +13,10 @@ const yahooFinance = createYahooFinanceClient({
 
 const router = express.Router()
 
+// Last prediction body per symbol/horizon, revalidated against the ML server's ETag
+const PREDICTION_CACHE_SIZE = 500
+const predictionCache = new Map()
+
 router.get('/:symbol', auth, async (req, res) => {
   try {
     const { symbol } = req.params
@@ -91,17 +95,36 @@ router.get('/search/:query', auth, async (req, res) => {
 
 router.post('/predict', auth, async (req, res) => {
   try {
-    const { symbol, days = 1 } = req.body
+    const { symbol, days = 1, intervalSamples } = req.body
+    const cacheKey = `${String(symbol).toUpperCase()}:${days}:${intervalSamples ?? ''}`
+    const cached = predictionCache.get(cacheKey)
 
     try {
       const mlResponse = await axios.post(`${process.env.ML_SERVER_URL}/predict`, {
         symbol,
-        days
+        days,
+        intervalSamples
       }, {
-        timeout: 10000
+        timeout: 10000,
+        headers: cached ? { 'If-None-Match': cached.etag } : {},
+        validateStatus: (status) => (status >= 200 && status < 300) || status === 304
       })
 
-      const prediction = mlResponse.data
+      if (mlResponse.status === 202) {
+        // No trained model yet: the ML server queued a training job to poll
+        return res.status(202).json(mlResponse.data)
+      }
+
+      let prediction = mlResponse.data
+      if (mlResponse.status === 304 && cached) {
+        prediction = cached.data
+      } else if (mlResponse.headers.etag) {
+        predictionCache.delete(cacheKey)
+        predictionCache.set(cacheKey, { etag: mlResponse.headers.etag, data: prediction })
+        if (predictionCache.size > PREDICTION_CACHE_SIZE) {
+          predictionCache.delete(predictionCache.keys().next().value)
+        }
+      }
 
       const user = await User.findById(req.user._id)
       user.predictions.push({
@@ -129,6 +152,72 @@ router.post('/predict', auth, async (req, res) => {
   }
 })
 
+router.get('/predict/jobs/:jobId', auth, async (req, res) => {
+  try {
+    const mlResponse = await axios.get(`${process.env.ML_SERVER_URL}/jobs/${encodeURIComponent(req.params.jobId)}`, {
+      timeout: 10000
+    })
+
+    res.json(mlResponse.data)
+  } catch (error) {
+    if (error.response?.status === 404) {
+      return res.status(404).json({ message: 'Training job not found' })
+    }
+    console.log('ML server error:', error.message)
+    res.status(503).json({
+      message: 'ML prediction service is currently unavailable. Please ensure the ML server is running.',
+      error: error.message
+    })
+  }
+})
+
+// Short-lived token for /predict/live, which an EventSource passes as ?token=
+router.post('/predict/live/token', auth, (req, res) => {
+  res.json({ token: signStreamToken(req.user._id), expiresIn: 60 })
+})
+
+const readBody = async (stream) => {
+  let body = ''
+  for await (const chunk of stream) {
+    body += chunk
+  }
+  return body
+}
+
+// Live intraday updates: the ML server's Server-Sent Events are piped through as they arrive
+router.get('/predict/live', streamAuth, async (req, res) => {
+  try {
+    const mlResponse = await axios.get(`${process.env.ML_SERVER_URL}/intraday/stream`, {
+      params: { symbols: req.query.symbols },
+      responseType: 'stream',
+      timeout: 0
+    })
+
+    res.set({
+      'Content-Type': 'text/event-stream',
+      'Cache-Control': 'no-cache',
+      'X-Accel-Buffering': 'no'
+    })
+    res.flushHeaders()
+    mlResponse.data.pipe(res)
+    req.on('close', () => mlResponse.data.destroy())
+  } catch (error) {
+    if (error.response?.status === 400) {
+      return res.status(400).json({ message: 'symbols is required' })
+    }
+    if (error.response?.status === 503) {
+      // The ML server is up but has no stream slot left: pass its answer through
+      const body = await readBody(error.response.data).catch(() => '')
+      return res.status(503).type(error.response.headers['content-type'] || 'application/json').send(body)
+    }
+    console.log('ML server error:', error.message)
+    res.status(503).json({
+      message: 'ML prediction service is currently unavailable. Please ensure the ML server is running.',
+      error: error.message
+    })
+  }
+})
+
 router.get('/:symbol/history', auth, async (req, res) => {
   try {
     const { symbol } = req.params